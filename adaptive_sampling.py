@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+순차 적응 표본 추출 (좁아진 (도메인, 시나리오) 셀은 더 묻지 않기)
+------------------------------------------------
+페르소나(또는 반복)를 도메인별 층화 무작위 순서로 섞어 wave 단위로 보내고,
+(언어, 도메인, 난이도, 시나리오) 셀마다 P(Left) 의 구간(Wilson 또는 Jeffreys Beta 사후 구간)을 갱신한다.
+셀은 다음 중 하나가 되면 닫히고, 이후 wave 에서는 그 셀을 묻지 않는다 (도메인의 모든 셀이 닫히면 도메인도 끝).
+  - width    : 구간 폭이 --adaptive-width 이하
+  - boundary : --adaptive-p0 가 주어졌을 때 구간이 p0 를 벗어남 (한쪽으로 판정)
+판정은 min_n 개 이상 관측된 뒤에만 한다. 매 관측마다 들여다보므로 boundary 판정의 실제 오류율은
+명목 신뢰수준보다 조금 높다 — 판정용으로 쓸 때는 --adaptive-confidence 를 0.99 정도로 올린다.
+실행이 끝나면 셀별 관측 수 / 구간 / 종료 사유와 아낀 호출 수를 결과 로그 폴더의 adaptive_report.json 에 쓴다.
+다시 시작한 실행은 결과 로그에 이미 있는 row 로 셀 추정을 채운 뒤(resume) 이어서 묻고,
+셀이 닫혀 보내지 않은 페르소나(반복)는 매니페스트에 skipped 로 남겨 --rerun-missing 이 다시 보내지 않게 한다.
+
+  python ar_run.py --config pre --all --adaptive-width 0.05
+  python en_run.py --config pre --repeat 1000 --adaptive-width 0.05 --adaptive-p0 0.5 --adaptive-confidence 0.99
+"""
+
+import argparse
+import hashlib
+import json
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from run_manifest import CellSet
+
+ADAPTIVE_REPORT = "adaptive_report.json"
+METHODS = ("wilson", "jeffreys")
+
+Cell = Tuple[str, int]  # (difficulty, scenario)
+
+
+# ---------- 구간 ---------- #
+def _z(confidence: float) -> float:
+    """표준정규 양측 임계값 (이분법으로 erf 역함수)"""
+    lo, hi = 0.0, 10.0
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if math.erf(mid / math.sqrt(2)) < confidence:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def wilson_interval(k: float, n: float, confidence: float = 0.95) -> Tuple[float, float]:
+    if n <= 0:
+        return 0.0, 1.0
+    z = _z(confidence)
+    p = k / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """정규화 불완전 베타 함수의 연분수 전개 (Numerical Recipes betacf)"""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1, a - 1
+    c, d = 1.0, 1 - qab * x / qap
+    d = 1 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1 + aa * d
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = 1 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1 + aa * d
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = 1 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-12:
+            break
+    return h
+
+
+def _beta_cdf(x: float, a: float, b: float) -> float:
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1 - front * _betacf(b, a, 1 - x) / b
+
+
+def _beta_ppf(q: float, a: float, b: float) -> float:
+    lo, hi = 0.0, 1.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if _beta_cdf(mid, a, b) < q:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def jeffreys_interval(k: float, n: float, confidence: float = 0.95) -> Tuple[float, float]:
+    """Jeffreys 사전분포 Beta(0.5, 0.5) 의 사후 등꼬리 구간"""
+    if n <= 0:
+        return 0.0, 1.0
+    a, b = k + 0.5, n - k + 0.5
+    tail = (1 - confidence) / 2
+    return (0.0 if k <= 0 else _beta_ppf(tail, a, b)), (1.0 if k >= n else _beta_ppf(1 - tail, a, b))
+
+
+INTERVALS: Dict[str, Callable[[float, float, float], Tuple[float, float]]] = {
+    "wilson": wilson_interval, "jeffreys": jeffreys_interval,
+}
+
+
+# ---------- 스케줄러 ---------- #
+class AdaptiveSampler:
+    def __init__(self, lang: str, width: float = 0.05, p0: Optional[float] = None,
+                 method: str = "wilson", confidence: float = 0.95, min_n: int = 100,
+                 wave: int = 50, seed: int = 0):
+        self.lang = lang
+        self.width = width
+        self.p0 = p0
+        self.interval = INTERVALS[method]
+        self.method = method
+        self.confidence = confidence
+        self.min_n = min_n
+        self.wave = wave
+        self.seed = seed
+        self.left: Dict[Tuple[str, Cell], float] = defaultdict(float)
+        self.n: Dict[Tuple[str, Cell], float] = defaultdict(float)
+        self.closed: Dict[Tuple[str, Cell], str] = {}  # (도메인, 셀) → 종료 사유
+        self.calls: Counter = Counter()                # planned / issued / observed / seeded
+        self.skipped: List[Hashable] = []              # 셀이 모두 닫혀 보내지 않은 단위의 키
+
+    # ---------- 관측 ---------- #
+    def observe(self, domain: str, resps: List[Any], meta: List[Dict[str, Any]]) -> None:
+        """페르소나 하나의 응답을 셀 추정에 더한다 (선택 없는 오류 응답은 호출만 센다)"""
+        for r, m in zip(resps, meta):
+            self.calls["issued"] += 1
+            if not isinstance(r, dict):
+                continue
+            if self._add((domain, (m["difficulty"], m["scenario_idx"] + 1)), r.get("p_left"), r.get("choice")):
+                self.calls["observed"] += 1
+
+    def resume(self, rows: Iterable[Dict[str, Any]], domain_of: Callable[[int], Optional[str]]) -> int:
+        """결과 로그에 이미 있는 row(results_log.load_cells 의 셀별 최신 row)로 셀 추정을 채운다"""
+        n = 0
+        for row in rows:
+            domain = domain_of(row["idx"])
+            if domain is None:
+                continue
+            if self._add((domain, (row["difficulty"], row["scenario"])), row.get("p_left"), row.get("answer")):
+                n += 1
+        self.calls["seeded"] += n
+        return n
+
+    def _add(self, key: Tuple[str, Cell], p_left: Optional[float], choice: Optional[str]) -> bool:
+        if p_left is not None:  # logprob 응답은 기대 빈도로
+            left = float(p_left)
+        elif choice in ("Left", "Right"):
+            left = 1.0 if choice == "Left" else 0.0
+        else:
+            return False
+        self.left[key] += left
+        self.n[key] += 1
+        if key not in self.closed:
+            reason = self._stop_reason(key)
+            if reason:
+                self.closed[key] = reason
+        return True
+
+    def _stop_reason(self, key: Tuple[str, Cell]) -> Optional[str]:
+        n = self.n[key]
+        if n < self.min_n:
+            return None
+        lo, hi = self.interval(self.left[key], n, self.confidence)
+        if self.width and hi - lo <= self.width:
+            return "width"
+        if self.p0 is not None and (hi < self.p0 or lo > self.p0):
+            return "boundary"
+        return None
+
+    def open_cells(self, domain: str, cells: List[Cell]) -> Set[Cell]:
+        return {c for c in cells if (domain, c) not in self.closed}
+
+    # ---------- 순서 ---------- #
+    def waves(self, units: List[Tuple[str, Hashable, Any]], cells: List[Cell]
+              ) -> Iterator[Tuple[List[Any], CellSet]]:
+        """units = [(도메인, 키, 항목), ...] 을 도메인별 해시 순서로 섞어
+        wave 마다 열린 도메인에서 wave 개씩 꺼내 (항목들, 키 → 물을 셀) 을 내준다."""
+        strata: Dict[str, List[Tuple[str, Hashable, Any]]] = defaultdict(list)
+        for domain, key, item in units:
+            h = hashlib.sha256(f"{self.seed}:{domain!r}:{key!r}".encode("utf-8")).hexdigest()
+            strata[domain].append((h, key, item))
+        for ranked in strata.values():
+            ranked.sort(key=lambda t: t[0])
+        self.calls["planned"] += len(units) * len(cells)
+        pos = dict.fromkeys(strata, 0)
+        while True:
+            items, wanted = [], {}
+            for domain, ranked in strata.items():
+                open_ = self.open_cells(domain, cells)
+                if not open_:
+                    continue
+                for _, key, item in ranked[pos[domain]:pos[domain] + self.wave]:
+                    items.append(item)
+                    wanted[key] = set(open_)
+                pos[domain] += self.wave
+            if not items:
+                # 셀이 모두 닫힌 도메인에 남은 단위는 보내지 않은 채 끝난다
+                self.skipped = [key for domain, ranked in strata.items() if not self.open_cells(domain, cells)
+                                for _, key, _ in ranked[pos[domain]:]]
+                return
+            yield items, wanted
+
+    # ---------- 보고 ---------- #
+    def report(self) -> Dict[str, Any]:
+        cells = []
+        for key in sorted(self.n):
+            (domain, (difficulty, scenario)), n = key, self.n[key]
+            lo, hi = self.interval(self.left[key], n, self.confidence)
+            cells.append({
+                "language": self.lang, "domain": domain, "difficulty": difficulty, "scenario": scenario,
+                "n": round(n), "left": round(self.left[key], 2), "p_left": round(self.left[key] / n, 4),
+                "ci_low": round(lo, 4), "ci_high": round(hi, 4),
+                "stopped": self.closed.get(key, "exhausted"),
+            })
+        planned, issued = self.calls["planned"], self.calls["issued"]
+        return {
+            "language": self.lang, "method": self.method, "confidence": self.confidence,
+            "width": self.width, "p0": self.p0, "min_n": self.min_n,
+            "planned_calls": planned, "issued_calls": issued, "saved_calls": planned - issued,
+            "seeded_observations": self.calls["seeded"], "skipped_units": len(self.skipped),
+            "saved_ratio": round((planned - issued) / planned, 4) if planned else 0.0,
+            "stopped": dict(Counter(c["stopped"] for c in cells)), "cells": cells,
+        }
+
+    def save(self, out_dir: Path) -> Path:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / ADAPTIVE_REPORT
+        path.write_text(json.dumps(self.report(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+
+def format_summary(rep: Dict[str, Any]) -> str:
+    return (f"Adaptive → planned {rep['planned_calls']}, issued {rep['issued_calls']}, "
+            f"saved {rep['saved_calls']} ({rep['saved_ratio']:.1%}), seeded {rep['seeded_observations']}, "
+            f"skipped units {rep['skipped_units']}, cells {rep['stopped']}")
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_adaptive_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--adaptive-width", type=float, default=0.0,
+                    help="(도메인, 시나리오) 셀의 P(Left) 구간 폭이 이 값 이하가 되면 그 셀을 더 묻지 않음 (0 = 끔)")
+    ap.add_argument("--adaptive-p0", type=float,
+                    help="구간이 이 값을 벗어나도 셀을 닫음 (순차 판정 경계, 예: 0.5)")
+    ap.add_argument("--adaptive-method", choices=METHODS, default="wilson", help="구간 계산 방식")
+    ap.add_argument("--adaptive-confidence", type=float, default=0.95, help="구간 신뢰수준")
+    ap.add_argument("--adaptive-min-n", type=int, default=100, help="셀을 닫기 전 최소 관측 수")
+    ap.add_argument("--adaptive-wave", type=int, default=50,
+                    help="wave 마다 도메인별로 보낼 페르소나(반복) 수")
+
+
+def sampler_from_args(args: argparse.Namespace, lang: str) -> Optional[AdaptiveSampler]:
+    if not args.adaptive_width and args.adaptive_p0 is None:
+        return None
+    return AdaptiveSampler(lang, args.adaptive_width, args.adaptive_p0, args.adaptive_method,
+                           args.adaptive_confidence, args.adaptive_min_n, args.adaptive_wave)
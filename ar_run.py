@@ -3,26 +3,41 @@
 1) python (AR)Run.py --config pre|main --all → 모든 페르소나에 대해 실험
 2) python (AR)Run.py --config pre|main --ids 1,2,3... → 특정 idx만 실험
 3) python (AR)Run.py --config pre|main --rerun-missing → 결과가 없는(아직 생성되지 않은) idx만 재실험
-4) python (AR)Run.py --config pre|main --rerun-problems → thought/answer에 문제가 있는 idx만
+4) python (AR)Run.py --config pre|main --rerun-problems → thought/answer에 문제가 있는 (idx, 난이도, 시나리오) 셀만
 5) python (AR)Run.py --config pre|main --nopersona → 페르소나 없이 실험 진행
 '''
 
 import argparse
 import json
-import os
+from contextlib import closing
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
-from multiprocessing import Pool, set_start_method
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
 
-from tqdm import tqdm
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from dotenv import load_dotenv
 
+from adaptive_sampling import AdaptiveSampler, add_adaptive_args, format_summary, sampler_from_args
+from choice_mode import CHOICE_MAX_TOKENS, add_choice_args, mark_choice_only, reasoning_cells
+from experiment_plan import add_plan_args, arm_dir, plan_from_args, run_plan
+from hedging import add_hedge_args, hedger_from_args
+from key_pool import print_key_usage
+from llm_backend import LOGPROB_TOP_K, MODEL_NAME, add_backend_args, backend_from_args
+from llm_cache import add_cache_args, cache_from_args
+from llm_engine import ExperimentEngine
+from packed_mode import add_packed_args, packer_from_args
+from persona_store import open_store
+from prompt_templates import TEMPLATES, choice_prompt
+from rate_limiter import add_limiter_args, limiter_from_args
+from results_log import ResultsLog, export_legacy, load_cells
+from run_manifest import MANIFEST_FILE, CellSet, RunManifest, select_cells
+from run_budget import (BudgetExhausted, RunBudget, add_budget_args, budget_from_args, estimate_plan,
+                        format_plan, observed, persona_range, price_from_args)
+from run_metrics import RunMetrics, add_metrics_args, metrics_from_args
+from structured_output import SchemaParser, add_structured_args, schemas_for
+from work_queue import QueueLease, WorkQueue, add_queue_args, queue_from_args
+
 load_dotenv()
-MODEL_NAME = "gemini-2.0-flash"
-llm = ChatGoogleGenerativeAI(model=MODEL_NAME, temperature=1)
 
 BASE = Path(r"C:\Users\dsng3\Documents\GitHub\DIGB-Homosilicus")
 CONFIGS: Dict[str, Dict[str, Path]] = {
@@ -30,71 +45,59 @@ CONFIGS: Dict[str, Dict[str, Path]] = {
         "data":      BASE / "Data" / "Common" / "(AR)PERSONA_DATA_10000.jsonl",
         "scenarios": BASE / "Data" / "Experiments" / "CR2002" / "(PRE)experiment_scenarios.json",
         "output":    BASE / "Data" / "Results" / "Experiments" / "CR2002" / "(AR)CR2002_EXPERIMENT_RESULTS_10000",
+        "results_log": BASE / "Data" / "Results" / "Experiments" / "CR2002" / "(AR)CR2002_RESULTS_LOG",
     },
     "main": {
         "data":      BASE / "Data" / "Common" / "(AR)PERSONA_DATA_10000.jsonl",
         "scenarios": BASE / "Experiments" / "DIGB_Custom" / "(AR)experiment_scenarios.json",
         "output":    BASE / "Data" / "Results" / "Experiments" / "DIGB_Custom" / "(AR)DIGB_Custom_EXPERIMENT_RESULTS_10000",
+        "results_log": BASE / "Data" / "Results" / "Experiments" / "DIGB_Custom" / "(AR)DIGB_Custom_RESULTS_LOG",
     },
 }
 MAX_PERSONAS = 100_000
+LANG = "AR"
+REPEAT = 1  # 단일 실행 (results_log 의 repeat 번호 / 캐시 키 샘플 번호)
 
+# 템플릿 문구는 prompt_templates.TEMPLATES 에 데이터로 있다 (multi_run.py / experiment_plan.py 와 공유)
 prompt_template = PromptTemplate(
     input_variables=[
         "persona_desc", "difficulty",
         "A_left", "B_left", "A_right", "B_right",
         "metric"
     ],
-    template="""
-أنت **المشارك B** في تجربة تفضيلات اجتماعية بمستوى صعوبة **{difficulty}**.
+    template=TEMPLATES[LANG]["prompt"],
+)
 
-**الوصف الشخصي (بيرسونا)**
-{persona_desc}
+# 선택만 묻는 프롬프트: logprob 모드(--logprobs)에서는 선택 토큰 확률로 P(Left)/P(Right) 를 계산하고,
+# 선택 전용 모드(--choice-only)에서는 reasoning 표본에 들지 않은 셀에 짧은 출력 상한으로 보낸다
+choice_prompt_template = PromptTemplate(
+    input_variables=prompt_template.input_variables,
+    template=choice_prompt(LANG),
+)
 
-**الخيارات**
-- **اليسار**: B {B_left}, A {A_left}
-- **اليمين**: B {B_right}, A {A_right}
+# 구조화 출력(--structured): 템플릿의 reasoning 설명과 선택지 이름을 같은 Left|Right enum 스키마로 매핑
+REASONING_DESC = TEMPLATES[LANG]["reasoning_desc"]
+CHOICE_DESC = TEMPLATES[LANG]["choice_desc"]
 
-هذا السؤال يتعلق بـ **{metric}**.
-
-يرجى إرجاع التنسيق التالي فقط بصيغة JSON:
-{{
-  "reasoning": "<سبب الاختيار في جملة أو جملتين>",
-  "choice": "Left" | "Right"
-}}
-"""
-,
-)
-parser = JsonOutputParser()
-chain = prompt_template | llm | parser
+# 묶음 모드(--packed): 페르소나당 한 번의 요청으로 모든 시나리오를 묻는다
+PACKED_HEADER = TEMPLATES[LANG]["packed_header"]
+PACKED_ITEM = TEMPLATES[LANG]["packed_item"]
 
 def load_personas(path: Path) -> List[Dict[str, Any]]:
-    out = []
-    with path.open(encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                j = json.loads(line)
-                out.append({"persona": j["persona"], "idx": int(j["idx"])})
-                if len(out) >= MAX_PERSONAS:
-                    break
-            except (json.JSONDecodeError, KeyError):
-                continue
-    return out
+    # 바이트 오프셋 색인(persona_store)으로 읽는다. 원본이 바뀌었을 때만 색인을 다시 만든다
+    return list(islice(open_store(path), MAX_PERSONAS))
 
+def persona_idxs(path: Path) -> List[int]:
+    """줄을 파싱하지 않고 색인에서 idx 만 (파일 순서)"""
+    return open_store(path).idxs()[:MAX_PERSONAS]
 
 def load_scenarios(path: Path) -> List[Dict[str, Any]]:
     with path.open(encoding="utf-8") as f:
         return json.load(f)["experiments"]
 
 
-def list_existing(out_dir: Path) -> set:
-    return {
-        int(p.stem.split("_")[1])
-        for p in out_dir.glob("Person_*.json")
-        if "_" in p.stem
-    }
+def list_existing(manifest: RunManifest, config: str) -> set:
+    return manifest.done_idx(LANG, config)
 
 def build_payloads(desc: str, scn: List[Dict[str, Any]]
                    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
@@ -116,69 +119,211 @@ def build_payloads(desc: str, scn: List[Dict[str, Any]]
             )
     return payloads, meta
 
-def save_results(out_dir: Path, pid: Any, desc: str,
-                 resps: List[Any], meta: List[Dict[str, Any]]) -> None:
-    data: Dict[str, Dict[str, Any]] = {}
-    for m, r in zip(meta, resps):
-        d, i = m["difficulty"], m["scenario_idx"]
-        data.setdefault(d, {})
-        if isinstance(r, Exception):
-            data[d][f"scenario_{i+1}"] = {"error": str(r)}
-        else:
-            data[d][f"scenario_{i+1}"] = {
-                "persona_id": pid, "persona_desc": desc, "difficulty": d,
-                "metric": m["metric"],
-                "options": {
-                    "left":  {"A": m["A_left"],  "B": m["B_left"]},
-                    "right": {"A": m["A_right"], "B": m["B_right"]},
-                },
-                "thought": r.get("reasoning", ""),
-                "answer":  r.get("choice", ""),
-            }
-    out_dir.mkdir(parents=True, exist_ok=True)
-    (out_dir / f"Person_{pid}.json").write_text(
-        json.dumps(data, ensure_ascii=False, indent=4), encoding="utf-8"
-    )
-
-def process_persona(persona: Dict[str, Any], cfg: Dict[str, Path]) -> None:
-    scn = load_scenarios(cfg["scenarios"])
-    payloads, meta = build_payloads(persona["persona"], scn)
-    try:
-        resps = chain.batch(payloads, config={"max_concurrency": 50})
-        save_results(cfg["output"], persona["idx"], persona["persona"], resps, meta)
-    except Exception as e:
-        print(f"[idx {persona['idx']}] Error → {e}")
+# 결과는 results_log 샤드에 셀 단위 row 로 쌓이고, 예전 파일 형식은 --export-legacy 로 만든다
+def export_results(cfg: Dict[str, Path], config: str) -> None:
+    n = export_legacy(cfg["results_log"], cfg["output"], LANG, config, "Person_{idx}.json", "{idx}")
+    print(f"[✓] Exported {n} persona files → {cfg['output']}")
 
+def open_manifest(cfg: Dict[str, Path]) -> RunManifest:
+    return RunManifest(cfg["results_log"] / MANIFEST_FILE)
 
-def invoke_persona(persona: Dict[str, Any], cfg: Dict[str, Path]) -> None:
-    scn = load_scenarios(cfg["scenarios"])
-    payloads, meta = build_payloads(persona["persona"], scn)
-    res = []
+def rebuild_manifest(cfg: Dict[str, Path], config: str) -> None:
+    manifest = open_manifest(cfg)
+    # 결과 로그가 있으면 로그에서, 없으면 예전 Person_*.json 폴더에서 재구축
+    if any(cfg["results_log"].glob("rows-*")):
+        n = manifest.rebuild_from_log(cfg["results_log"])
+    else:
+        n = manifest.rebuild_from_files(cfg["output"], LANG, config)
+    print(f"[✓] Rebuilt manifest ({n} cells) → {manifest.path}")
+
+def is_complete(r: Any) -> bool:
+    # validate 와 같은 기준: reasoning/choice 가 모두 있어야 정상 응답 (선택 전용 셀은 choice 만)
+    return isinstance(r, dict) and bool(r.get("choice")) and (bool(r.get("reasoning")) or bool(r.get("choice_only")))
+
+def has_choice(r: Any) -> bool:
+    # logprob 모드: reasoning 없이 Left/Right 선택만 있으면 정상 응답
+    return isinstance(r, dict) and r.get("choice") in ("Left", "Right")
+
+def build_engine(args: argparse.Namespace, metrics: Optional[RunMetrics] = None,
+                 budget: Optional[RunBudget] = None, model: str = MODEL_NAME,
+                 temperature: float = 1) -> ExperimentEngine:
+    if (args.logprobs or args.choice_only) and (args.packed or args.pack_shuffle):
+        raise ValueError("--logprobs / --choice-only 는 --packed 와 함께 쓸 수 없습니다.")
+    if args.logprobs and args.choice_only:
+        raise ValueError("--logprobs 와 --choice-only 는 함께 쓸 수 없습니다.")
+    # 클라이언트는 실행 전체에서 하나만 생성해 재사용
+    return ExperimentEngine(backend_from_args(args, model, temperature=temperature),
+                            choice_prompt_template if args.logprobs else prompt_template,
+                            max_concurrency=args.max_concurrency, limiter=limiter_from_args(args),
+                            parser=SchemaParser() if args.structured else None,
+                            cache=cache_from_args(args),
+                            is_valid=has_choice if args.logprobs else is_complete,
+                            packer=packer_from_args(args, PACKED_HEADER, PACKED_ITEM),
+                            logprobs=LOGPROB_TOP_K if args.logprobs else 0,
+                            choice_prompt=choice_prompt_template if args.choice_only else None,
+                            choice_max_tokens=CHOICE_MAX_TOKENS, stream=args.stream,
+                            schemas=schemas_for(REASONING_DESC, CHOICE_DESC, args.logprobs)
+                            if args.structured else None,
+                            metrics=metrics, hedger=hedger_from_args(args),
+                            hard_timeout=args.hard_timeout, budget=budget)
+
+
+def build_cells(desc: str, scn: List[Dict[str, Any]]
+                ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    payloads, meta = build_payloads(desc, scn)
     for p in payloads:
+        p["_sample"] = REPEAT
+    return payloads, meta
+
+
+def cell_keys(idx: int, meta: List[Dict[str, Any]]) -> List[Tuple[int, int, str, int]]:
+    return [(REPEAT, idx, m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+
+
+def record(log: ResultsLog, manifest: RunManifest, config: str, persona: Dict[str, Any],
+           resps: List[Any], meta: List[Dict[str, Any]]) -> None:
+    log.append_persona(LANG, config, REPEAT, persona["idx"], persona["persona"], resps, meta)
+    manifest.record_persona(LANG, config, REPEAT, persona["idx"], resps, meta)
+
+
+def process_personas(engine: ExperimentEngine, personas: List[Dict[str, Any]],
+                     cfg: Dict[str, Path], log: ResultsLog, manifest: RunManifest,
+                     config: str, cells: Optional[CellSet] = None, desc: str = "Running",
+                     reasoning: Optional[Set[Tuple[int, int, str, int]]] = None,
+                     observe: Optional[Callable[[str, List[Any], List[Dict[str, Any]]], None]] = None,
+                     lease: Optional[QueueLease] = None) -> None:
+    """전체 실행과 재실행(--ids / --rerun-*)이 같은 동시 실행 경로를 쓴다.
+    cells 가 주어지면 페르소나마다 해당 (difficulty, scenario) 셀만 다시 묻는다.
+    reasoning 이 주어지면(--choice-only) 그 셀만 reasoning 을 묻고 나머지는 선택만 묻는다.
+    observe 가 주어지면(--adaptive-*) 기록한 응답을 (도메인, 응답, meta) 로 넘긴다.
+    lease 가 주어지면(--queue) 큐에 커밋된 셀만 기록한다 (임대를 잃은 셀은 다른 워커가 기록)."""
+    scn = load_scenarios(cfg["scenarios"])
+    groups, pending = [], []
+    for persona in personas:
+        payloads, meta = build_cells(persona["persona"], scn)
+        mark_choice_only(payloads, meta, REPEAT, persona["idx"], reasoning)
+        if cells is not None:
+            payloads, meta = select_cells(payloads, meta, cells.get((REPEAT, persona["idx"]), set()))
+            if not payloads:
+                continue
+        groups.append(((persona, meta), payloads))
+        pending += cell_keys(persona["idx"], meta)
+    manifest.mark_pending(LANG, config, pending)
+
+    def write(persona, resps, meta):
         try:
-            res.append(chain.invoke(p))
+            record(log, manifest, config, persona, resps, meta)
         except Exception as e:
-            res.append(e)
-    save_results(cfg["output"], persona["idx"], persona["persona"], res, meta)
+            print(f"[idx {persona['idx']}] Error → {e}")
+        if observe is not None:
+            observe(persona.get("domain", ""), resps, meta)
+
+    def on_done(key, resps):
+        persona, meta = key
+        if lease is None:
+            write(persona, resps, meta)
+        else:  # 큐 커밋이 끝난 뒤 커밋된 셀만 기록
+            lease.accept(REPEAT, persona["idx"], resps, meta, lambda rs, ms: write(persona, rs, ms))
+
+    try:
+        engine.run_groups(groups, on_done, desc=desc)
+    finally:
+        if lease is not None:
+            lease.flush()
+    if engine.retries:
+        print("Retries →", dict(engine.retries))
+    if engine.pack_stats:
+        print("Packed →", dict(engine.pack_stats))
+    if engine.stream_stats:
+        print("Stream →", dict(engine.stream_stats))
+    if engine.hedge_stats:
+        print("Hedge →", dict(engine.hedge_stats))
+
+
+def run_adaptive(engine: ExperimentEngine, personas: List[Dict[str, Any]], cfg: Dict[str, Path],
+                 log: ResultsLog, manifest: RunManifest, config: str, sampler: AdaptiveSampler,
+                 reasoning: Optional[Set[Tuple[int, int, str, int]]] = None) -> None:
+    """페르소나를 도메인별 층화 무작위 순서의 wave 로 나눠 보내고, 구간이 좁아진 셀은 다음 wave 부터 묻지 않는다.
+    이미 기록된 row 로 셀 추정을 채우므로 다시 시작해도 min_n 부터 다시 묻지 않는다."""
+    _, meta = build_payloads("", load_scenarios(cfg["scenarios"]))
+    cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    sampler.resume(load_cells(cfg["results_log"], LANG, config).values(), open_store(cfg["data"]).domain_of)
+    units = [(p["domain"], (REPEAT, p["idx"]), p) for p in personas]
+    for i, (wave, wanted) in enumerate(sampler.waves(units, cells), 1):
+        process_personas(engine, wave, cfg, log, manifest, config, wanted,
+                         desc=f"Adaptive wave {i}", reasoning=reasoning, observe=sampler.observe)
+    # 셀이 닫혀 보내지 않은 페르소나는 --rerun-missing 이 다시 보내지 않도록 skipped 로 남긴다
+    manifest.mark_skipped(LANG, config, [(r, i, d, s) for r, i in sampler.skipped for d, s in cells])
+    print(format_summary(sampler.report()))
+    print(f"[✓] Saved → {sampler.save(cfg['results_log'])}")
+
 
-def worker(args: Tuple[Dict[str, Any], Dict[str, Path], bool]):
-    person, cfg, inv = args
-    (invoke_persona if inv else process_persona)(person, cfg)
+def run_queued(engine: ExperimentEngine, personas: List[Dict[str, Any]], cfg: Dict[str, Path],
+               log: ResultsLog, manifest: RunManifest, config: str, queue: WorkQueue,
+               reasoning: Optional[Set[Tuple[int, int, str, int]]] = None) -> None:
+    """페르소나의 모든 셀을 공유 큐에 등록하고(이미 있으면 그대로), 큐가 빌 때까지 셀 묶음을 임대해 실행"""
+    _, meta = build_payloads("", load_scenarios(cfg["scenarios"]))
+    cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    by_idx = {p["idx"]: p for p in personas}
+    added = queue.enqueue(LANG, config, [(REPEAT, p["idx"], d, s) for p in personas for d, s in cells])
+    print(f"[Queue] {queue.worker}: +{added} cells → {queue.counts(LANG, config)}")
+    for n, lease in enumerate(queue.leases(LANG, config), 1):
+        process_personas(engine, [by_idx[i] for _, i in lease.cells], cfg, log, manifest, config,
+                         lease.cells, desc=f"Lease {n}", reasoning=reasoning, lease=lease)
+    print("Queue →", dict(queue.stats), queue.counts(LANG, config))
 
-def run_batch(cfg: Dict[str, Path],
+
+def run_batch(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+              manifest: RunManifest, config: str,
               targets: List[int] | None = None,
-              invoke: bool = False) -> None:
-    persons = load_personas(cfg["data"])
-    if targets:
-        persons = [p for p in persons if p["idx"] in targets]
-    pending = [p for p in persons if p["idx"] not in list_existing(cfg["output"])]
+              rerun: bool = False,
+              cells: Optional[CellSet] = None,
+              reasoning: Optional[Set[Tuple[int, int, str, int]]] = None,
+              sampler: Optional[AdaptiveSampler] = None,
+              queue: Optional[WorkQueue] = None) -> None:
+    if targets is not None and not targets:  # --rerun-missing / --rerun-problems 에서 대상이 없음
+        print("No target personas. Exit.")
+        return
+    # 대상 idx 가 있으면 색인에서 해당 줄만 읽는다
+    persons = open_store(cfg["data"]).select(targets) if targets is not None else load_personas(cfg["data"])
+    if queue is not None:
+        # 완료 여부는 큐가 판단한다 (다른 워커가 끝낸 셀은 다시 임대되지 않음)
+        run_queued(engine, persons, cfg, log, manifest, config, queue, reasoning)
+        return
+    if rerun:
+        # 재실행(--ids / --rerun-*)은 이미 기록된 idx 라도 다시 실행해 최신 row 로 덮는다
+        pending = persons
+    else:
+        # 적응 표본 추출은 전에 건너뛴 페르소나도 후보로 다시 둔다 (이어 받은 추정으로 다시 판단)
+        existing = (manifest.done_idx(LANG, config, skipped=False) if sampler is not None
+                    else list_existing(manifest, config))
+        pending = [p for p in persons if p["idx"] not in existing]
     if not pending:
         print("No target personas. Exit.")
         return
 
-    tasks = [(p, cfg, invoke) for p in pending]
-    with Pool(4) as pool:
-        list(tqdm(pool.imap_unordered(worker, tasks), total=len(tasks), desc="Running"))
+    if sampler is not None:
+        run_adaptive(engine, pending, cfg, log, manifest, config, sampler, reasoning)
+        return
+    process_personas(engine, pending, cfg, log, manifest, config, cells,
+                     desc="Rerunning" if rerun else "Running", reasoning=reasoning)
+
+def dry_run(engine: ExperimentEngine, cfg: Dict[str, Path], args: argparse.Namespace,
+            manifest: RunManifest, reasoning: Optional[Set[Tuple[int, int, str, int]]] = None) -> None:
+    """--dry-run: 아직 결과가 없는 페르소나의 프롬프트를 렌더링해 호출 수 / 토큰 / 비용 / 예상 시간만 출력"""
+    scn = load_scenarios(cfg["scenarios"])
+    span = persona_range(args.persona_range)
+    existing = list_existing(manifest, args.config)
+    personas = open_store(cfg["data"]).range(*span) if span else load_personas(cfg["data"])
+    calls = []
+    for p in personas:
+        if p["idx"] in existing:
+            continue
+        payloads, meta = build_cells(p["persona"], scn)
+        mark_choice_only(payloads, meta, REPEAT, p["idx"], reasoning)
+        calls += engine.render_calls(payloads)
+    print(format_plan(estimate_plan(calls, price_from_args(args, MODEL_NAME), observed(cfg["results_log"]),
+                                    args.rpm, args.tpm, args.max_concurrency)))
 
 def parse_cli() -> argparse.Namespace:
     ap = argparse.ArgumentParser("Gemini Social‑Preference Experiments (KR)")
@@ -189,47 +334,107 @@ def parse_cli() -> argparse.Namespace:
     g.add_argument("--nopersona", action="store_true")
     g.add_argument("--rerun-missing", action="store_true")
     g.add_argument("--rerun-problems", action="store_true")
+    add_plan_args(g)
+    g.add_argument("--export-legacy", action="store_true",
+                   help="결과 로그를 예전 Person_*.json 파일로 내보내기")
+    g.add_argument("--rebuild-manifest", action="store_true",
+                   help="기존 결과(로그 또는 Person_*.json)로부터 매니페스트 재구축")
+    ap.add_argument("--log-format", choices=["jsonl", "parquet"], default="jsonl",
+                    help="결과 로그 샤드 형식")
+    ap.add_argument("--max-concurrency", type=int, default=50,
+                    help="모든 페르소나·시나리오에 걸친 전역 동시 요청 수")
+    add_limiter_args(ap)
+    add_cache_args(ap)
+    add_packed_args(ap)
+    add_backend_args(ap)
+    add_choice_args(ap)
+    add_structured_args(ap)
+    add_metrics_args(ap)
+    add_hedge_args(ap)
+    add_adaptive_args(ap)
+    add_queue_args(ap)
+    add_budget_args(ap)
+    ap.add_argument("--stream", action="store_true",
+                    help="응답을 스트림으로 받아 choice 확정 즉시 처리 (--choice-only 셀은 그 시점에 스트림을 끊음)")
+    ap.add_argument("--logprobs", action="store_true",
+                    help="선택만 묻고 토큰 logprob 으로 P(Left)/P(Right) 를 저장")
     return ap.parse_args()
 
-def validate(cfg: Dict[str, Path]) -> List[int]:
-    bad = []
-    for f in cfg["output"].glob("Person_*.json"):
-        try:
-            idx = int(f.stem.split("_")[1])
-            d = json.loads(f.read_text(encoding="utf-8"))
-            for diff in d.values():
-                for sc in diff.values():
-                    if not sc.get("thought") or not sc.get("answer"):
-                        bad.append(idx); break
-        except Exception:
-            bad.append(idx)
-    return sorted(set(bad))
+def validate(manifest: RunManifest, config: str) -> CellSet:
+    return manifest.problem_cells(LANG, config, REPEAT)
 
-def main() -> None:
-    try:
-        set_start_method("spawn")
-    except RuntimeError:
-        pass
+def choice_only_reasoning(cfg: Dict[str, Path], args: argparse.Namespace
+                          ) -> Optional[Set[Tuple[int, int, str, int]]]:
+    """--choice-only: 전체 모집단(페르소나 × 셀)에서 도메인별 층화로 reasoning 을 물을 표본"""
+    if not args.choice_only:
+        return None
+    _, meta = build_payloads("", load_scenarios(cfg["scenarios"]))
+    cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    # 층 구분에는 idx / 도메인만 필요하므로 색인만 쓴다
+    return reasoning_cells(open_store(cfg["data"]).stubs()[:MAX_PERSONAS], cells, [REPEAT],
+                           args.reasoning_per_stratum, args.reasoning_seed)
 
+def main() -> None:
     args = parse_cli()
     cfg = CONFIGS[args.config]
+    if args.export_legacy:
+        export_results(cfg, args.config)
+        return
+    if args.rebuild_manifest:
+        rebuild_manifest(cfg, args.config)
+        return
 
-    if args.all:
-        run_batch(cfg)
-    elif args.nopersona:
-        run_batch(cfg, targets=["NONE"])
-    elif args.rerun_missing:
-        all_idx = {p["idx"] for p in load_personas(cfg["data"])}
-        missing = sorted(all_idx - list_existing(cfg["output"]))
-        print("Missing →", missing)
-        run_batch(cfg, targets=missing, invoke=True)
-    elif args.rerun_problems:
-        probs = validate(cfg)
-        print("Problems →", probs)
-        run_batch(cfg, targets=probs, invoke=True)
-    else:
-        ids = [int(x) for tok in args.ids for x in tok.split(",") if x.strip()]
-        run_batch(cfg, targets=ids, invoke=True)
+    if args.dry_run:
+        args.backend = "stub"  # 프롬프트 렌더링만 하므로 API 클라이언트를 만들지 않는다
+        dry_run(build_engine(args), cfg, args, open_manifest(cfg), choice_only_reasoning(cfg, args))
+        return
+
+    # --plan: 컴파일된 플랜의 (모델, temperature) 로 엔진을 만든다
+    plan = plan_from_args(args)
+    model, temperature = plan.arm(LANG, args.config) if plan is not None else (MODEL_NAME, 1)
+    if plan is not None:  # 기본이 아닌 arm 은 multi_run.py 와 같은 arm 폴더에 쓴다
+        cfg = {**cfg, "results_log": arm_dir(cfg["results_log"], (model, temperature))}
+    metrics = metrics_from_args(args, LANG, cfg["results_log"])
+    budget = budget_from_args(args, LANG, model, cfg["results_log"])
+    engine = build_engine(args, metrics, budget, model, temperature)
+    manifest = open_manifest(cfg)
+    reasoning = choice_only_reasoning(cfg, args)
+    try:
+        with ResultsLog(cfg["results_log"], fmt=args.log_format) as log, closing(metrics):
+            if plan is not None:
+                # 플랜의 태스크 중 ok 가 아닌 셀만 실행 (페르소나 범위 / 반복은 플랜에 들어 있음)
+                run_plan(engine, plan, log, manifest, LANG, args.config, reasoning)
+            elif args.all:
+                sampler, queue = sampler_from_args(args, LANG), queue_from_args(args)
+                if sampler is not None and queue is not None:
+                    raise ValueError("--queue 는 --adaptive-* 와 함께 쓸 수 없습니다.")
+                run_batch(engine, cfg, log, manifest, args.config, reasoning=reasoning,
+                          sampler=sampler, queue=queue)
+            elif args.nopersona:
+                run_batch(engine, cfg, log, manifest, args.config, targets=["NONE"], reasoning=reasoning)
+            elif args.rerun_missing:
+                all_idx = set(persona_idxs(cfg["data"]))
+                missing = sorted(all_idx - list_existing(manifest, args.config))
+                print("Missing →", missing)
+                run_batch(engine, cfg, log, manifest, args.config, targets=missing, rerun=True,
+                          reasoning=reasoning)
+            elif args.rerun_problems:
+                cells = validate(manifest, args.config)
+                probs = sorted(i for _, i in cells)
+                print("Problems →", probs, f"({sum(map(len, cells.values()))} cells)")
+                run_batch(engine, cfg, log, manifest, args.config, targets=probs, rerun=True,
+                          cells=cells, reasoning=reasoning)
+            else:
+                ids = [int(x) for tok in args.ids for x in tok.split(",") if x.strip()]
+                run_batch(engine, cfg, log, manifest, args.config, targets=ids, rerun=True,
+                          reasoning=reasoning)
+    except BudgetExhausted as e:
+        # 끝난 페르소나는 기록됐고 나머지는 결과가 없으므로 --all 로 다시 실행하면 이어진다
+        print(f"[Budget] {e} → 멈춤. --all 로 이어서 실행하세요.")
+    finally:
+        if budget is not None:
+            budget.close()
+        print_key_usage()
 
 if __name__ == "__main__":
     main()
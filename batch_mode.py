@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+배치 예측 파일 모드 (지연이 중요하지 않은 대량 실행을 배치 채널로)
+------------------------------------------------
+컴파일된 플랜(experiment_plan)의 태스크를 Gemini Batch API 요청 JSONL 로 내보내고,
+제공자가 돌려준 배치 출력 JSONL 을 다시 결과 로그(results_log) / 매니페스트(run_manifest) 형식으로 들여온다.
+  - 내보내기: (언어, 설정, arm) 마다 파일 하나 (배치 작업 하나 = 모델 하나).
+    한 줄이 (반복, 페르소나, 시나리오) 셀 하나이고 key 는 태스크의 고정 task_id 라서 다시 내보내도 같다.
+    매니페스트에 ok 로 있는 셀은 빼고, 내보낸 셀은 pending 으로 등록한다.
+    파일 목록 / 모델 / 선택 전용 · 구조화 출력 설정은 batches.json 에 남는다.
+  - 들여오기: key 로 플랜의 태스크를 찾아 응답을 러너와 같은 방식(JSON 파싱, 실패하면 choice 정규식)으로 읽고
+    (반복, 페르소나) 단위로 결과 row / 매니페스트 셀을 쓴다. 오류 줄과 깨진 응답은 error 셀로 남아 다시 내보내진다.
+  - fake: 요청 파일로 제공자 형식의 출력 파일을 만든다 (stub_backend, API 없음) — 왕복 전체를 오프라인으로 시험할 때.
+
+  python multi_run.py --plan campaign.json --batch-export batch/ --choice-only
+  python batch_mode.py fake --batch-dir batch/
+  python multi_run.py --plan campaign.json --batch-ingest batch/*.output.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from choice_mode import CHOICE_MAX_TOKENS, mark_choice_only
+from experiment_plan import Arm, ExperimentPlan, arm_id, task_meta
+from llm_backend import estimate_tokens
+from prompt_templates import TEMPLATES
+from results_log import ResultsLog
+from run_manifest import MANIFEST_FILE, RunManifest, cell_state
+from stream_parser import salvage_choice
+from structured_output import SchemaParser, schemas_for
+
+BATCH_MANIFEST = "batches.json"
+OUTPUT_SUFFIX = ".output.jsonl"
+
+DirOf = Callable[[str, str, Arm], Path]  # (언어, 설정, arm) → 결과 로그 폴더
+
+
+class BatchError(Exception):
+    """배치 출력의 오류 줄 (code 가 있으면 classify_error 가 quota / unavailable 로 분류한다)"""
+
+    def __init__(self, error: Dict[str, Any]):
+        self.code = error.get("code")
+        super().__init__(f"{error.get('code', '')} {error.get('status', '')}: {error.get('message', '')}".strip())
+
+
+def batch_file(lang: str, config: str, arm: Arm) -> str:
+    model = re.sub(r"[^\w.-]", "_", arm[0])
+    return f"({lang}){config}_{model}_Temp{float(arm[1]):g}.jsonl"
+
+
+def batch_request(prompt: str, temperature: float, max_output_tokens: Optional[int] = None,
+                  schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """GenerateContentRequest (REST JSON) — 엔진이 온라인으로 보내는 것과 같은 생성 설정"""
+    config: Dict[str, Any] = {"temperature": temperature}
+    if max_output_tokens:
+        config["maxOutputTokens"] = max_output_tokens
+    if schema is not None:
+        config["responseMimeType"] = "application/json"
+        config["responseJsonSchema"] = schema
+    return {"contents": [{"role": "user", "parts": [{"text": prompt}]}], "generationConfig": config}
+
+
+# ---------- 내보내기 ---------- #
+def export_batches(plan: ExperimentPlan, slices: List[Tuple[str, str, Arm]], out_dir: Path, dir_of: DirOf,
+                   structured: bool = False, choice: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """조각마다 매니페스트에 ok 로 없는 셀을 요청 파일로 쓰고 pending 으로 등록.
+    choice = {"per_stratum", "seed"} 면 표본 밖 셀은 선택 전용 프롬프트 / 짧은 출력 상한으로 묻는다."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for lang, config, arm in slices:
+        manifest = RunManifest(dir_of(lang, config, arm) / MANIFEST_FILE)
+        reasoning = plan.reasoning(lang, config, choice["per_stratum"], choice["seed"]) if choice else None
+        t = TEMPLATES[lang]
+        schemas = schemas_for(t["reasoning_desc"], t["choice_desc"]) if structured else None
+        path = out_dir / batch_file(lang, config, arm)
+        pending = []
+        with path.open("w", encoding="utf-8") as f:
+            for (repeat, idx, _), payloads, meta in plan.groups(lang, config, arm,
+                                                                skip=manifest.ok_cells(lang, config)):
+                mark_choice_only(payloads, meta, repeat, idx, reasoning)
+                for p, m in zip(payloads, meta):
+                    short = p.get("_choice_only", False)
+                    req = batch_request(p["_choice_prompt"] if short else p["_prompt"], arm[1],
+                                        CHOICE_MAX_TOKENS if short else None,
+                                        schemas["choice" if short else "cell"] if schemas else None)
+                    f.write(json.dumps({"key": m["task_id"], "request": req}, ensure_ascii=False) + "\n")
+                    pending.append((repeat, idx, m["difficulty"], m["scenario_idx"] + 1))
+        if not pending:
+            path.unlink()
+            print(f"[Batch] {lang}/{config}/{arm_id(arm)}: 0 cells to export")
+            continue
+        manifest.mark_pending(lang, config, pending)
+        files.append({"file": path.name, "lang": lang, "config": config, "model": arm[0],
+                      "temperature": arm[1], "requests": len(pending)})
+        print(f"[Batch] {lang}/{config}/{arm_id(arm)}: {len(pending)} requests → {path}")
+    info = {"plan": str(plan.path.resolve()), "created": time.time(), "structured": structured,
+            "choice_only": choice, "files": files}
+    (out_dir / BATCH_MANIFEST).write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8")
+    return info
+
+
+# ---------- 들여오기 ---------- #
+def response_text(resp: Dict[str, Any]) -> str:
+    """GenerateContentResponse 의 첫 후보 텍스트"""
+    cands = resp.get("candidates") or []
+    parts = (cands[0].get("content") or {}).get("parts") or [] if cands else []
+    return "".join(p.get("text", "") for p in parts if not p.get("thought"))
+
+
+def read_output(path: Path) -> Iterator[Tuple[str, Any, int, int]]:
+    """배치 출력 한 줄씩 → (key, 응답 텍스트 또는 BatchError, 입력 토큰, 출력 토큰)"""
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            j = json.loads(line)
+            resp = j.get("response")
+            if resp is None:
+                yield j.get("key", ""), BatchError(j.get("error") or j.get("status") or {}), 0, 0
+                continue
+            usage = resp.get("usageMetadata") or {}
+            yield (j.get("key", ""), response_text(resp),
+                   usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0))
+
+
+def parse_response(parser: Any, text: str, choice_only: bool) -> Any:
+    """엔진의 _parse 와 같은 규칙 (파싱 실패면 choice 정규식, 그래도 안 되면 오류 객체)"""
+    try:
+        result = parser.parse(text)
+    except Exception as e:
+        result = salvage_choice(text)
+        if result is None:
+            return e
+    if choice_only and isinstance(result, dict):
+        result["choice_only"] = True
+    return result
+
+
+def ingest_batches(plan: ExperimentPlan, outputs: List[Path], batch_dir: Path, dir_of: DirOf,
+                   log_format: str = "jsonl") -> Counter:
+    """배치 출력 파일들을 결과 로그 / 매니페스트에 기록. 같은 key 가 여러 번 나오면 나중 줄을 쓴다."""
+    info = json.loads((Path(batch_dir) / BATCH_MANIFEST).read_text(encoding="utf-8"))
+    if info["structured"]:
+        parser: Any = SchemaParser()
+    else:
+        from langchain_core.output_parsers import JsonOutputParser
+        parser = JsonOutputParser()
+    choice = info.get("choice_only")
+    stats: Counter = Counter()
+    latest: Dict[str, Tuple[Any, int, int]] = {}
+    for path in outputs:
+        for key, res, tokens_in, tokens_out in read_output(path):
+            latest[key] = (res, tokens_in, tokens_out)
+
+    # (lang, config, arm, 반복, run, idx) 단위로 묶어 러너처럼 페르소나 하나씩 기록
+    groups: Dict[Tuple, List[Tuple[Dict[str, Any], Any]]] = defaultdict(list)
+    reasoning: Dict[Tuple[str, str], Optional[Set[Tuple[int, int, str, int]]]] = {}
+    for key, (res, tokens_in, tokens_out) in latest.items():
+        t = plan.get(key)
+        if t is None:
+            stats["unknown"] += 1
+            continue
+        lang, config = t["lang"], t["config"]
+        if (lang, config) not in reasoning:
+            reasoning[lang, config] = (plan.reasoning(lang, config, choice["per_stratum"], choice["seed"])
+                                       if choice else None)
+        sample = reasoning[lang, config]
+        short = sample is not None and (t["repeat"], t["idx"], t["difficulty"], t["scenario"]) not in sample
+        if not isinstance(res, Exception):
+            res = parse_response(parser, res, short)
+        stats.update(input_tokens=tokens_in, output_tokens=tokens_out)
+        groups[(lang, config, (t["model"], t["temperature"]), t["repeat"], t["run"], t["idx"])].append((t, res))
+
+    with ExitStack() as stack:
+        logs: Dict[Path, Tuple[ResultsLog, RunManifest]] = {}
+        for (lang, config, arm, repeat, run, idx), cells in sorted(groups.items()):
+            root = dir_of(lang, config, arm)
+            if root not in logs:
+                logs[root] = (stack.enter_context(ResultsLog(root, fmt=log_format)),
+                              RunManifest(root / MANIFEST_FILE))
+            log, manifest = logs[root]
+            cells.sort(key=lambda c: c[0]["seq"])
+            meta = [task_meta(t) for t, _ in cells]
+            resps = [r for _, r in cells]
+            persona = plan.persona(run, idx, cells[0][0]["domain"])
+            log.append_persona(lang, config, repeat, idx, persona["persona"], resps, meta)
+            manifest.record_persona(lang, config, repeat, idx, resps, meta)
+            stats.update(cell_state(r)[0] for r in resps)
+    return stats
+
+
+# ---------- 오프라인 출력 (fake) ---------- #
+async def _fake_lines(requests: Path, model: str, temperature: float, seed: int,
+                      error_rate: float) -> List[Dict[str, Any]]:
+    from stub_backend import StubBackend
+
+    backend = StubBackend(model=model, temperature=temperature, seed=seed)
+    rng = random.Random(seed)
+    out = []
+    with requests.open(encoding="utf-8") as f:
+        for line in f:
+            j = json.loads(line)
+            if rng.random() < error_rate:
+                out.append({"key": j["key"], "error": {"code": 503, "status": "UNAVAILABLE",
+                                                       "message": "fake batch error"}})
+                continue
+            req = j["request"]
+            prompt = req["contents"][0]["parts"][0]["text"]
+            comp = await backend.agenerate(prompt, schema=req["generationConfig"].get("responseJsonSchema"))
+            out.append({"key": j["key"], "response": {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": comp.text}]},
+                                "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": estimate_tokens(prompt),
+                                  "candidatesTokenCount": estimate_tokens(comp.text)}}})
+    rng.shuffle(out)  # 제공자 출력은 요청 순서를 보장하지 않는다
+    return out
+
+
+def fake_outputs(batch_dir: Path, seed: int = 0, error_rate: float = 0.0) -> List[Path]:
+    """batches.json 의 요청 파일마다 제공자 형식의 <파일>.output.jsonl 을 만든다 (API 없음)"""
+    batch_dir = Path(batch_dir)
+    info = json.loads((batch_dir / BATCH_MANIFEST).read_text(encoding="utf-8"))
+    paths = []
+    for entry in info["files"]:
+        req = batch_dir / entry["file"]
+        lines = asyncio.run(_fake_lines(req, entry["model"], entry["temperature"], seed, error_rate))
+        path = req.with_name(req.name[:-len(".jsonl")] + OUTPUT_SUFFIX)
+        path.write_text("".join(json.dumps(x, ensure_ascii=False) + "\n" for x in lines), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_batch_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--batch-export", type=Path, metavar="DIR",
+                    help="API 를 부르지 않고 남은 셀을 배치 요청 JSONL 로 내보냄 (조각마다 파일 하나 + batches.json)")
+    ap.add_argument("--batch-ingest", type=Path, nargs="+", metavar="OUTPUT",
+                    help="배치 출력 JSONL 을 결과 로그 / 매니페스트로 들여옴")
+    ap.add_argument("--batch-dir", type=Path,
+                    help="--batch-ingest: batches.json 이 있는 폴더 (기본: 첫 출력 파일의 폴더)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Batch prediction files")
+    ap.add_argument("command", choices=["fake", "info"])
+    ap.add_argument("--batch-dir", type=Path, required=True, help="--batch-export 로 만든 폴더")
+    ap.add_argument("--seed", type=int, default=0, help="fake: stub 응답 시드")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fake: 오류 줄 비율")
+    args = ap.parse_args()
+
+    if args.command == "fake":
+        for path in fake_outputs(args.batch_dir, args.seed, args.error_rate):
+            print(f"[✓] {path}")
+    else:
+        info = json.loads((args.batch_dir / BATCH_MANIFEST).read_text(encoding="utf-8"))
+        print(json.dumps(info, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
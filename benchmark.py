@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+러너 처리량 벤치마크 (API 호출 / 네트워크 없음)
+------------------------------------------------
+mock_backend.MockBackend(지연 분포 / 429 / 깨진 JSON / 토큰 속도)를 상대로
+N 페르소나 × 6 시나리오 계획을 실행 방식(mode)별로 돌려 비교한다.
+  - legacy        : 예전 구조. Pool(--legacy-pool) 로 페르소나를 돌리고 페르소나마다 chain.batch(6 셀).
+                    429 는 SDK 재시도(6 회, 1 초부터 2 배), 셀 하나가 실패하면 페르소나 전체를 잃는다.
+  - engine        : ExperimentEngine 전역 세마포어 + AIMD 리미터 + 셀 단위 재시도
+  - packed / choice-only / choice-stream / structured / structured-packed : 각 모드 옵션을 켠 engine
+  - hedged        : engine + 헤지 요청 (--hedge-quantile 분위, 기본 0.95) + --hard-timeout
+--keys N 이면 engine 계열 모드가 키마다 모의 서버(키별 쿼터 = 프로필 rpm 또는 --key-rpm)를 따로 두고
+key_pool.KeyPool 로 묶어 보낸다 (legacy 는 키 하나). 리미터 RPM 기본값은 키 쿼터의 합, 키별 429 / 격리 횟수는 extra 에 남는다.
+시간은 VirtualTimeLoop 의 가상 시계로 흐르므로 (sleep 만 하는 시뮬레이션) 10k × 6 계획도 몇 초~몇십 초에 끝나고,
+같은 --seed 면 결과가 매번 같다. 보고 항목: 요청/s, 셀/s, 지연 p50/p95/p99, 429·깨진 JSON 비율, 재시도, 토큰, 벽시계 시간.
+
+  python benchmark.py --personas 10000 --profile flash
+  python benchmark.py --personas 10000 --modes legacy engine packed --max-concurrency 100 --json bench.json
+  python benchmark.py --personas 2000 --modes engine --keys 4 --key-rpm 500 --max-concurrency 100
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate
+
+import en_run
+from choice_mode import CHOICE_MAX_TOKENS, mark_choice_only, reasoning_cells
+from hedging import LatencyTracker, add_hedge_args
+from key_pool import ApiKey, KeyPool, key_state
+from llm_engine import ExperimentEngine
+from mock_backend import PROFILES, MockBackend
+from packed_mode import ScenarioPacker
+from rate_limiter import AdaptiveRateLimiter, is_throttle_error
+from structured_output import SchemaParser, schemas_for
+
+# 예전 구조의 SDK 재시도 (google-genai HttpRetryOptions 기본값: 6 회 시도, 1 초부터 2 배, 최대 60 초 + 지터)
+LEGACY_ATTEMPTS = 6
+LEGACY_BATCH_CONCURRENCY = 50  # chain.batch(config={"max_concurrency": 50})
+
+# CR2002 (PRE) 실험과 같은 모양의 6 셀 (Left / Right = (A, B) 보수)
+SCENARIOS: List[Dict[str, Any]] = [{
+    "difficulty": "Easy",
+    "options": [{"left": [400, 400], "right": [750, 400]}, {"left": [800, 0], "right": [400, 400]},
+                {"left": [200, 800], "right": [0, 0]}, {"left": [700, 200], "right": [600, 600]},
+                {"left": [600, 300], "right": [500, 700]}, {"left": [400, 400], "right": [375, 750]}],
+    "metrics": ["Berk29", "Berk26", "Berk23", "Berk15", "Barc8", "Barc2"],
+}]
+
+_AGES = ["24-year-old", "37-year-old", "52-year-old", "68-year-old"]
+_JOBS = ["nurse", "software engineer", "high-school teacher", "farmer", "accountant", "musician"]
+_TRAITS = ["who volunteers at a local food bank", "who grew up in a large family",
+           "who values efficiency above all", "who is deeply involved in community politics"]
+
+# 모드 이름 → engine 옵션 (legacy 는 별도 경로)
+MODES: Dict[str, Optional[Dict[str, bool]]] = {
+    "legacy": None,
+    "engine": {},
+    "packed": {"packed": True},
+    "choice-only": {"choice_only": True},
+    "choice-stream": {"choice_only": True, "stream": True},
+    "structured": {"structured": True},
+    "structured-packed": {"structured": True, "packed": True},
+    "hedged": {"hedge": True},
+}
+VARIABLES = ["persona_desc", "difficulty", "A_left", "B_left", "A_right", "B_right", "metric"]
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """sleep 만 하는 시뮬레이션용 이벤트 루프: 실행할 콜백이 없으면 시계를 다음 타이머 시각으로 바로 옮긴다"""
+
+    def __init__(self):
+        super().__init__()
+        self._now = 0.0
+
+    def time(self) -> float:
+        return self._now
+
+    def _run_once(self) -> None:
+        if not self._ready:
+            while self._scheduled and self._scheduled[0]._cancelled:  # 취소된 타이머로는 시계를 옮기지 않음
+                handle = heapq.heappop(self._scheduled)
+                handle._scheduled = False
+                self._timer_cancelled_count -= 1
+            if self._scheduled:
+                self._now = max(self._now, self._scheduled[0]._when)
+        super()._run_once()
+
+
+def run_virtual(coro: Any) -> Any:
+    loop = VirtualTimeLoop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+# ---------- 계획 ---------- #
+def persona_desc(i: int) -> str:
+    rng = random.Random(i)
+    return (f"A {rng.choice(_AGES)} {rng.choice(_JOBS)} {rng.choice(_TRAITS)}, "
+            f"and who tends to think carefully before making decisions that affect others.")
+
+
+def build_plan(n_personas: int) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    plan = []
+    for i in range(1, n_personas + 1):
+        persona = {"idx": i, "persona": persona_desc(i)}
+        payloads, meta = en_run.build_payloads(persona["persona"], SCENARIOS)
+        plan.append((persona, payloads, meta))
+    return plan
+
+
+# ---------- 실행 방식 ---------- #
+async def run_legacy(plan, backend: MockBackend, args: argparse.Namespace) -> Tuple[Counter, Counter]:
+    """Pool(N) × chain.batch 구조를 같은 가상 시계 위에서 재현"""
+    template = PromptTemplate(input_variables=VARIABLES, template=en_run.PROMPT_TEMPLATE)
+    parser = JsonOutputParser()
+    pool = asyncio.Semaphore(args.legacy_pool)
+    rng = random.Random(args.seed)
+    counts: Counter = Counter()
+    retries: Counter = Counter()
+
+    async def cell(payload: Dict[str, Any], batch: asyncio.Semaphore) -> Any:
+        async with batch:
+            prompt = template.format(**payload)
+            for attempt in range(LEGACY_ATTEMPTS):
+                try:
+                    comp = await backend.agenerate(prompt)
+                    break
+                except Exception as e:
+                    if not is_throttle_error(e) or attempt == LEGACY_ATTEMPTS - 1:
+                        raise
+                    retries["quota"] += 1
+                    await asyncio.sleep(min(60.0, 2.0 ** attempt) + rng.random())
+            return parser.parse(comp.text)
+
+    async def persona(payloads: List[Dict[str, Any]]) -> None:
+        async with pool:
+            batch = asyncio.Semaphore(LEGACY_BATCH_CONCURRENCY)
+            resps = await asyncio.gather(*(cell(p, batch) for p in payloads), return_exceptions=True)
+        if any(isinstance(r, BaseException) for r in resps):
+            counts.update(failed=len(payloads))  # chain.batch 는 예외 하나로 페르소나 전체를 잃는다
+        else:
+            ok = sum(en_run.is_complete(r) for r in resps)
+            counts.update(ok=ok, failed=len(payloads) - ok)
+
+    await asyncio.gather(*(persona(payloads) for _, payloads, _ in plan))
+    return counts, retries
+
+
+def build_engine(opts: Dict[str, bool], backend: Any, args: argparse.Namespace,
+                 quota_rpm: float) -> ExperimentEngine:
+    """en_run.build_engine 과 같은 구성 (리미터 시계만 가상 시계)"""
+    structured = opts.get("structured", False)
+    rpm = args.rpm if args.rpm is not None else quota_rpm
+    limiter = AdaptiveRateLimiter(rpm=rpm, tpm=args.tpm or None,
+                                  clock=asyncio.get_running_loop().time) if rpm else None
+    return ExperimentEngine(
+        backend, PromptTemplate(input_variables=VARIABLES, template=en_run.PROMPT_TEMPLATE),
+        max_concurrency=args.max_concurrency, limiter=limiter,
+        parser=SchemaParser() if structured else None,
+        is_valid=en_run.is_complete,
+        packer=ScenarioPacker(en_run.PACKED_HEADER, en_run.PACKED_ITEM) if opts.get("packed") else None,
+        choice_prompt=PromptTemplate(input_variables=VARIABLES, template=en_run.CHOICE_PROMPT_TEMPLATE)
+        if opts.get("choice_only") else None,
+        choice_max_tokens=CHOICE_MAX_TOKENS, stream=opts.get("stream", False),
+        schemas=schemas_for(en_run.REASONING_DESC, en_run.CHOICE_DESC) if structured else None,
+        hedger=LatencyTracker(args.hedge_quantile or 0.95) if opts.get("hedge") else None,
+        hard_timeout=args.hard_timeout)
+
+
+async def run_engine(plan, opts: Dict[str, bool], backend: Any, args: argparse.Namespace,
+                     desc: str, quota_rpm: float) -> Tuple[Counter, Counter]:
+    engine = build_engine(opts, backend, args, quota_rpm)
+    reasoning = None
+    if opts.get("choice_only"):
+        cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in plan[0][2]]
+        reasoning = reasoning_cells([p for p, _, _ in plan], cells, [1], args.reasoning_per_stratum, args.seed)
+    groups = []
+    for persona, payloads, meta in plan:
+        payloads = [dict(p) for p in payloads]
+        mark_choice_only(payloads, meta, 1, persona["idx"], reasoning)
+        groups.append((persona["idx"], payloads))
+    counts: Counter = Counter()
+
+    def on_done(key, resps):
+        ok = sum(en_run.is_complete(r) for r in resps)
+        counts.update(ok=ok, failed=len(resps) - ok)
+
+    await engine.arun_groups(groups, on_done, desc=desc)
+    counts.update({f"pack_{k}": v for k, v in engine.pack_stats.items()})
+    counts.update({f"stream_{k}": v for k, v in engine.stream_stats.items()})
+    counts.update({f"hedge_{k}": v for k, v in engine.hedge_stats.items()})
+    return counts, engine.retries
+
+
+# ---------- 보고 ---------- #
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_mode(name: str, plan, args: argparse.Namespace) -> Dict[str, Any]:
+    opts = MODES[name]
+    profile = PROFILES[args.profile]
+    if args.key_rpm is not None:
+        profile = profile._replace(rpm=args.key_rpm)
+    keys = 1 if opts is None else args.keys
+    mocks = [MockBackend(profile, seed=args.seed + i) for i in range(keys)]
+    keyed = [(ApiKey(f"{name}-key{i}", profile.rpm), b) for i, b in enumerate(mocks)]
+    backend = mocks[0] if keys == 1 else KeyPool(keyed, args.key_quarantine)
+
+    async def go():
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        if opts is None:
+            counts, retries = await run_legacy(plan, backend, args)
+        else:
+            counts, retries = await run_engine(plan, opts, backend, args, desc=name, quota_rpm=profile.rpm * keys)
+        return counts, retries, loop.time() - t0
+
+    started = time.perf_counter()
+    counts, retries, wall = run_virtual(go())
+    lat = sorted(x for b in mocks for x in b.latencies)
+    st = sum((b.stats for b in mocks), Counter())
+    if keys > 1:
+        for i, (k, b) in enumerate(keyed):
+            u = key_state(k, b.model).usage
+            counts.update({f"key{i}_throttled": u["throttled"], f"key{i}_quarantined": u["quarantined"]})
+    req = st["requests"] or 1
+    tokens = st["input_tokens"] + st["output_tokens"]
+    return {
+        "mode": name, "profile": args.profile, "personas": len(plan),
+        "cells": counts["ok"] + counts["failed"], "ok": counts["ok"], "failed": counts["failed"],
+        "requests": st["requests"], "req_per_s": round(st["requests"] / wall, 2),
+        "cells_per_s": round(counts["ok"] / wall, 2),
+        "p50_s": round(percentile(lat, 0.50), 3), "p95_s": round(percentile(lat, 0.95), 3),
+        "p99_s": round(percentile(lat, 0.99), 3),
+        "throttled": st["throttled"], "rate_429": round(st["throttled"] / req, 4),
+        "malformed": st["malformed"], "malformed_rate": round(st["malformed"] / req, 4),
+        "retries": sum(retries.values()), "retries_by_class": dict(retries),
+        "input_tokens": st["input_tokens"], "output_tokens": st["output_tokens"],
+        "tokens_per_s": round(tokens / wall, 1), "wall_s": round(wall, 1),
+        "extra": {k: v for k, v in counts.items() if k not in ("ok", "failed")},
+        "bench_s": round(time.perf_counter() - started, 1),  # 시뮬레이션 자체에 걸린 실제 시간
+    }
+
+
+COLUMNS = [("mode", 18), ("ok", 7), ("failed", 7), ("requests", 9), ("req_per_s", 10), ("cells_per_s", 12),
+           ("p50_s", 7), ("p95_s", 7), ("p99_s", 7), ("rate_429", 9), ("malformed_rate", 15),
+           ("retries", 8), ("tokens_per_s", 13), ("wall_s", 9)]
+
+
+def print_table(reports: List[Dict[str, Any]]) -> None:
+    print("".join(name.rjust(w) for name, w in COLUMNS))
+    for r in reports:
+        print("".join(str(r[name]).rjust(w) for name, w in COLUMNS))
+
+
+def parse_cli() -> argparse.Namespace:
+    ap = argparse.ArgumentParser("Runner throughput benchmark (offline)")
+    ap.add_argument("--personas", type=int, default=10_000, help="페르소나 수 (× 6 시나리오)")
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    ap.add_argument("--profile", choices=PROFILES, default="flash", help="모의 서버 프로필")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--max-concurrency", type=int, default=50, help="engine 모드의 전역 동시 요청 수")
+    ap.add_argument("--rpm", type=float, help="engine 리미터 RPM (기본 = 키 쿼터의 합, 0 = 리미터 없음)")
+    ap.add_argument("--tpm", type=float, default=0, help="engine 리미터 TPM (0 = 제한 없음)")
+    ap.add_argument("--keys", type=int, default=1, help="engine 모드의 API 키(모의 서버) 수, 2 이상이면 KeyPool")
+    ap.add_argument("--key-rpm", type=float, help="키별 분당 요청 쿼터 (기본 = 프로필의 rpm)")
+    ap.add_argument("--key-quarantine", type=float, default=5.0, help="KeyPool 격리 시간 (초)")
+    ap.add_argument("--legacy-pool", type=int, default=1, help="legacy 모드의 Pool 프로세스 수 (EN/KR=1, AR=4)")
+    ap.add_argument("--reasoning-per-stratum", type=int, default=50, help="choice-only 모드의 reasoning 표본 수")
+    add_hedge_args(ap)
+    ap.add_argument("--json", type=Path, help="보고서를 JSON 으로 저장")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_cli()
+    plan = build_plan(args.personas)
+    reports = [run_mode(name, plan, args) for name in args.modes]
+    print_table(reports)
+    if args.json:
+        args.json.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[✓] Saved → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
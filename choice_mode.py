@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+선택 전용(choice-only) 대량 실행 + 층화 표본 reasoning
+------------------------------------------------
+대부분의 셀은 {"choice"} 만 묻고 max_output_tokens 를 짧게 제한한다 (출력 토큰 = 지연/비용의 대부분).
+(도메인, 난이도, 시나리오) 층마다 per_stratum 개 셀만 기존처럼 reasoning 까지 묻는다.
+표본은 셀 키의 sha256 순위로 고르므로 같은 모집단이면 재실행해도 같은 셀이 뽑힌다.
+결과 row 의 has_reasoning 이 reasoning 을 가진 row 인지 나타낸다.
+
+  python en_run.py --config pre --all --choice-only --reasoning-per-stratum 50
+"""
+
+import argparse
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+CHOICE_MAX_TOKENS = 16  # {"choice": "Right"} 에 충분한 출력 토큰 상한
+CellKey = Tuple[int, int, str, int]  # (repeat, idx, difficulty, scenario)
+
+
+def stratified_sample(units: Iterable[Tuple[Hashable, Hashable]], per_stratum: int,
+                      seed: int = 0) -> Set[Hashable]:
+    """(층, unit) 쌍에서 층마다 해시 순위가 가장 낮은 per_stratum 개 unit 을 고른다"""
+    strata: Dict[Hashable, List[Tuple[str, Hashable]]] = defaultdict(list)
+    for stratum, unit in units:
+        h = hashlib.sha256(f"{seed}:{stratum!r}:{unit!r}".encode("utf-8")).hexdigest()
+        strata[stratum].append((h, unit))
+    picked: Set[Hashable] = set()
+    for ranked in strata.values():
+        picked.update(u for _, u in sorted(ranked)[:per_stratum])
+    return picked
+
+
+def reasoning_cells(personas: List[Dict[str, Any]], cells: List[Tuple[str, int]], repeats: Iterable[int],
+                    per_stratum: int, seed: int = 0) -> Set[CellKey]:
+    """reasoning 을 물을 셀. cells = [(difficulty, scenario), ...], 페르소나의 "domain" 이 층 구분에 쓰인다."""
+    units = (((p.get("domain", ""), d, s), (r, p["idx"], d, s))
+             for r in repeats for p in personas for d, s in cells)
+    return stratified_sample(units, per_stratum, seed)
+
+
+def mark_choice_only(payloads: List[Dict[str, Any]], meta: List[Dict[str, Any]], repeat: int, idx: int,
+                     reasoning: Optional[Set[CellKey]]) -> None:
+    """표본에 들지 않은 셀의 payload 에 _choice_only 를 표시 (reasoning=None 이면 모두 전체 프롬프트)"""
+    if reasoning is None:
+        return
+    for p, m in zip(payloads, meta):
+        p["_choice_only"] = (repeat, idx, m["difficulty"], m["scenario_idx"] + 1) not in reasoning
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_choice_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--choice-only", action="store_true",
+                    help="대부분의 셀은 선택만 묻고, 층화 표본에만 reasoning 을 요청")
+    ap.add_argument("--reasoning-per-stratum", type=int, default=50,
+                    help="(도메인, 난이도, 시나리오) 층마다 reasoning 을 받을 셀 수")
+    ap.add_argument("--reasoning-seed", type=int, default=0, help="reasoning 표본 시드")
@@ -26,14 +26,18 @@ for file in sorted(INPUT_DIR.glob("*.json"), key=lambda x: x.name):
             for skey in SCENARIO_KEYS:
                 if skey in scenarios:
                     answer = scenarios[skey].get("answer")
-                    if answer in ("Left", "Right"):
+                    p_left = scenarios[skey].get("p_left")
+                    if p_left is not None:  # logprob 모드 결과: 확률을 기대 빈도로 합산
+                        scenario_counts[(diff_name, skey)]["Left"] += p_left
+                        scenario_counts[(diff_name, skey)]["Right"] += 1 - p_left
+                    elif answer in ("Left", "Right"):
                         scenario_counts[(diff_name, skey)][answer] += 1
 
     summary_lines = [f"[{domain_name}]"]
     for diff_name in sorted(difficulties): 
         for skey in SCENARIO_KEYS:
-            left  = scenario_counts[(diff_name, skey)]["Left"]
-            right = scenario_counts[(diff_name, skey)]["Right"]
+            left  = round(scenario_counts[(diff_name, skey)]["Left"], 2)
+            right = round(scenario_counts[(diff_name, skey)]["Right"], 2)
             total = left + right
             if total:
                 lpct = f"{left  / total * 100:.1f}%"
@@ -31,15 +31,19 @@ for file in sorted(INPUT_DIR.glob("*.json"), key=lambda x: x.name):
             for skey in scenario_keys:
                 if skey in scenarios:
                     answer = scenarios[skey].get("answer", "")
-                    if answer in ["Left", "Right"]:
+                    p_left = scenarios[skey].get("p_left")
+                    if p_left is not None:  # logprob 모드 결과: 확률을 기대 빈도로 합산
+                        scenario_counts[(level, skey)]["Left"] += p_left
+                        scenario_counts[(level, skey)]["Right"] += 1 - p_left
+                    elif answer in ["Left", "Right"]:
                         scenario_counts[(level, skey)][answer] += 1
 
     summary_lines = [f"[{domain_name}]"]
     for level in difficulty_levels_EN:
         for skey in scenario_keys:
             key = (level, skey)
-            left = scenario_counts[key]["Left"]
-            right = scenario_counts[key]["Right"]
+            left = round(scenario_counts[key]["Left"], 2)
+            right = round(scenario_counts[key]["Right"], 2)
             total = left + right
             if total > 0:
                 left_pct = f"{(left / total) * 100:.1f}%"
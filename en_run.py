@@ -7,12 +7,30 @@ Gemini Social-Preference Experiments (Korean, Repeated Batch Version, No Persona
 
 import argparse
 import json
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
-from multiprocessing import Pool
-from tqdm import tqdm
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
 from dotenv import load_dotenv
 
+from adaptive_sampling import AdaptiveSampler, add_adaptive_args, format_summary, sampler_from_args
+from choice_mode import CHOICE_MAX_TOKENS, add_choice_args, mark_choice_only, reasoning_cells
+from experiment_plan import add_plan_args, arm_dir, plan_from_args, run_plan
+from hedging import add_hedge_args, hedger_from_args
+from key_pool import print_key_usage
+from llm_backend import LOGPROB_TOP_K, MODEL_NAME, add_backend_args, backend_from_args
+from llm_cache import add_cache_args, cache_from_args
+from llm_engine import ExperimentEngine
+from packed_mode import add_packed_args, packer_from_args
+from prompt_templates import TEMPLATES, choice_prompt
+from rate_limiter import add_limiter_args, limiter_from_args
+from results_log import ResultsLog, export_legacy, load_cells
+from run_manifest import MANIFEST_FILE, CellSet, RunManifest, select_cells
+from run_budget import (BudgetExhausted, RunBudget, add_budget_args, budget_from_args, estimate_plan,
+                        format_plan, observed, persona_range, price_from_args)
+from run_metrics import RunMetrics, add_metrics_args, metrics_from_args
+from structured_output import SchemaParser, add_structured_args, schemas_for
+from work_queue import QueueLease, WorkQueue, add_queue_args, queue_from_args
+
 load_dotenv()
 
 BASE = Path(r"C:/Users/dsng3/Documents/GitHub/DIGB-Homosilicus")
@@ -21,28 +39,15 @@ CONFIGS: Dict[str, Dict[str, Path]] = {
         "data": BASE / "Data/Common/(EN)PERSONA_DATA_10000.jsonl",
         "scenarios": BASE / "Data/Experiments/CR2002/(PRE)experiment_scenarios.json",
         "output_base": BASE / "pre_results/CR2002",
-        "nopersona_output": BASE / "pre_results/no_persona/(EN)CR2002_EXPERIMENT_RESULTS_NOPERSONA_FINAL"
+        "nopersona_output": BASE / "pre_results/no_persona/(EN)CR2002_EXPERIMENT_RESULTS_NOPERSONA_FINAL",
+        "results_log": BASE / "pre_results/no_persona/(EN)CR2002_RESULTS_LOG_NOPERSONA",
     }
 }
 
+LANG = "EN"
 MAX_PERSONAS = 1000
 
 # ---------- 데이터 로드 ---------- #
-def load_personas(path: Path) -> List[Dict[str, Any]]:
-    personas = []
-    with path.open(encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                j = json.loads(line)
-                personas.append({"persona": j["persona"], "idx": int(j["idx"])})
-                if len(personas) >= MAX_PERSONAS:
-                    break
-            except (json.JSONDecodeError, KeyError):
-                continue
-    return personas
-
 def load_scenarios(path: Path) -> List[Dict[str, Any]]:
     with path.open(encoding="utf-8") as f:
         return json.load(f).get("experiments", [])
@@ -64,117 +69,266 @@ def build_payloads(desc: str, scn: List[Dict[str, Any]]) -> Tuple[List[Dict[str,
     return payloads, meta
 
 # ---------- 결과 저장 ---------- #
-def save_results(out_dir: Path, pid: Any, desc: str,
-                 resps: List[Any], meta: List[Dict[str, Any]]) -> None:
-    data = {}
-    for m, r in zip(meta, resps):
-        d, i = m["difficulty"], m["scenario_idx"]
-        data.setdefault(d, {})
-        if isinstance(r, Exception):
-            data[d][f"scenario_{i+1}"] = {"error": str(r)}
-        else:
-            data[d][f"scenario_{i+1}"] = {
-                "persona_id": f"NOPERSONA_{int(pid):04d}",
-                "persona_desc": desc,
-                "difficulty": d,
-                "metric": m["metric"],
-                "options": {"left": {"A": m["A_left"], "B": m["B_left"]},
-                            "right": {"A": m["A_right"], "B": m["B_right"]}},
-                "thought": r.get("reasoning", ""),
-                "answer": r.get("choice", "")
-            }
-    out_dir.mkdir(parents=True, exist_ok=True)
-    fname = f"Person_NOPERSONA_{int(pid):04d}.json"
-    (out_dir / fname).write_text(json.dumps(data, ensure_ascii=False, indent=4), encoding="utf-8")
-    print(f"[✓] Saved → {out_dir / fname}")
+# 결과는 results_log 샤드에 셀 단위 row 로 쌓이고, 예전 파일 형식은 --export-legacy 로 만든다
+LEGACY_FILE_FMT = "Person_NOPERSONA_{idx:04d}.json"
+LEGACY_ID_FMT = "NOPERSONA_{idx:04d}"
+
+def export_results(cfg: Dict[str, Path], config: str) -> None:
+    n = export_legacy(cfg["results_log"], cfg["nopersona_output"], LANG, config,
+                      LEGACY_FILE_FMT, LEGACY_ID_FMT)
+    print(f"[✓] Exported {n} persona files → {cfg['nopersona_output']}")
+
+def open_manifest(cfg: Dict[str, Path]) -> RunManifest:
+    return RunManifest(cfg["results_log"] / MANIFEST_FILE)
+
+def rebuild_manifest(cfg: Dict[str, Path], config: str) -> None:
+    manifest = open_manifest(cfg)
+    # 결과 로그가 있으면 로그에서, 없으면 예전 Person_*.json 폴더에서 재구축
+    if any(cfg["results_log"].glob("rows-*")):
+        n = manifest.rebuild_from_log(cfg["results_log"])
+    else:
+        n = manifest.rebuild_from_files(cfg["nopersona_output"], LANG, config)
+    print(f"[✓] Rebuilt manifest ({n} cells) → {manifest.path}")
 
 # ---------- 인퍼런스 ---------- #
-def process_persona(persona: Dict[str, Any], cfg: Dict[str, Path]) -> None:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    from langchain_core.prompts import PromptTemplate
-    from langchain_core.output_parsers import JsonOutputParser
+# 템플릿 문구는 prompt_templates.TEMPLATES 에 데이터로 있다 (multi_run.py / experiment_plan.py 와 공유)
+PROMPT_TEMPLATE = TEMPLATES[LANG]["prompt"]
 
-    MODEL_NAME = "gemini-2.0-flash"
-    llm = ChatGoogleGenerativeAI(model=MODEL_NAME, temperature=1)
+# 묶음 모드(--packed): 페르소나당 한 번의 요청으로 모든 시나리오를 묻는다
+PACKED_HEADER = TEMPLATES[LANG]["packed_header"]
+PACKED_ITEM = TEMPLATES[LANG]["packed_item"]
 
-    prompt_template = PromptTemplate(
-        input_variables=["persona_desc", "difficulty", "A_left", "B_left",
-                         "A_right", "B_right", "metric"],
-        template="""You are **Person B** in a **{difficulty}-level** Social Preferences Experiment.
+# 선택만 묻는 프롬프트: logprob 모드(--logprobs)에서는 선택 토큰 확률로 P(Left)/P(Right) 를 계산하고,
+# 선택 전용 모드(--choice-only)에서는 reasoning 표본에 들지 않은 셀에 짧은 출력 상한으로 보낸다
+CHOICE_PROMPT_TEMPLATE = choice_prompt(LANG)
 
-**Persona**
-{persona_desc}
+# 구조화 출력(--structured): 템플릿의 reasoning 설명과 선택지 이름을 같은 Left|Right enum 스키마로 매핑
+REASONING_DESC = TEMPLATES[LANG]["reasoning_desc"]
+CHOICE_DESC = TEMPLATES[LANG]["choice_desc"]
 
-**Choices**
-- **Left** : Person B {B_left}, Person A {A_left}
-- **Right**: Person B {B_right}, Person A {A_right}
+def is_complete(r: Any) -> bool:
+    # validate_problems 와 같은 기준: reasoning/choice 가 모두 있어야 정상 응답 (선택 전용 셀은 choice 만)
+    return isinstance(r, dict) and bool(r.get("choice")) and (bool(r.get("reasoning")) or bool(r.get("choice_only")))
 
-Focus on **{metric}**.
+def has_choice(r: Any) -> bool:
+    # logprob 모드: reasoning 없이 Left/Right 선택만 있으면 정상 응답
+    return isinstance(r, dict) and r.get("choice") in ("Left", "Right")
 
-Return **JSON only**:
-{{
-  "reasoning": "<concise reason>",
-  "choice": "Left" | "Right"
-}}"""
+def build_engine(args: argparse.Namespace, metrics: Optional[RunMetrics] = None,
+                 budget: Optional[RunBudget] = None, model: str = MODEL_NAME,
+                 temperature: float = 1) -> ExperimentEngine:
+    from langchain_core.prompts import PromptTemplate
+
+    if (args.logprobs or args.choice_only) and (args.packed or args.pack_shuffle or args.candidates > 1):
+        raise ValueError("--logprobs / --choice-only 는 --packed / --candidates 와 함께 쓸 수 없습니다.")
+    if args.logprobs and args.choice_only:
+        raise ValueError("--logprobs 와 --choice-only 는 함께 쓸 수 없습니다.")
+    variables = ["persona_desc", "difficulty", "A_left", "B_left", "A_right", "B_right", "metric"]
+    prompt_template = PromptTemplate(
+        input_variables=variables,
+        template=CHOICE_PROMPT_TEMPLATE if args.logprobs else PROMPT_TEMPLATE,
     )
-    parser = JsonOutputParser()
-    chain = prompt_template | llm | parser
+    choice_template = PromptTemplate(input_variables=variables, template=CHOICE_PROMPT_TEMPLATE)
+    # 클라이언트는 실행 전체에서 하나만 생성해 재사용
+    return ExperimentEngine(backend_from_args(args, model, temperature=temperature), prompt_template,
+                            max_concurrency=args.max_concurrency, limiter=limiter_from_args(args),
+                            parser=SchemaParser() if args.structured else None,
+                            cache=cache_from_args(args),
+                            is_valid=has_choice if args.logprobs else is_complete,
+                            packer=packer_from_args(args, PACKED_HEADER, PACKED_ITEM),
+                            candidates=args.candidates,
+                            logprobs=LOGPROB_TOP_K if args.logprobs else 0,
+                            choice_prompt=choice_template if args.choice_only else None,
+                            choice_max_tokens=CHOICE_MAX_TOKENS, stream=args.stream,
+                            schemas=schemas_for(REASONING_DESC, CHOICE_DESC, args.logprobs)
+                            if args.structured else None,
+                            metrics=metrics, hedger=hedger_from_args(args),
+                            hard_timeout=args.hard_timeout, budget=budget)
+
+def run_personas(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+                 manifest: RunManifest, config: str,
+                 jobs: List[Tuple[Dict[str, Any], int]], desc: str,
+                 cells: Optional[CellSet] = None,
+                 reasoning: Optional[Set[Tuple[int, int, str, int]]] = None,
+                 observe: Optional[Callable[[str, List[Any], List[Dict[str, Any]]], None]] = None,
+                 lease: Optional[QueueLease] = None) -> None:
+    """jobs = [(persona, repeat), ...] 전체를 하나의 전역 동시성 한도로 실행
+    cells 가 주어지면 (repeat, idx) 마다 해당 (difficulty, scenario) 셀만 다시 묻는다.
+    reasoning 이 주어지면(--choice-only) 그 셀만 reasoning 을 묻고 나머지는 선택만 묻는다.
+    observe 가 주어지면(--adaptive-*) 기록한 응답을 (도메인, 응답, meta) 로 넘긴다.
+    lease 가 주어지면(--queue) 큐에 커밋된 셀만 기록한다 (임대를 잃은 셀은 다른 워커가 기록)."""
+    scn = load_scenarios(cfg["scenarios"])
+    groups, pending = [], []
+    for persona, repeat in jobs:
+        payloads, meta = build_payloads(persona["persona"], scn)
+        mark_choice_only(payloads, meta, repeat, persona["idx"], reasoning)
+        if cells is not None:
+            payloads, meta = select_cells(payloads, meta, cells.get((repeat, persona["idx"]), set()))
+            if not payloads:
+                continue
+        for p in payloads:
+            p["_sample"] = repeat  # 캐시 키의 반복 번호
+        groups.append(((persona, repeat, meta), payloads))
+        pending += [(repeat, persona["idx"], m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    manifest.mark_pending(LANG, config, pending)
 
+    def write(persona, repeat, resps, meta):
+        record(log, manifest, config, persona, repeat, resps, meta)
+        if observe is not None:
+            observe(persona.get("domain", ""), resps, meta)
+
+    def on_done(key, resps):
+        persona, repeat, meta = key
+        if lease is None:
+            write(persona, repeat, resps, meta)
+        else:  # 큐 커밋이 끝난 뒤 커밋된 셀만 기록
+            lease.accept(repeat, persona["idx"], resps, meta, lambda rs, ms: write(persona, repeat, rs, ms))
+
+    try:
+        engine.run_groups(groups, on_done, desc=desc)
+    finally:
+        if lease is not None:
+            lease.flush()
+    if engine.stream_stats:
+        print("Stream →", dict(engine.stream_stats))
+    if engine.hedge_stats:
+        print("Hedge →", dict(engine.hedge_stats))
+
+def run_personas_sampled(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+                         manifest: RunManifest, config: str, personas: List[Dict[str, Any]],
+                         repeats: int, desc: str) -> None:
+    """반복 N 회를 프롬프트당 후보(candidate_count) 요청으로 받아 후보 s 를 반복 s 로 기록"""
     scn = load_scenarios(cfg["scenarios"])
-    payloads, meta = build_payloads(persona["persona"], scn)
+    samples = list(range(1, repeats + 1))
+    groups, pending = [], []
+    for persona in personas:
+        payloads, meta = build_payloads(persona["persona"], scn)
+        groups.append(((persona, meta), payloads))
+        pending += [(r, persona["idx"], m["difficulty"], m["scenario_idx"] + 1)
+                    for r in samples for m in meta]
+    manifest.mark_pending(LANG, config, pending)
+
+    def on_done(key, resps):
+        (persona, meta), repeat = key
+        record(log, manifest, config, persona, repeat, resps, meta)
+
+    engine.run_groups(groups, on_done, desc=desc, samples=samples)
+    print("Samples →", dict(engine.sample_stats))
+
+def run_adaptive(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+                 manifest: RunManifest, config: str, jobs: List[Tuple[Dict[str, Any], int]],
+                 sampler: AdaptiveSampler,
+                 reasoning: Optional[Set[Tuple[int, int, str, int]]] = None) -> None:
+    """jobs 를 층화 무작위 순서의 wave 로 나눠 보내고, 구간이 좁아진 셀은 다음 wave 부터 묻지 않는다.
+    이미 기록된 row 로 셀 추정을 채우고 기록된 (반복, 페르소나)는 다시 보내지 않으므로 중단된 실행을 이어 갈 수 있다."""
+    _, meta = build_payloads("", load_scenarios(cfg["scenarios"]))
+    cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    domains = {p["idx"]: p.get("domain", "") for p, _ in jobs}
+    sampler.resume(load_cells(cfg["results_log"], LANG, config).values(), domains.get)
+    done = manifest.done_units(LANG, config)
+    units = [(p.get("domain", ""), (r, p["idx"]), (p, r)) for p, r in jobs if (r, p["idx"]) not in done]
+    for i, (wave, wanted) in enumerate(sampler.waves(units, cells), 1):
+        run_personas(engine, cfg, log, manifest, config, wave, desc=f"Adaptive wave {i}",
+                     cells=wanted, reasoning=reasoning, observe=sampler.observe)
+    # 셀이 닫혀 보내지 않은 단위는 --rerun-missing 이 다시 보내지 않도록 skipped 로 남긴다
+    manifest.mark_skipped(LANG, config, [(r, i, d, s) for r, i in sampler.skipped for d, s in cells])
+    print(format_summary(sampler.report()))
+    print(f"[✓] Saved → {sampler.save(cfg['results_log'])}")
+
+def run_queued(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+               manifest: RunManifest, config: str, jobs: List[Tuple[Dict[str, Any], int]],
+               queue: WorkQueue, reasoning: Optional[Set[Tuple[int, int, str, int]]] = None) -> None:
+    """jobs 의 모든 셀을 공유 큐에 등록하고(이미 있으면 그대로), 큐가 빌 때까지 셀 묶음을 임대해 실행"""
+    _, meta = build_payloads("", load_scenarios(cfg["scenarios"]))
+    cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    personas = {p["idx"]: p for p, _ in jobs}
+    added = queue.enqueue(LANG, config, [(r, p["idx"], d, s) for p, r in jobs for d, s in cells])
+    print(f"[Queue] {queue.worker}: +{added} cells → {queue.counts(LANG, config)}")
+    for n, lease in enumerate(queue.leases(LANG, config), 1):
+        run_personas(engine, cfg, log, manifest, config, [(personas[i], r) for r, i in lease.cells],
+                     desc=f"Lease {n}", cells=lease.cells, reasoning=reasoning, lease=lease)
+    print("Queue →", dict(queue.stats), queue.counts(LANG, config))
+
+def record(log: ResultsLog, manifest: RunManifest, config: str, persona: Dict[str, Any],
+           repeat: int, resps: List[Any], meta: List[Dict[str, Any]]) -> None:
     try:
-        resps = chain.batch(payloads, config={"max_concurrency": 50})
-        save_results(cfg["output"], persona["idx"], persona["persona"], resps, meta)
+        log.append_persona(LANG, config, repeat, persona["idx"], persona["persona"], resps, meta)
+        manifest.record_persona(LANG, config, repeat, persona["idx"], resps, meta)
     except Exception as e:
         print(f"[idx {persona['idx']}] Error → {e}")
 
 # ---------- 유틸 ---------- #
-def list_existing(out_dir: Path) -> set:
-    return {
-        int(p.stem.split("_")[2])
-        for p in out_dir.glob("Person_NOPERSONA_*.json")
-        if "_" in p.stem and p.stem.split("_")[2].isdigit()
-    }
+def nopersona_personas() -> List[Dict[str, Any]]:
+    # no_persona 조건: persona 데이터를 로드하지 않고 빈 persona_desc 사용
+    return [{"persona": "", "idx": i} for i in range(1, MAX_PERSONAS + 1)]
 
-def validate_missing(cfg: Dict[str, Path], out_dir: Path) -> List[int]:
-    all_idx = {p["idx"] for p in load_personas(cfg["data"])}
-    existing = list_existing(out_dir)
-    return sorted(all_idx - existing)
-
-def validate_problems(out_dir: Path) -> List[int]:
-    bad = []
-    for f in out_dir.glob("Person_NOPERSONA_*.json"):
-        try:
-            idx = int(f.stem.split("_")[2])
-            d = json.loads(f.read_text(encoding="utf-8"))
-            for diff in d.values():
-                if any(not sc.get("thought") or not sc.get("answer") for sc in diff.values()):
-                    bad.append(idx)
-                    break
-        except Exception:
-            bad.append(idx)
-    return sorted(set(bad))
+def choice_only_reasoning(cfg: Dict[str, Path], args: argparse.Namespace,
+                          manifest: RunManifest) -> Optional[Set[Tuple[int, int, str, int]]]:
+    """--choice-only: 전체 모집단(모든 반복 × 페르소나 × 셀)에서 reasoning 을 물을 층화 표본"""
+    if not args.choice_only:
+        return None
+    _, meta = build_payloads("", load_scenarios(cfg["scenarios"]))
+    cells = [(m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    n = args.repeat or max(manifest.repeats(LANG, args.config), default=1)
+    return reasoning_cells(nopersona_personas(), cells, range(1, n + 1),
+                           args.reasoning_per_stratum, args.reasoning_seed)
+
+def validate_missing(manifest: RunManifest, config: str, repeat: int) -> List[int]:
+    return manifest.missing(LANG, config, range(1, MAX_PERSONAS + 1), repeat)
+
+def validate_problems(manifest: RunManifest, config: str, repeat: int) -> CellSet:
+    return manifest.problem_cells(LANG, config, repeat)
 
 # ---------- 실행 ---------- #
-def worker(args):
-    p, cfg = args
-    process_persona(p, cfg)
+def run_all_repeated(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+                     manifest: RunManifest, config: str, repeats: int,
+                     reasoning: Optional[Set[Tuple[int, int, str, int]]] = None,
+                     sampler: Optional[AdaptiveSampler] = None,
+                     queue: Optional[WorkQueue] = None):
+    personas = nopersona_personas()
+    if queue is not None:
+        jobs = [(p, r) for r in range(1, repeats + 1) for p in personas]
+        run_queued(engine, cfg, log, manifest, config, jobs, queue, reasoning)
+        return
+    if sampler is not None:
+        # 반복 전체를 모집단으로 두고, 셀 추정이 충분히 좁아지면 남은 반복은 보내지 않는다
+        jobs = [(p, r) for r in range(1, repeats + 1) for p in personas]
+        run_adaptive(engine, cfg, log, manifest, config, jobs, sampler, reasoning)
+        return
+    if repeats > 1 and engine.candidates > 1:
+        # 같은 프롬프트를 N 번 보내지 않고, 한 요청에서 후보 여러 개를 받아 반복으로 나눈다
+        run_personas_sampled(engine, cfg, log, manifest, config, personas, repeats,
+                             desc=f"Run x{repeats} (candidates)")
+        return
+    # 모든 반복을 하나의 실행으로 묶어 전역 동시성 한도를 공유 (row 마다 repeat 번호가 붙어 덮어쓰지 않음)
+    jobs = [(p, r) for r in range(1, repeats + 1) for p in personas]
+    run_personas(engine, cfg, log, manifest, config, jobs, desc=f"Run x{repeats}", reasoning=reasoning)
 
-def run_all_repeated(cfg: Dict[str, Path], repeats: int):
-    # no_persona 조건: persona 데이터를 로드하지 않고 빈 persona_desc 사용
-    personas = [{"persona": "", "idx": i} for i in range(1, MAX_PERSONAS + 1)]  # 1부터 100까지 idx 생성
-    for r in range(1, repeats + 1):
-        out_dir = cfg["nopersona_output"]  # Temp 폴더 없이 직접 저장
-        tasks = [(p, {**cfg, "output": out_dir}) for p in personas]
-        with Pool(1) as pool:  # WinError 방지를 위해 단일 프로세스
-            list(tqdm(pool.imap_unordered(worker, tasks), total=len(tasks), desc=f"Run {r}/{repeats}"))
-
-def run_with_targets(cfg: Dict[str, Path], targets: List[int], out_dir: Path):
-    all_personas = load_personas(cfg["data"])
-    target_personas = [p for p in all_personas if p["idx"] in targets]
-    tasks = [(p, {**cfg, "output": out_dir}) for p in target_personas]
-    with Pool(1) as pool:     # WinError 방지를 위해 단일 프로세스
-        list(tqdm(pool.imap_unordered(worker, tasks), total=len(tasks), desc="Running rerun"))
+def run_with_targets(engine: ExperimentEngine, cfg: Dict[str, Path], log: ResultsLog,
+                     manifest: RunManifest, config: str, targets_by_repeat: Dict[int, List[int]],
+                     cells: Optional[CellSet] = None,
+                     reasoning: Optional[Set[Tuple[int, int, str, int]]] = None):
+    personas = {p["idx"]: p for p in nopersona_personas()}
+    jobs = [(personas[i], r) for r, targets in targets_by_repeat.items()
+            for i in targets if i in personas]
+    # 실패 셀만 다시 묻고, 새 row 는 로그에서 기존 row 를 대체한다 (latest-row-wins)
+    run_personas(engine, cfg, log, manifest, config, jobs, desc="Running rerun", cells=cells,
+                 reasoning=reasoning)
+
+def dry_run(engine: ExperimentEngine, cfg: Dict[str, Path], args: argparse.Namespace,
+            reasoning: Optional[Set[Tuple[int, int, str, int]]] = None) -> None:
+    """--dry-run: 보낼 프롬프트를 렌더링해 호출 수 / 토큰 / 비용 / 예상 시간만 출력 (API 호출 없음)"""
+    scn = load_scenarios(cfg["scenarios"])
+    span = persona_range(args.persona_range)
+    personas = [p for p in nopersona_personas() if span is None or span[0] <= p["idx"] <= span[1]]
+    calls = []
+    for r in range(1, (args.repeat or 1) + 1):
+        for p in personas:
+            payloads, meta = build_payloads(p["persona"], scn)
+            mark_choice_only(payloads, meta, r, p["idx"], reasoning)
+            calls += engine.render_calls(payloads)
+    print(format_plan(estimate_plan(calls, price_from_args(args, MODEL_NAME), observed(cfg["results_log"]),
+                                    args.rpm, args.tpm, args.max_concurrency)))
 
 # ---------- CLI ---------- #
 def parse_args():
@@ -184,60 +338,130 @@ def parse_args():
     ap.add_argument("--all", action="store_true")
     ap.add_argument("--rerun-missing", action="store_true")
     ap.add_argument("--rerun-problems", action="store_true")
-    ap.add_argument("--temp", type=int, help="대상 Temp 번호 (예: --temp 3)")
+    ap.add_argument("--temp", type=int, help="대상 반복(Temp) 번호 (예: --temp 3)")
+    ap.add_argument("--export-legacy", action="store_true",
+                    help="결과 로그를 예전 Person_*.json 파일로 내보내기")
+    ap.add_argument("--rebuild-manifest", action="store_true",
+                    help="기존 결과(로그 또는 Person_*.json)로부터 매니페스트 재구축")
+    ap.add_argument("--log-format", choices=["jsonl", "parquet"], default="jsonl",
+                    help="결과 로그 샤드 형식")
+    ap.add_argument("--max-concurrency", type=int, default=50,
+                    help="모든 페르소나·시나리오·반복에 걸친 전역 동시 요청 수")
+    add_limiter_args(ap)
+    add_cache_args(ap)
+    add_packed_args(ap)
+    add_backend_args(ap)
+    add_choice_args(ap)
+    add_structured_args(ap)
+    add_metrics_args(ap)
+    add_hedge_args(ap)
+    add_adaptive_args(ap)
+    add_queue_args(ap)
+    add_budget_args(ap)
+    add_plan_args(ap)
+    ap.add_argument("--stream", action="store_true",
+                    help="응답을 스트림으로 받아 choice 확정 즉시 처리 (--choice-only 셀은 그 시점에 스트림을 끊음)")
+    ap.add_argument("--logprobs", action="store_true",
+                    help="선택만 묻고 토큰 logprob 으로 P(Left)/P(Right) 를 저장 (반복 샘플링 대신 1회 호출)")
+    ap.add_argument("--candidates", type=int, default=1,
+                    help="--repeat N 에서 요청 하나로 받을 후보(샘플) 수 (candidate_count, 모델 상한 초과분은 병렬 요청)")
     return ap.parse_args()
 
 def main():
     args = parse_args()
     cfg = CONFIGS[args.config]
 
-    # 1) 전체 N회 반복
-    if args.repeat:
-        if args.config != "pre":
-            raise ValueError("--repeat는 pre 설정에서만 사용 가능합니다.")
-        run_all_repeated(cfg, args.repeat)
+    # 0) 레거시 파일 내보내기 (API 호출 없음)
+    if args.export_legacy:
+        export_results(cfg, args.config)
+        return
+    if args.rebuild_manifest:
+        rebuild_manifest(cfg, args.config)
         return
 
-    # 2) 전체 1회 실행
-    if args.all:
-        out_dir = cfg["nopersona_output"]
-        run_all_repeated({**cfg, "output": out_dir}, 1)
+    if args.dry_run:
+        args.backend = "stub"  # 프롬프트 렌더링만 하므로 API 클라이언트를 만들지 않는다
+        dry_run(build_engine(args), cfg, args, choice_only_reasoning(cfg, args, open_manifest(cfg)))
         return
 
-    # 3) rerun (missing / problems)
-    if args.rerun_missing or args.rerun_problems:
-        # Temp 번호 지정 시 해당 폴더만 대상
-        if args.temp:
-            rdir = cfg["nopersona_output"]
-            if not rdir.exists():
-                raise FileNotFoundError(f"폴더가 존재하지 않습니다: {rdir}")
-            target_dirs = [rdir]
-        else:
-            # 지정 없으면 모든 Temp 폴더 순회
-            target_dirs = sorted(cfg["nopersona_output"].glob("Temp*"))
-            if not target_dirs:
-                raise FileNotFoundError("Temp 폴더가 존재하지 않습니다.")
-
-        for rdir in target_dirs:
-            if args.rerun_missing:
-                missing = validate_missing(cfg, rdir)
-                print(f"[Missing] in {rdir.name}: {missing}")
-                if missing:
-                    run_with_targets(cfg, missing, rdir)
-            else:  # --rerun-problems
-                problems = validate_problems(rdir)
-                print(f"[Problems] in {rdir.name}: {problems}")
-                if problems:
-                    run_with_targets(cfg, problems, rdir)
+    # --plan: 컴파일된 플랜의 (모델, temperature) 로 엔진을 만든다
+    plan = plan_from_args(args)
+    model, temperature = plan.arm(LANG, args.config) if plan is not None else (MODEL_NAME, 1)
+    if plan is not None:  # 기본이 아닌 arm 은 multi_run.py 와 같은 arm 폴더에 쓴다
+        cfg = {**cfg, "results_log": arm_dir(cfg["results_log"], (model, temperature))}
+    metrics = metrics_from_args(args, LANG, cfg["results_log"])
+    budget = budget_from_args(args, LANG, model, cfg["results_log"])
+    engine = build_engine(args, metrics, budget, model, temperature)
+    manifest = open_manifest(cfg)
+    reasoning = choice_only_reasoning(cfg, args, manifest)
+    sampler = sampler_from_args(args, LANG)
+    if sampler is not None and args.candidates > 1:
+        raise ValueError("--adaptive-* 는 --candidates 와 함께 쓸 수 없습니다.")
+    queue = queue_from_args(args)
+    if queue is not None and (sampler is not None or args.candidates > 1):
+        raise ValueError("--queue 는 --adaptive-* / --candidates 와 함께 쓸 수 없습니다.")
+    if plan is not None and (sampler is not None or queue is not None or args.candidates > 1):
+        raise ValueError("--plan 은 --adaptive-* / --queue / --candidates 와 함께 쓸 수 없습니다.")
+    try:
+        with ResultsLog(cfg["results_log"], fmt=args.log_format) as log, closing(metrics):
+            # 0) 플랜의 태스크 실행 (반복 수 / 페르소나 범위는 플랜에 들어 있음, ok 셀은 건너뜀)
+            if plan is not None:
+                run_plan(engine, plan, log, manifest, LANG, args.config, reasoning)
+                return
+
+            # 1) 전체 N회 반복
+            if args.repeat:
+                if args.config != "pre":
+                    raise ValueError("--repeat는 pre 설정에서만 사용 가능합니다.")
+                if args.candidates > 1 and engine.packer is not None:
+                    raise ValueError("--candidates 와 --packed 는 함께 쓸 수 없습니다.")
+                run_all_repeated(engine, cfg, log, manifest, args.config, args.repeat, reasoning, sampler,
+                                 queue)
+                return
+
+            # 2) 전체 1회 실행
+            if args.all:
+                run_all_repeated(engine, cfg, log, manifest, args.config, 1, reasoning, sampler, queue)
+                return
+
+            # 3) rerun (missing / problems)
+            if args.rerun_missing or args.rerun_problems:
+                # Temp(반복) 번호 지정 시 해당 반복만, 없으면 매니페스트에 있는 모든 반복
+                repeats = [args.temp] if args.temp else manifest.repeats(LANG, args.config)
+                if not repeats:
+                    raise FileNotFoundError(
+                        f"매니페스트가 비어 있습니다 (--rebuild-manifest 참고): {manifest.path}")
+
+                targets_by_repeat, problem_cells = {}, {}
+                for r in repeats:
+                    if args.rerun_missing:
+                        missing = validate_missing(manifest, args.config, r)
+                        print(f"[Missing] in Temp{r}: {missing}")
+                        if missing:
+                            targets_by_repeat[r] = missing
+                    else:  # --rerun-problems
+                        cells = validate_problems(manifest, args.config, r)
+                        problems = sorted(i for _, i in cells)
+                        print(f"[Problems] in Temp{r}: {problems} ({sum(map(len, cells.values()))} cells)")
+                        if problems:
+                            targets_by_repeat[r] = problems
+                            problem_cells.update(cells)
+                if targets_by_repeat:
+                    run_with_targets(engine, cfg, log, manifest, args.config, targets_by_repeat,
+                                     cells=problem_cells if args.rerun_problems else None,
+                                     reasoning=reasoning)
+                return
+    except BudgetExhausted as e:
+        # 끝난 페르소나는 기록됐고 나머지 셀은 매니페스트에 pending 으로 남는다
+        print(f"[Budget] {e} → 멈춤. --rerun-missing 으로 이어서 실행하세요.")
         return
+    finally:
+        if budget is not None:
+            budget.close()
+        print_key_usage()
 
     # 올바르지 않은 인자 조합
-    raise ValueError("실행 옵션을 확인하세요. (--repeat | --all | --rerun-*)")
+    raise ValueError("실행 옵션을 확인하세요. (--repeat | --all | --rerun-* | --export-legacy | --rebuild-manifest)")
 
 if __name__ == "__main__":
-    import multiprocessing
-    try:
-        multiprocessing.set_start_method("spawn")
-    except RuntimeError:
-        pass
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+실험 계획 컴파일 (명세 JSON → 태스크 테이블)
+------------------------------------------------
+언어 / 설정 / 시나리오 파일 / 모델 / temperature / 반복 / 페르소나 범위를 적은 명세를 한 번만
+(언어, 설정, 모델, temperature, 반복, 페르소나, 난이도, 시나리오) 태스크로 펼쳐 SQLite 태스크 테이블(plan.db)에 쓴다.
+  - 프롬프트는 컴파일할 때 미리 렌더링해 둔다 (같은 텍스트는 prompts 테이블에 한 번만 저장).
+    실행기는 시나리오 파일을 다시 읽거나 payload 를 다시 만들지 않고 테이블을 순서대로 읽어 보낸다.
+  - task_id 는 태스크 좌표의 해시라서 명세 순서나 다른 run 을 더해도 바뀌지 않는다.
+  - 명세 / 시나리오 파일 / 페르소나 원본 / 템플릿의 해시(fingerprint)가 그대로면 다시 컴파일하지 않고 기존 plan.db 를 쓴다.
+    이어서 실행할 때는 같은 플랜에서 매니페스트에 ok 로 기록된 셀만 건너뛴다.
+
+명세 예시 (경로는 명세 파일 기준 상대 경로도 가능, scenarios 를 빼면 러너의 CONFIGS 를 쓴다)
+  {"runs": [
+    {"langs": ["EN", "KR"], "config": "pre", "repeats": 5, "persona_range": "1-1000",
+     "models": ["gemini-2.0-flash"], "temperatures": [1]},
+    {"langs": ["AR"], "config": "pre", "personas": "Data/Common/(AR)PERSONA_DATA_10000.jsonl"}
+  ]}
+
+  python experiment_plan.py compile --spec plan.json
+  python experiment_plan.py info    --plan plan.plan.db
+  python en_run.py --config pre --plan plan.json
+  python multi_run.py --plan plan.json          # 여러 언어 / (모델, temperature) 조합을 한 번에
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import re
+import sqlite3
+import time
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from choice_mode import mark_choice_only, reasoning_cells
+from llm_backend import MODEL_NAME
+from persona_store import open_store
+from prompt_templates import TEMPLATES, choice_prompt
+from run_budget import persona_range
+
+PLAN_VERSION = 1
+PLAN_SUFFIX = ".plan.db"
+RUNNERS = {"EN": "en_run", "KR": "kr_run", "AR": "ar_run"}  # 언어 → CONFIGS / 시나리오 로더를 가진 러너 모듈
+DEFAULT_PERSONA_RANGE = "1-1000"  # 페르소나 원본이 없는 run (no persona) 의 idx 범위
+
+Arm = Tuple[str, float]  # (모델, temperature)
+Group = Tuple[Tuple[int, int, Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]
+
+_COLUMNS = ("seq", "task_id", "run", "lang", "config", "model", "temperature", "repeat", "idx", "domain",
+            "difficulty", "scenario", "metric", "a_left", "b_left", "a_right", "b_right",
+            "prompt", "choice_prompt")
+
+
+def task_id(lang: str, config: str, model: str, temperature: float, repeat: int, idx: int,
+            difficulty: str, scenario: int) -> str:
+    """태스크 좌표의 해시 (컴파일 순서와 무관하게 같은 태스크는 같은 id)"""
+    raw = f"{lang}|{config}|{model}|{float(temperature):g}|{repeat}|{idx}|{difficulty}|{scenario}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def arm_id(arm: Arm) -> str:
+    """결과 row / 로그에 남기는 arm 이름 (모델@temperature)"""
+    return f"{arm[0]}@{float(arm[1]):g}"
+
+
+def arm_dir(root: Path, arm: Arm) -> Path:
+    """arm 의 결과 로그 폴더. 기본 arm (MODEL_NAME@1) 은 root 그대로, 나머지는 root_<모델>_Temp<t>
+    (arm 마다 매니페스트 / 로그가 따로라서 같은 셀이 arm 끼리 겹치지 않는다)"""
+    root = Path(root)
+    if arm[0] == MODEL_NAME and float(arm[1]) == 1:
+        return root
+    model = re.sub(r"[^\w.-]", "_", arm[0])
+    return root.with_name(f"{root.name}_{model}_Temp{float(arm[1]):g}")
+
+
+def task_meta(t: Dict[str, Any]) -> Dict[str, Any]:
+    """태스크 한 줄 → 결과 로그 / 매니페스트에 넘기는 셀 meta (build_payloads 의 meta 와 같은 키)"""
+    return {"difficulty": t["difficulty"], "scenario_idx": t["scenario"] - 1,
+            "metric": t["metric"], "A_left": t["a_left"], "B_left": t["b_left"],
+            "A_right": t["a_right"], "B_right": t["b_right"], "task_id": t["task_id"],
+            "arm": arm_id((t["model"], t["temperature"]))}
+
+
+# ---------- 명세 ---------- #
+def runner(lang: str) -> Any:
+    if lang not in RUNNERS:
+        raise ValueError(f"알 수 없는 언어: {lang} ({'/'.join(RUNNERS)})")
+    return importlib.import_module(RUNNERS[lang])
+
+
+def templates(lang: str) -> Tuple[str, str]:
+    """(전체 프롬프트, 선택 전용 프롬프트) 템플릿 문자열"""
+    return TEMPLATES[lang]["prompt"], choice_prompt(lang)
+
+
+def load_spec(path: Path) -> List[Dict[str, Any]]:
+    """명세 → 언어별로 펼친 run 목록 (경로는 절대 경로로, 빠진 값은 기본값으로)"""
+    path = Path(path)
+    spec = json.loads(path.read_text(encoding="utf-8"))
+    base = path.resolve().parent
+    runs = []
+    for entry in spec["runs"]:
+        langs = entry.get("langs") or [entry["lang"]]
+        for lang in langs:
+            mod = runner(lang)
+            config = entry["config"]
+            if "scenarios" in entry:
+                scenarios = (base / entry["scenarios"]).resolve()
+            elif config in mod.CONFIGS:
+                scenarios = Path(mod.CONFIGS[config]["scenarios"])
+            else:
+                raise ValueError(f"{lang}: 설정 {config} 가 러너 CONFIGS 에 없으면 scenarios 를 지정하세요.")
+            personas = entry.get("personas")
+            runs.append({
+                "lang": lang, "config": config, "scenarios": str(scenarios),
+                "personas": str((base / personas).resolve()) if personas else None,
+                "persona_range": entry.get("persona_range") or (None if personas else DEFAULT_PERSONA_RANGE),
+                "repeats": int(entry.get("repeats", 1)),
+                "models": list(entry.get("models") or [MODEL_NAME]),
+                "temperatures": [float(t) for t in entry.get("temperatures") or [1]],
+            })
+    return runs
+
+
+def fingerprint(runs: List[Dict[str, Any]]) -> str:
+    """명세 + 시나리오 파일 + 페르소나 원본 + 템플릿이 같으면 같은 값"""
+    h = hashlib.sha256(f"v{PLAN_VERSION}".encode("utf-8"))
+    h.update(json.dumps(runs, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for run in runs:
+        h.update(Path(run["scenarios"]).read_bytes())
+        if run["personas"]:
+            h.update(open_store(run["personas"]).sha256.encode("utf-8"))
+        for t in templates(run["lang"]):
+            h.update(t.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _personas(run: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    span = persona_range(run["persona_range"])
+    if run["personas"] is None:
+        # no persona 조건: 빈 persona_desc 로 idx 범위만 펼친다
+        return ({"persona": "", "idx": i, "domain": ""} for i in range(span[0], span[1] + 1))
+    store = open_store(run["personas"])
+    return store.range(*span) if span else iter(store)
+
+
+# ---------- 컴파일 ---------- #
+def _rows(runs: List[Dict[str, Any]], prompt_ids: Dict[str, int]) -> Iterator[Tuple[Any, ...]]:
+    seq = 0
+
+    def pid(text: str) -> int:
+        if text not in prompt_ids:
+            prompt_ids[text] = len(prompt_ids) + 1
+        return prompt_ids[text]
+
+    for run_no, run in enumerate(runs, 1):
+        mod = runner(run["lang"])
+        full, choice = templates(run["lang"])
+        scn = mod.load_scenarios(Path(run["scenarios"]))
+        # 페르소나마다 렌더링한 (prompt, choice_prompt, meta) 는 모든 arm / 반복이 공유한다
+        cells = []
+        for p in _personas(run):
+            payloads, meta = mod.build_payloads(p["persona"], scn)
+            cells.append((p, [(pid(full.format(**x)), pid(choice.format(**x)), m)
+                              for x, m in zip(payloads, meta)]))
+        for model in run["models"]:
+            for temp in run["temperatures"]:
+                for r in range(1, run["repeats"] + 1):
+                    for p, rendered in cells:
+                        for prompt, choice_prompt, m in rendered:
+                            seq += 1
+                            scenario = m["scenario_idx"] + 1
+                            yield (seq, task_id(run["lang"], run["config"], model, temp, r, p["idx"],
+                                                m["difficulty"], scenario),
+                                   run_no, run["lang"], run["config"], model, temp, r, p["idx"],
+                                   p.get("domain", ""), m["difficulty"], scenario, m["metric"],
+                                   m["A_left"], m["B_left"], m["A_right"], m["B_right"], prompt, choice_prompt)
+
+
+def compile_plan(spec: Path, out: Optional[Path] = None, force: bool = False) -> Path:
+    """명세를 태스크 테이블로 컴파일. fingerprint 가 같은 plan.db 가 있으면 그대로 쓴다."""
+    spec = Path(spec)
+    out = Path(out) if out else spec.with_name(spec.stem + PLAN_SUFFIX)
+    runs = load_spec(spec)
+    fp = fingerprint(runs)
+    if out.exists() and not force:
+        try:
+            with ExperimentPlan(out) as old:
+                if old.meta.get("fingerprint") == fp:
+                    return out
+        except (sqlite3.DatabaseError, ValueError):
+            pass  # 깨지거나 버전이 다른 플랜은 다시 만든다
+
+    t0 = time.time()
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(str(tmp))
+    conn.executescript(
+        "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);"
+        "CREATE TABLE runs (run INTEGER PRIMARY KEY, lang TEXT, config TEXT, scenarios TEXT, personas TEXT);"
+        "CREATE TABLE prompts (pid INTEGER PRIMARY KEY, text TEXT NOT NULL);"
+        "CREATE TABLE tasks ("
+        " seq INTEGER PRIMARY KEY, task_id TEXT NOT NULL UNIQUE, run INTEGER,"
+        " lang TEXT, config TEXT, model TEXT, temperature REAL, repeat INTEGER, idx INTEGER, domain TEXT,"
+        " difficulty TEXT, scenario INTEGER, metric TEXT,"
+        " a_left INTEGER, b_left INTEGER, a_right INTEGER, b_right INTEGER,"
+        " prompt INTEGER NOT NULL, choice_prompt INTEGER NOT NULL);"
+    )
+    prompt_ids: Dict[str, int] = {}
+    try:
+        conn.executemany(f"INSERT INTO tasks VALUES ({', '.join('?' * len(_COLUMNS))})",
+                         _rows(runs, prompt_ids))
+    except sqlite3.IntegrityError as e:
+        conn.close()
+        tmp.unlink()
+        raise ValueError(f"명세에 같은 태스크가 두 번 들어 있습니다 (run 범위가 겹침): {e}")
+    conn.executemany("INSERT INTO prompts VALUES (?, ?)", ((i, t) for t, i in prompt_ids.items()))
+    conn.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                     [(n, r["lang"], r["config"], r["scenarios"], r["personas"]) for n, r in enumerate(runs, 1)])
+    conn.execute("CREATE INDEX idx_tasks_slice ON tasks(lang, config, model, temperature, seq)")
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("version", str(PLAN_VERSION)), ("fingerprint", fp), ("spec", str(spec.resolve())),
+        ("runs", json.dumps(runs, ensure_ascii=False)), ("compiled", str(time.time())),
+        ("compile_seconds", f"{time.time() - t0:.2f}"),
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp, out)
+    return out
+
+
+# ---------- 읽기 (실행기) ---------- #
+class ExperimentPlan:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(self.path)
+        self._conn = sqlite3.connect(str(self.path))
+        self.meta: Dict[str, str] = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if self.meta.get("version") != str(PLAN_VERSION):
+            raise ValueError(f"플랜 버전이 다릅니다 (다시 컴파일하세요): {self.path}")
+        self._sources = {run: personas for run, personas in
+                         self._conn.execute("SELECT run, personas FROM runs")}
+
+    def _where(self, lang: Optional[str], config: Optional[str], arm: Optional[Arm]
+               ) -> Tuple[str, List[Any]]:
+        q, args = " WHERE 1 = 1", []
+        for col, val in (("lang", lang), ("config", config)):
+            if val is not None:
+                q += f" AND t.{col} = ?"
+                args.append(val)
+        if arm is not None:
+            q += " AND t.model = ? AND t.temperature = ?"
+            args += [arm[0], float(arm[1])]
+        return q, args
+
+    def slices(self) -> List[Tuple[str, str]]:
+        """(언어, 설정) 목록 (컴파일 순서)"""
+        return [(lang, config) for lang, config in self._conn.execute(
+            "SELECT lang, config FROM tasks GROUP BY lang, config ORDER BY MIN(seq)")]
+
+    def population(self, lang: str, config: str
+                   ) -> Tuple[List[Dict[str, Any]], List[Tuple[str, int]], List[int]]:
+        """(lang, config) 의 (페르소나 {"idx", "domain"}, 셀 (difficulty, scenario), 반복) — 층화 표본용"""
+        args = (lang, config)
+        personas = [{"idx": i, "domain": d} for i, d in self._conn.execute(
+            "SELECT idx, MIN(domain) FROM tasks WHERE lang = ? AND config = ? GROUP BY idx ORDER BY idx", args)]
+        cells = [(d, sc) for d, sc in self._conn.execute(
+            "SELECT difficulty, scenario FROM tasks WHERE lang = ? AND config = ?"
+            " GROUP BY difficulty, scenario ORDER BY MIN(seq)", args)]
+        repeats = [r for (r,) in self._conn.execute(
+            "SELECT DISTINCT repeat FROM tasks WHERE lang = ? AND config = ? ORDER BY repeat", args)]
+        return personas, cells, repeats
+
+    def reasoning(self, lang: str, config: str, per_stratum: int, seed: int = 0
+                  ) -> Set[Tuple[int, int, str, int]]:
+        """--choice-only: (lang, config) 모집단에서 도메인별 층화로 reasoning 을 물을 셀 (시드가 같으면 같은 표본)"""
+        personas, cells, repeats = self.population(lang, config)
+        return reasoning_cells(personas, cells, repeats, per_stratum, seed)
+
+    def arms(self, lang: Optional[str] = None, config: Optional[str] = None) -> List[Arm]:
+        q, args = self._where(lang, config, None)
+        return [(m, t) for m, t in self._conn.execute(
+            f"SELECT DISTINCT t.model, t.temperature FROM tasks t{q} ORDER BY t.model, t.temperature", args)]
+
+    def arm(self, lang: str, config: str) -> Arm:
+        """(lang, config) 의 유일한 (모델, temperature) — 언어별 러너는 한 번에 하나의 조합만 실행한다"""
+        arms = self.arms(lang, config)
+        if len(arms) != 1:
+            raise ValueError(f"플랜의 {lang}/{config} 에 (모델, temperature) 조합이 {len(arms)}개입니다: "
+                             f"{[arm_id(a) for a in arms]} — 여러 조합은 multi_run.py 로 한 번에 실행하세요.")
+        return arms[0]
+
+    def counts(self) -> Dict[str, int]:
+        """(언어/설정/모델@temperature) → 태스크 수"""
+        return {f"{lang}/{config}/{arm_id((model, temp))}": n for lang, config, model, temp, n in self._conn.execute(
+            "SELECT lang, config, model, temperature, COUNT(*) FROM tasks"
+            " GROUP BY lang, config, model, temperature ORDER BY MIN(seq)")}
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def _select(self, q: str, args: List[Any]) -> Iterator[Dict[str, Any]]:
+        cur = self._conn.execute(
+            "SELECT t.*, p.text, c.text FROM tasks t"
+            " JOIN prompts p ON p.pid = t.prompt JOIN prompts c ON c.pid = t.choice_prompt"
+            f"{q} ORDER BY t.seq", args)
+        names = _COLUMNS + ("prompt_text", "choice_prompt_text")
+        for row in cur:
+            yield dict(zip(names, row))
+
+    def tasks(self, lang: Optional[str] = None, config: Optional[str] = None,
+              arm: Optional[Arm] = None) -> Iterator[Dict[str, Any]]:
+        """태스크를 컴파일 순서대로 한 줄씩 (프롬프트 텍스트 포함)"""
+        return self._select(*self._where(lang, config, arm))
+
+    def get(self, tid: str) -> Optional[Dict[str, Any]]:
+        return next(self._select(" WHERE t.task_id = ?", [tid]), None)
+
+    def groups(self, lang: str, config: str, arm: Optional[Arm] = None,
+               skip: Optional[Set[Tuple[int, int, str, int]]] = None) -> Iterator[Group]:
+        """(반복, 페르소나) 단위로 묶은 엔진 그룹 ((반복, idx, 페르소나), payloads, meta).
+        payload 에는 시나리오 값과 미리 렌더링한 _prompt / _choice_prompt, _sample(반복), _task(task_id) 가 들어 있다.
+        skip 에 있는 셀 (repeat, idx, difficulty, scenario) 은 뺀다."""
+        skip = skip or set()
+        stream = self.tasks(lang, config, arm)
+        for (_, _, repeat, idx, run), rows in groupby(
+                stream, key=lambda t: (t["model"], t["temperature"], t["repeat"], t["idx"], t["run"])):
+            rows = [t for t in rows if (repeat, idx, t["difficulty"], t["scenario"]) not in skip]
+            if not rows:
+                continue
+            persona = self.persona(run, idx, rows[0]["domain"])
+            payloads, meta = [], []
+            for t in rows:
+                # persona_desc 는 묶음 모드(packer)가 시나리오 값으로 다시 렌더링할 때만 쓰인다
+                payloads.append({
+                    "persona_desc": persona["persona"], "difficulty": t["difficulty"],
+                    "A_left": t["a_left"], "B_left": t["b_left"], "A_right": t["a_right"], "B_right": t["b_right"],
+                    "metric": t["metric"], "_prompt": t["prompt_text"], "_choice_prompt": t["choice_prompt_text"],
+                    "_sample": repeat, "_task": t["task_id"],
+                })
+                meta.append(task_meta(t))
+            yield (repeat, idx, persona), payloads, meta
+
+    def persona(self, run: int, idx: int, domain: str = "") -> Dict[str, Any]:
+        """로그에 남길 페르소나 레코드 (원본이 있으면 색인으로 그 줄만 읽는다)"""
+        source = self._sources.get(run)
+        if source is None:
+            return {"persona": "", "idx": idx, "domain": domain}
+        return open_store(source).get(idx) or {"persona": "", "idx": idx, "domain": domain}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "ExperimentPlan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_plan(path: Path) -> ExperimentPlan:
+    """명세(.json)면 컴파일(또는 재사용)한 뒤, 플랜(.db)이면 그대로 연다"""
+    path = Path(path)
+    if path.suffix == ".json":
+        path = compile_plan(path)
+    return ExperimentPlan(path)
+
+
+def plan_jobs(plan: ExperimentPlan, log: Any, manifest: Any, lang: str, config: str, arm: Arm,
+              reasoning: Optional[Set[Tuple[int, int, str, int]]] = None
+              ) -> Tuple[List[Tuple[Any, List[Dict[str, Any]]]], Callable[[Any, List[Any]], None]]:
+    """(lang, config, arm) 태스크 중 매니페스트에 ok 로 없는 셀 → (엔진 그룹, on_done). 셀은 pending 으로 등록한다."""
+    groups, pending = [], []
+    for (repeat, idx, persona), payloads, meta in plan.groups(lang, config, arm,
+                                                             skip=manifest.ok_cells(lang, config)):
+        mark_choice_only(payloads, meta, repeat, idx, reasoning)
+        groups.append(((repeat, persona, meta), payloads))
+        pending += [(repeat, idx, m["difficulty"], m["scenario_idx"] + 1) for m in meta]
+    print(f"[Plan] {lang}/{config} {arm_id(arm)}: {len(pending)} cells to run")
+    manifest.mark_pending(lang, config, pending)
+
+    def on_done(key, resps):
+        repeat, persona, meta = key
+        try:
+            log.append_persona(lang, config, repeat, persona["idx"], persona["persona"], resps, meta)
+            manifest.record_persona(lang, config, repeat, persona["idx"], resps, meta)
+        except Exception as e:
+            print(f"[idx {persona['idx']}] Error → {e}")
+
+    return groups, on_done
+
+
+def run_plan(engine: Any, plan: ExperimentPlan, log: Any, manifest: Any, lang: str, config: str,
+             reasoning: Optional[Set[Tuple[int, int, str, int]]] = None, desc: str = "Plan") -> None:
+    """플랜의 (lang, config) 태스크 중 매니페스트에 ok 로 없는 셀을 하나의 전역 동시성 한도로 실행"""
+    groups, on_done = plan_jobs(plan, log, manifest, lang, config, plan.arm(lang, config), reasoning)
+    engine.run_groups(groups, on_done, desc=desc)
+    if engine.retries:
+        print("Retries →", dict(engine.retries))
+    if engine.hedge_stats:
+        print("Hedge →", dict(engine.hedge_stats))
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_plan_args(ap: Any) -> None:
+    ap.add_argument("--plan", type=Path,
+                    help="실험 명세(.json, 필요하면 컴파일) 또는 컴파일된 플랜(.plan.db) — 이 러너의 언어/설정 태스크를 실행")
+
+
+def plan_from_args(args: argparse.Namespace) -> Optional[ExperimentPlan]:
+    return open_plan(args.plan) if args.plan else None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Experiment plan compiler")
+    ap.add_argument("command", choices=["compile", "info", "show"])
+    ap.add_argument("--spec", type=Path, help="compile: 실험 명세 JSON")
+    ap.add_argument("--out", type=Path, help="compile: 플랜 파일 (기본 <명세>.plan.db)")
+    ap.add_argument("--force", action="store_true", help="compile: fingerprint 가 같아도 다시 컴파일")
+    ap.add_argument("--plan", type=Path, help="info / show: 플랜 파일")
+    ap.add_argument("--task", nargs="+", help="show: 출력할 task_id")
+    args = ap.parse_args()
+
+    if args.command == "compile":
+        t0 = time.time()
+        out = compile_plan(args.spec, args.out, args.force)
+        with ExperimentPlan(out) as plan:
+            reused = float(plan.meta["compiled"]) < t0
+            print(f"[✓] {'Reused' if reused else 'Compiled'} {len(plan)} tasks → {out} ({time.time() - t0:.1f}s)")
+        return
+    with ExperimentPlan(args.plan) as plan:
+        if args.command == "info":
+            print(json.dumps({"tasks": len(plan), "slices": plan.counts(),
+                              "fingerprint": plan.meta["fingerprint"][:16], "spec": plan.meta["spec"]},
+                             ensure_ascii=False, indent=2))
+        else:
+            for tid in args.task or []:
+                print(json.dumps(plan.get(tid), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
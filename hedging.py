@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+헤지 요청 (꼬리 지연 줄이기)
+------------------------------------------------
+호출 종류(단일 셀 / 선택 전용 / 묶음 / 다중 후보)마다 최근 성공 지연을 모아 quantile 분위를 헤지 기준으로 삼는다.
+엔진은 요청이 그 시간 안에 답하지 않으면 같은 요청을 하나 더 보내고(리미터는 다시 거침),
+먼저 끝난 쪽을 쓰고 나머지는 취소한다. 취소된 쪽의 토큰(입력 + 승자와 같은 출력 추정)은 hedge_stats 에 더한다.
+hard_timeout 을 넘긴 호출은 TimeoutError 로 끝나 셀 재시도 정책(timeout)을 따르고, 끝내 실패하면 오류 셀로 기록된다.
+
+  python (en|kr|ar)_run.py --config pre --all --hedge-quantile 0.95 --hard-timeout 120
+"""
+
+import argparse
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+HEDGE_WINDOW = 512        # 종류별로 기억할 최근 지연 수
+HEDGE_MIN_SAMPLES = 30    # 이보다 적게 관측된 종류는 헤지하지 않음
+HEDGE_FLOOR = 0.5         # 헤지 기준의 하한 (초)
+_RECOMPUTE_EVERY = 32     # 기준을 다시 계산하는 관측 간격
+
+
+class LatencyTracker:
+    def __init__(self, quantile: float = 0.95, window: int = HEDGE_WINDOW,
+                 min_samples: int = HEDGE_MIN_SAMPLES, floor: float = HEDGE_FLOOR):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.floor = floor
+        self._recent: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._seen: Dict[str, int] = defaultdict(int)
+        self._threshold: Dict[str, float] = {}
+
+    def observe(self, kind: str, seconds: float) -> None:
+        self._recent[kind].append(seconds)
+        self._seen[kind] += 1
+        if len(self._recent[kind]) >= self.min_samples and (
+                kind not in self._threshold or self._seen[kind] % _RECOMPUTE_EVERY == 0):
+            ordered: List[float] = sorted(self._recent[kind])
+            self._threshold[kind] = max(self.floor, ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))])
+
+    def threshold(self, kind: str) -> Optional[float]:
+        """헤지 요청을 보낼 대기 시간 (관측이 부족하면 None = 헤지 안 함)"""
+        return self._threshold.get(kind)
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_hedge_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--hedge-quantile", type=float, default=0.0,
+                    help="이 분위 지연을 넘긴 요청에 복제 요청을 보냄 (예: 0.95, 0 = 끔)")
+    ap.add_argument("--hard-timeout", type=float, default=0.0,
+                    help="호출 하나의 최대 대기 시간 (초, 넘으면 timeout 오류로 기록, 0 = 없음)")
+
+
+def hedger_from_args(args: argparse.Namespace) -> Optional[LatencyTracker]:
+    return LatencyTracker(args.hedge_quantile) if args.hedge_quantile else None
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+API 키 풀 (여러 키 / 프로젝트에 요청을 나눠 보내기)
+------------------------------------------------
+GOOGLE_API_KEY 하나로는 처리량이 그 키의 쿼터를 넘지 못하므로, 키 여러 개를 하나의 백엔드처럼 쓴다.
+  - 요청마다 남은 쿼터 비율(최근 60 초 요청 / 토큰 ÷ 키별 rpm / tpm)이 가장 큰 키를 고른다.
+    키별 쿼터를 모르면(0) 진행 중 요청과 최근 요청이 적은 키를 고른다.
+  - 429 를 "받기 시작한" 키만 격리한다: 성공 없이 429 가 QUARANTINE_STREAK 번 이어지거나,
+    최근 QUARANTINE_WINDOW 초 응답 중 429 가 QUARANTINE_RATIO 이상(QUARANTINE_STREAK 개 이상)이면
+    quarantine 초 동안 쉬게 하고(다시 격리되면 두 배씩, 최대 32 배) 같은 요청을 다른 키로 다시 보낸다.
+    가끔 섞이는 429 는 키를 격리하지 않고 그대로 엔진에 넘겨 엔진의 리미터 / 재시도가 처리한다.
+    모든 키가 격리되면 마지막 오류를 엔진에 넘긴다.
+  - 키 상태(최근 사용량 / 격리 / 사용 통계)는 (키, 모델)마다 프로세스 안에서 하나라서,
+    multi_run 처럼 여러 엔진이 같은 모델을 쓰면 같은 키 쿼터를 나눠 센다.
+키 목록은 --api-keys-file (한 줄에 KEY[,RPM[,TPM]], # 주석) 또는 환경 변수 GOOGLE_API_KEYS (쉼표 구분) 에서 읽는다.
+키가 둘 이상이면 llm_backend.backend_from_args 가 키마다 백엔드를 만들어 KeyPool 로 묶는다.
+--backend mock 이면 키마다 모의 서버가 따로라서, 모의 서버가 키별 쿼터(--mock-profile 의 rpm)를 따로 강제한다.
+실행이 끝나면 키별 요청 / 토큰 / 429 / 격리 횟수를 "Keys →" 로 출력한다 (키는 끝 4 자리만).
+
+  python en_run.py --config pre --all --api-keys-file keys.txt --key-rpm 2000 --rpm 6000
+  python en_run.py --config pre --all --backend mock --mock-profile congested --api-keys-file keys.txt --key-rpm 1500
+  python benchmark.py --personas 2000 --modes engine --keys 4          # 키별 쿼터를 강제하는 모의 서버로 시험
+"""
+
+import asyncio
+import os
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from llm_backend import LOGPROB_TOP_K, Completion, estimate_tokens
+from rate_limiter import is_throttle_error
+
+KEYS_ENV = "GOOGLE_API_KEYS"
+WINDOW = 60.0            # 키별 사용량을 세는 구간 (초)
+MAX_QUARANTINE_DOUBLINGS = 5
+QUARANTINE_WINDOW = 30.0  # 키의 429 비율을 보는 구간 (초)
+QUARANTINE_RATIO = 0.2    # 구간 안 응답 중 429 비율이 이 이상이면 격리
+QUARANTINE_STREAK = 3     # 성공 없이 이어진 429 가 이만큼이면 격리 (구간 안 429 도 최소 이만큼)
+
+
+class ApiKey(NamedTuple):
+    key: str
+    rpm: float = 0.0    # 키별 분당 요청 쿼터 (0 = 모름)
+    tpm: float = 0.0    # 키별 분당 토큰 쿼터 (0 = 모름)
+
+    @property
+    def name(self) -> str:
+        return f"…{self.key[-4:]}"
+
+
+class KeyState:
+    """(키, 모델) 하나의 최근 사용량 / 격리 상태 / 누적 통계"""
+
+    def __init__(self, key: ApiKey, model: str):
+        self.key = key
+        self.model = model
+        self.window: Deque[List[float]] = deque()  # [시각, 토큰] (토큰은 응답 후 실제 값으로 고친다)
+        self.tokens = 0.0
+        self.inflight = 0
+        self.quarantined_until = 0.0
+        self.strikes = 0     # 연달아 격리된 횟수 (격리 뒤 성공하면 0)
+        self.streak = 0      # 성공 없이 이어진 429 수
+        self.recent: Deque[Tuple[float, bool]] = deque()  # (시각, 429 여부)
+        self.recent_throttles = 0
+        self.usage: Counter = Counter()  # requests / input_tokens / output_tokens / throttled / quarantined / errors
+
+    def trim(self, now: float) -> None:
+        while self.window and self.window[0][0] <= now - WINDOW:
+            self.tokens -= self.window.popleft()[1]
+
+    def remaining(self, tokens: float) -> float:
+        """남은 쿼터 비율 (요청 / 토큰 중 작은 쪽, 쿼터를 모르면 1)"""
+        req = 1 - len(self.window) / self.key.rpm if self.key.rpm else 1.0
+        tok = 1 - (self.tokens + tokens) / self.key.tpm if self.key.tpm else 1.0
+        return min(req, tok)
+
+    def next_free(self) -> float:
+        """가장 오래된 사용이 구간을 벗어나는 시각"""
+        return self.window[0][0] + WINDOW if self.window else 0.0
+
+    def observe(self, now: float, throttled: bool) -> bool:
+        """응답 하나를 기록하고, 이 키가 429 를 받기 시작했는지(격리할지) 돌려준다"""
+        self.streak = self.streak + 1 if throttled else 0
+        self.recent.append((now, throttled))
+        self.recent_throttles += throttled
+        while self.recent and self.recent[0][0] <= now - QUARANTINE_WINDOW:
+            self.recent_throttles -= self.recent.popleft()[1]
+        if not throttled:
+            return False
+        return self.streak >= QUARANTINE_STREAK or (
+            self.recent_throttles >= QUARANTINE_STREAK
+            and self.recent_throttles >= QUARANTINE_RATIO * len(self.recent))
+
+
+_STATES: Dict[Tuple[str, str], KeyState] = {}
+
+
+def key_state(key: ApiKey, model: str) -> KeyState:
+    """같은 실행 안에서는 (키, 모델)마다 상태 하나를 재사용한다"""
+    if (key.key, model) not in _STATES:
+        _STATES[(key.key, model)] = KeyState(key, model)
+    return _STATES[(key.key, model)]
+
+
+class KeyPool:
+    """키마다 하나씩 만든 백엔드를 GeminiBackend 와 같은 인터페이스로 묶는다"""
+
+    def __init__(self, backends: List[Tuple[ApiKey, Any]], quarantine: float = 5.0):
+        if not backends:
+            raise ValueError("KeyPool 에는 키가 하나 이상 필요합니다.")
+        first = backends[0][1]
+        self.model = first.model
+        self.temperature = first.temperature
+        self.max_candidates = min(getattr(b, "max_candidates", 1) for _, b in backends)
+        self.quarantine = quarantine
+        self._keys = [(key_state(k, self.model), b) for k, b in backends]
+        self._avg_output_tokens = 64.0
+
+    # ---------- 키 고르기 ---------- #
+    async def _pick(self, tokens: float) -> Tuple[KeyState, Any, List[float]]:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            live = [(s, b) for s, b in self._keys if s.quarantined_until <= now]
+            for s, _ in live:
+                s.trim(now)
+            if live:
+                s, b = max(live, key=lambda sb: (sb[0].remaining(tokens), -sb[0].inflight, -len(sb[0].window)))
+                if s.remaining(tokens) > 0 or not s.window:  # 쿼터보다 큰 요청 하나는 빈 키로 보낸다
+                    entry = [now, tokens]
+                    s.window.append(entry)
+                    s.tokens += tokens
+                    return s, b, entry
+            # 모든 키가 격리 중이거나 쿼터를 다 썼으면 가장 먼저 풀리는 키를 기다린다
+            wake = min(s.quarantined_until if s.quarantined_until > now else s.next_free() for s, _ in self._keys)
+            await asyncio.sleep(min(max(wake - now, 0.01), 1.0))
+
+    def _throttled(self, s: KeyState) -> bool:
+        """429 를 기록하고, 키를 격리했으면(또는 이미 격리 중이면) True — 그때만 다른 키로 다시 보낸다"""
+        now = asyncio.get_running_loop().time()
+        s.usage["throttled"] += 1
+        if s.quarantined_until > now:  # 이미 격리 중 (동시에 나가 있던 요청들의 429)
+            return True
+        if not s.observe(now, True):
+            return False
+        s.strikes += 1
+        s.streak = s.recent_throttles = 0  # 격리 전 기록으로 풀리자마자 다시 격리하지 않게
+        s.recent.clear()
+        s.quarantined_until = now + self.quarantine * 2 ** min(s.strikes - 1, MAX_QUARANTINE_DOUBLINGS)
+        s.usage["quarantined"] += 1
+        return True
+
+    def _settle(self, s: KeyState, entry: List[float], comps: List[Completion]) -> None:
+        now = asyncio.get_running_loop().time()
+        s.observe(now, False)
+        if now >= s.quarantined_until:  # 격리가 풀린 뒤 성공하면 다음 격리는 다시 처음 길이부터
+            s.strikes = 0
+        tokens_in, tokens_out = sum(c.input_tokens for c in comps), sum(c.output_tokens for c in comps)
+        s.usage.update(input_tokens=tokens_in, output_tokens=tokens_out)
+        if tokens_in or tokens_out:
+            actual = tokens_in + tokens_out
+            s.tokens += actual - entry[1]
+            entry[1] = actual
+        if tokens_out:
+            self._avg_output_tokens += 0.05 * (tokens_out / len(comps) - self._avg_output_tokens)
+
+    async def _call(self, prompt: str, n: int, call: Callable[[Any], Awaitable[Any]]) -> Any:
+        """고른 키로 호출. 키가 429 를 받기 시작했으면 격리하고 다른 키로 (키 수만큼) 다시 보낸다."""
+        est = estimate_tokens(prompt) + n * self._avg_output_tokens
+        error: Optional[BaseException] = None
+        for _ in range(len(self._keys)):
+            s, backend, entry = await self._pick(est)
+            s.usage["requests"] += 1
+            s.inflight += 1
+            try:
+                res = await call(backend)
+            except Exception as e:
+                if not is_throttle_error(e):
+                    s.usage["errors"] += 1
+                    raise
+                if not self._throttled(s):  # 가끔 섞인 429 는 엔진의 재시도로
+                    raise
+                error = e
+                continue
+            finally:
+                s.inflight -= 1
+            self._settle(s, entry, res if isinstance(res, list) else [res])
+            return res
+        raise error
+
+    # ---------- 백엔드 인터페이스 ---------- #
+    async def agenerate(self, prompt: str, max_output_tokens: Optional[int] = None,
+                        schema: Optional[Dict[str, Any]] = None) -> Completion:
+        return await self._call(prompt, 1, lambda b: b.agenerate(prompt, max_output_tokens, schema))
+
+    async def agenerate_n(self, prompt: str, n: int, schema: Optional[Dict[str, Any]] = None) -> List[Completion]:
+        return await self._call(prompt, n, lambda b: b.agenerate_n(prompt, n, schema))
+
+    async def agenerate_logprobs(self, prompt: str, top_k: int = LOGPROB_TOP_K,
+                                 schema: Optional[Dict[str, Any]] = None) -> Completion:
+        return await self._call(prompt, 1, lambda b: b.agenerate_logprobs(prompt, top_k, schema))
+
+    async def astream(self, prompt: str, max_output_tokens: Optional[int] = None,
+                      schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[Completion]:
+        """키 하나로 스트림. 첫 조각 전에 429 를 받고 그 키가 격리되면 다른 키로 다시 연다."""
+        est = estimate_tokens(prompt) + self._avg_output_tokens
+        error: Optional[BaseException] = None
+        for _ in range(len(self._keys)):
+            s, backend, entry = await self._pick(est)
+            s.usage["requests"] += 1
+            s.inflight += 1
+            tokens_in = tokens_out = 0
+            started = failed = False
+            stream = backend.astream(prompt, max_output_tokens, schema)
+            try:
+                async for delta in stream:
+                    started = True
+                    tokens_in += delta.input_tokens
+                    tokens_out += delta.output_tokens
+                    yield delta
+            except Exception as e:
+                failed = True
+                if started or not is_throttle_error(e):
+                    s.usage["errors"] += 1
+                    raise
+                if not self._throttled(s):
+                    raise
+                error = e
+                continue
+            finally:
+                s.inflight -= 1
+                await stream.aclose()
+                if not failed:  # 끝까지 받았거나 소비자가 중간에 끊은 스트림
+                    self._settle(s, entry, [Completion("", tokens_in, tokens_out)])
+            return
+        raise error
+
+
+# ---------- 키 목록 / 보고 ---------- #
+def load_keys(path: Optional[Path] = None, rpm: float = 0.0, tpm: float = 0.0) -> List[ApiKey]:
+    """키 파일(한 줄에 KEY[,RPM[,TPM]]) 또는 GOOGLE_API_KEYS. 줄에 쿼터가 없으면 rpm / tpm 을 쓴다."""
+    if path is not None:
+        lines = Path(path).read_text(encoding="utf-8").splitlines()
+    else:
+        lines = os.environ.get(KEYS_ENV, "").split(",")
+    keys, seen = [], set()
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in line.split(",")]
+        if parts[0] in seen:
+            continue
+        seen.add(parts[0])
+        try:
+            keys.append(ApiKey(parts[0], float(parts[1]) if len(parts) > 1 and parts[1] else rpm,
+                               float(parts[2]) if len(parts) > 2 and parts[2] else tpm))
+        except ValueError:
+            raise ValueError(f"키 파일의 RPM / TPM 은 숫자여야 합니다: {parts[0][-4:]} 줄")
+    return keys
+
+
+def key_usage() -> Dict[str, Dict[str, int]]:
+    """이번 실행에서 쓴 (키, 모델)별 누적 통계"""
+    models = {m for _, m in _STATES}
+    return {s.key.name + (f"@{m}" if len(models) > 1 else ""): dict(s.usage)
+            for (_, m), s in _STATES.items() if s.usage}
+
+
+def print_key_usage() -> None:
+    usage = key_usage()
+    if usage:
+        print("Keys →", usage)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+실험 러너용 LLM 백엔드
+------------------------------------------------
+페르소나마다 ChatGoogleGenerativeAI 를 새로 만들지 않고,
+프로세스 전체에서 하나의 클라이언트(커넥션 재사용)를 공유한다.
+--backend stub 이면 API 없이 stub_backend.StubBackend 를, mock 이면 mock_backend.MockBackend 를 쓴다.
+API 키가 여러 개면(--api-keys-file / GOOGLE_API_KEYS) 키마다 백엔드를 만들어 key_pool.KeyPool 로 묶는다.
+"""
+
+import argparse
+import math
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+MODEL_NAME = "gemini-2.0-flash"
+CHOICES = ("Left", "Right")
+LOGPROB_TOP_K = 5           # 출력 토큰 위치마다 받을 상위 후보 수
+LOGPROB_MAX_TOKENS = 16     # 선택만 받으므로 출력 길이를 짧게 제한
+
+# 출력 토큰 위치별 [(token, logprob), ...] (첫 원소 = 실제로 선택된 토큰)
+TopLogprobs = List[List[Tuple[str, float]]]
+
+
+class Completion(NamedTuple):
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    logprobs: Optional[TopLogprobs] = None
+
+
+def estimate_tokens(text: str) -> int:
+    """토크나이저 없이 쓰는 대략적인 토큰 수 (영문 ~4자, 한글/아랍어 ~2자 당 1토큰)"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def classify_error(e: Any) -> str:
+    """예외(또는 기록된 오류 문자열)를 재실행 판단용 분류로 변환
+    quota / unavailable / safety / parse / timeout / other"""
+    name = type(e).__name__ if isinstance(e, BaseException) else ""
+    msg = str(e)
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if code == 429 or any(k in msg for k in ("429", "RESOURCE_EXHAUSTED", "Resource has been exhausted",
+                                              "rate limit")):
+        return "quota"
+    if code == 503 or any(k in msg for k in ("503", "UNAVAILABLE", "overloaded")):
+        return "unavailable"
+    if any(k in msg for k in ("SAFETY", "blocked", "PROHIBITED_CONTENT")):
+        return "safety"
+    if "OutputParser" in name or "JSONDecodeError" in name or any(
+            k in msg for k in ("Invalid json output", "Expecting value", "Unterminated string")):
+        return "parse"
+    if isinstance(e, TimeoutError) or "Timeout" in name or "DEADLINE_EXCEEDED" in msg:
+        return "timeout"
+    return "other"
+
+
+def _choice_of(token: str) -> Optional[str]:
+    t = token.strip().strip('"\'').strip().lower()
+    if len(t) < 2:
+        return None
+    for c in CHOICES:
+        if c.lower().startswith(t):  # "Left" 또는 "Le" 처럼 쪼개진 첫 토큰
+            return c
+    return None
+
+
+def choice_probabilities(top_logprobs: TopLogprobs) -> Optional[Dict[str, Any]]:
+    """선택된 토큰이 처음으로 Left/Right 인 위치에서 두 선택지의 확률을 정규화해 돌려준다.
+    JSON 출력({"choice": "Left"})이든 단어 하나든 같은 방식으로 찾는다."""
+    for cands in top_logprobs:
+        if not cands or _choice_of(cands[0][0]) is None:
+            continue
+        mass = dict.fromkeys(CHOICES, 0.0)
+        for tok, lp in cands:
+            c = _choice_of(tok)
+            if c is not None:
+                mass[c] += math.exp(lp)
+        total = mass["Left"] + mass["Right"]
+        p_left = mass["Left"] / total
+        return {"choice": "Left" if p_left >= 0.5 else "Right",
+                "p_left": round(p_left, 6), "p_right": round(1 - p_left, 6)}
+    return None
+
+
+def _gen_kwargs(max_output_tokens: Optional[int] = None, schema: Optional[Dict[str, Any]] = None
+                ) -> Dict[str, Any]:
+    """ainvoke/astream/agenerate 에 넘길 생성 설정 (출력 상한, JSON 모드 + 응답 스키마)"""
+    kwargs: Dict[str, Any] = {}
+    if max_output_tokens:
+        kwargs["max_output_tokens"] = max_output_tokens
+    if schema is not None:
+        kwargs["response_mime_type"] = "application/json"
+        kwargs["response_json_schema"] = schema
+    return kwargs
+
+
+def message_text(msg: Any) -> str:
+    """AIMessage.content 가 문자열/파트 리스트 어느 쪽이든 텍스트만 이어 붙인다."""
+    content = getattr(msg, "content", msg)
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+class GeminiBackend:
+    """장수명 Gemini 클라이언트 (LangChain 래퍼)"""
+
+    # 요청 하나로 받을 수 있는 후보(candidate_count) 상한. 모델이 거부하면 엔진이 1 로 낮춘다.
+    max_candidates = 8
+
+    def __init__(self, model: str = MODEL_NAME, temperature: float = 1, **llm_kwargs: Any):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.model = model
+        self.temperature = temperature
+        # 429 는 엔진의 레이트 리미터가 처리하도록 SDK 내부 재시도를 끈다 (1 = 재시도 없음)
+        llm_kwargs.setdefault("max_retries", 1)
+        self._llm_cls = ChatGoogleGenerativeAI
+        self._llm_kwargs = llm_kwargs
+        self._n_llms: Dict[int, Any] = {}
+        self.llm = ChatGoogleGenerativeAI(model=model, temperature=temperature, **llm_kwargs)
+
+    async def agenerate(self, prompt: str, max_output_tokens: Optional[int] = None,
+                        schema: Optional[Dict[str, Any]] = None) -> Completion:
+        msg = await self.llm.ainvoke(prompt, **_gen_kwargs(max_output_tokens, schema))
+        usage = getattr(msg, "usage_metadata", None) or {}
+        return Completion(message_text(msg), usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+    async def astream(self, prompt: str, max_output_tokens: Optional[int] = None,
+                      schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[Completion]:
+        """응답을 조각 단위로 돌려준다 (토큰 수는 조각별 증분). 소비자가 aclose 하면 스트림 요청도 끊긴다."""
+        async for chunk in self.llm.astream(prompt, **_gen_kwargs(max_output_tokens, schema)):
+            usage = getattr(chunk, "usage_metadata", None) or {}
+            yield Completion(message_text(chunk), usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+    async def agenerate_n(self, prompt: str, n: int, schema: Optional[Dict[str, Any]] = None) -> List[Completion]:
+        """같은 프롬프트의 독립 샘플 n 개를 한 번의 요청으로 받는다 (candidate_count = n).
+        API 가 중복 후보를 걸러 n 개보다 적게 돌려줄 수 있다."""
+        if n <= 1:
+            return [await self.agenerate(prompt, schema=schema)]
+        from langchain_core.messages import HumanMessage
+
+        llm = self._n_llms.get(n)
+        if llm is None:
+            llm = self._n_llms[n] = self._llm_cls(model=self.model, temperature=self.temperature,
+                                                  n=n, **self._llm_kwargs)
+        res = await llm.agenerate([[HumanMessage(content=prompt)]], **_gen_kwargs(schema=schema))
+        msgs = [g.message for g in res.generations[0]]
+        usage = (getattr(msgs[0], "usage_metadata", None) or {}) if msgs else {}
+        # 사용량은 요청 단위로 보고되므로 입력은 첫 후보에, 출력은 후보 수로 나눠 기록
+        out_each = usage.get("output_tokens", 0) // max(len(msgs), 1)
+        return [Completion(message_text(m), usage.get("input_tokens", 0) if i == 0 else 0, out_each)
+                for i, m in enumerate(msgs)]
+
+    async def agenerate_logprobs(self, prompt: str, top_k: int = LOGPROB_TOP_K,
+                                 schema: Optional[Dict[str, Any]] = None) -> Completion:
+        """짧은 응답과 토큰별 상위 logprob 을 받는다.
+        LangChain 래퍼는 logprobs 를 노출하지 않으므로 래퍼가 가진 google-genai 클라이언트를 직접 쓴다."""
+        from google.genai import types
+
+        resp = await self.llm.client.aio.models.generate_content(
+            model=self.model, contents=prompt,
+            config=types.GenerateContentConfig(
+                temperature=self.temperature, max_output_tokens=LOGPROB_MAX_TOKENS,
+                response_logprobs=True, logprobs=top_k, **_gen_kwargs(schema=schema)),
+        )
+        positions: TopLogprobs = []
+        cand = resp.candidates[0] if resp.candidates else None
+        lr = getattr(cand, "logprobs_result", None)
+        if lr is not None:
+            for chosen, top in zip(lr.chosen_candidates or [], lr.top_candidates or []):
+                others = [(c.token, c.log_probability) for c in (top.candidates or []) if c.token != chosen.token]
+                positions.append([(chosen.token, chosen.log_probability)] + others)
+        usage = resp.usage_metadata
+        return Completion(resp.text or "", getattr(usage, "prompt_token_count", 0) or 0,
+                          getattr(usage, "candidates_token_count", 0) or 0, positions)
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_backend_args(ap: argparse.ArgumentParser) -> None:
+    from mock_backend import PROFILES
+
+    ap.add_argument("--backend", choices=["gemini", "stub", "mock"], default="gemini",
+                    help="stub = API 없이 결정적 가짜 응답(logprobs 포함)을 돌려주는 로컬 백엔드, "
+                         "mock = stub 에 지연/429/깨진 JSON 을 더한 모의 서버")
+    ap.add_argument("--mock-profile", choices=PROFILES, default="flash",
+                    help="--backend mock 의 지연/오류 프로필 (mock_backend.PROFILES)")
+    ap.add_argument("--api-keys-file", type=Path,
+                    help="API 키 목록 (한 줄에 KEY[,RPM[,TPM]]). 없으면 환경 변수 GOOGLE_API_KEYS (쉼표 구분), "
+                         "그것도 없으면 GOOGLE_API_KEY 하나")
+    ap.add_argument("--key-rpm", type=float, default=0.0, help="키 파일에 쿼터가 없는 키의 분당 요청 쿼터 (0 = 모름)")
+    ap.add_argument("--key-tpm", type=float, default=0.0, help="키 파일에 쿼터가 없는 키의 분당 토큰 쿼터 (0 = 모름)")
+    ap.add_argument("--key-quarantine", type=float, default=5.0,
+                    help="429 를 받기 시작한 키를 쉬게 하는 시간 (초, 풀리자마자 다시 격리되면 두 배씩)")
+
+
+def backend_from_args(args: argparse.Namespace, model: str = MODEL_NAME,
+                      temperature: float = 1, **llm_kwargs: Any) -> Any:
+    from key_pool import KeyPool, load_keys
+
+    keys = load_keys(args.api_keys_file, args.key_rpm, args.key_tpm)
+
+    def make(key: Optional[str], seed: int = 0) -> Any:
+        if args.backend == "stub":
+            from stub_backend import StubBackend
+            return StubBackend(model=model, temperature=temperature)
+        if args.backend == "mock":  # 키마다 모의 서버가 따로 (키별 쿼터)
+            from mock_backend import PROFILES, MockBackend
+            return MockBackend(PROFILES[args.mock_profile], model=model, temperature=temperature, seed=seed)
+        return GeminiBackend(model, temperature=temperature,
+                             **({"google_api_key": key} if key else {}), **llm_kwargs)
+
+    if len(keys) < 2:
+        return make(keys[0].key if keys else None)
+    return KeyPool([(k, make(k.key, i)) for i, k in enumerate(keys)], args.key_quarantine)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+LLM 응답 캐시 (content-addressed, SQLite)
+------------------------------------------------
+키 = sha256(모델명, temperature, 렌더링된 프롬프트 전문, 샘플/반복 번호, 생성 방식)
+생성 방식은 엔진이 만드는 지문(선택 전용 / logprob / 출력 상한 / 응답 스키마 해시)이라
+같은 프롬프트라도 선택만 받은 응답과 logprob 응답, 스키마로 제한한 응답과 자유 텍스트 응답이 섞이지 않는다.
+(기본 생성 방식의 지문은 빈 문자열이라 예전 키와 같다.)
+저장(put)과 조회 시각(last_used) 갱신은 메모리에 모았다가 FLUSH_EVERY 개 또는 FLUSH_SECONDS 초마다 한 트랜잭션으로 쓰고,
+엔진은 aget / aput 으로 조회와 쓰기를 작업 스레드에서 돌려 SQLite 커밋이 이벤트 루프를 막지 않는다.
+아직 쓰지 않은 응답은 프로세스가 끝날 때(atexit) 쓴다.
+--rerun-*, --ids 재실행, 중단된 --repeat, 번역 retry_missing 이 이미 받은 응답에
+다시 비용을 내지 않도록 엔진 앞단에서 조회한다. 파싱에 성공한 응답만 저장된다.
+
+1) 통계
+   python llm_cache.py stats --db .cache/llm_cache.db
+2) 내보내기 / 가져오기 (JSONL, 오프라인 재생용)
+   python llm_cache.py export --db .cache/llm_cache.db --file cache_dump.jsonl
+   python llm_cache.py import --db .cache/llm_cache.db --file cache_dump.jsonl
+"""
+
+import argparse
+import asyncio
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from llm_backend import Completion
+
+DEFAULT_CACHE_DB = Path(".cache/llm_cache.db")
+FLUSH_EVERY = 200     # 이만큼 모이면 한 트랜잭션으로 쓴다
+FLUSH_SECONDS = 5.0   # 가장 오래 기다린 쓰기가 이만큼 지나도 쓴다
+
+
+class CacheMiss(KeyError):
+    """오프라인 재생 모드에서 캐시에 없는 프롬프트를 만났을 때"""
+
+
+class ResponseCache:
+    def __init__(self, path: Path = DEFAULT_CACHE_DB, max_bytes: Optional[int] = None,
+                 max_entries: Optional[int] = None, offline: bool = False):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        # 아직 쓰지 않은 저장 (키 → 행) / 조회 시각 (키 → last_used), 가장 오래된 쓰기 시각
+        self._pending: Dict[str, Tuple[Any, ...]] = {}
+        self._touched: Dict[str, float] = {}
+        self._pending_since: Optional[float] = None
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, temperature REAL, sample INTEGER,"
+            " text TEXT, input_tokens INTEGER, output_tokens INTEGER,"
+            " size INTEGER, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(model: str, temperature: float, prompt: str, sample: int = 0, mode: str = "") -> str:
+        parts = [model, float(temperature), prompt, int(sample)] + ([mode] if mode else [])
+        raw = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---------- 조회 / 저장 ---------- #
+    def get(self, key: str) -> Optional[Completion]:
+        with self._lock:
+            pending = self._pending.get(key)
+            row = pending[4:7] if pending is not None else self._conn.execute(
+                "SELECT text, input_tokens, output_tokens FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            self._pending_since = self._pending_since or time.time()
+            if self._flush_due():
+                self._flush_locked()
+        return Completion(*row)
+
+    def put(self, key: str, comp: Completion, model: str = "", temperature: float = 0,
+            sample: int = 0) -> None:
+        if self._stage(key, comp, model, temperature, sample):
+            self.flush()
+
+    async def aget(self, key: str) -> Optional[Completion]:
+        """get 을 작업 스레드에서 (다른 스레드의 커밋을 기다리는 동안 이벤트 루프를 막지 않도록)"""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, comp: Completion, model: str = "", temperature: float = 0,
+                   sample: int = 0) -> None:
+        """메모리에 모으고, 쓸 때가 되면 작업 스레드에서 한 트랜잭션으로 쓴다"""
+        if self._stage(key, comp, model, temperature, sample):
+            await asyncio.to_thread(self.flush)
+
+    def _stage(self, key: str, comp: Completion, model: str, temperature: float, sample: int) -> bool:
+        """저장할 행을 메모리에 모으고, 쓸 때가 되었는지 돌려준다"""
+        size = len(comp.text.encode("utf-8"))
+        with self._lock:
+            self._pending[key] = (key, model, float(temperature), int(sample), comp.text,
+                                  comp.input_tokens, comp.output_tokens, size, time.time())
+            self._pending_since = self._pending_since or time.time()
+            return self._flush_due()
+
+    def _flush_due(self) -> bool:
+        return (len(self._pending) + len(self._touched) >= FLUSH_EVERY
+                or (self._pending_since is not None and time.time() - self._pending_since >= FLUSH_SECONDS))
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        """모아 둔 저장과 조회 시각을 한 트랜잭션으로 쓴다"""
+        if not self._pending and not self._touched:
+            return
+        pending, touched = self._pending, self._touched
+        self._pending, self._touched, self._pending_since = {}, {}, None
+        self._conn.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               pending.values())
+        self._conn.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                               [(t, k) for k, t in touched.items() if k not in pending])
+        self._conn.commit()
+        self._puts_since_evict += len(pending)
+        if self._puts_since_evict >= 1000:
+            self._evict_locked()
+
+    # ---------- 크기 제한 (LRU) ---------- #
+    def _evict_locked(self) -> int:
+        self._puts_since_evict = 0
+        removed = 0
+        if self.max_entries:
+            n = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if n > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (n - self.max_entries,)
+                ).rowcount
+        if self.max_bytes:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                cutoff, acc = None, 0
+                for last_used, size in self._conn.execute(
+                        "SELECT last_used, size FROM responses ORDER BY last_used"):
+                    acc += size
+                    cutoff = last_used
+                    if total - acc <= self.max_bytes:
+                        break
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE last_used <= ?", (cutoff,)).rowcount
+        self._conn.commit()
+        return removed
+
+    def evict(self) -> int:
+        with self._lock:
+            self._flush_locked()
+            return self._evict_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._flush_locked()
+            n, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": n, "bytes": total, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+    # ---------- 내보내기 / 가져오기 ---------- #
+    def export_jsonl(self, out_path: Path) -> int:
+        n = 0
+        self.flush()
+        with self._lock, Path(out_path).open("w", encoding="utf-8") as f:
+            for row in self._conn.execute(
+                    "SELECT key, model, temperature, sample, text, input_tokens, output_tokens "
+                    "FROM responses ORDER BY rowid"):
+                rec = dict(zip(("key", "model", "temperature", "sample", "text",
+                                "input_tokens", "output_tokens"), row))
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                n += 1
+        return n
+
+    def import_jsonl(self, in_path: Path) -> int:
+        n = 0
+        now = time.time()
+        self.flush()
+        with self._lock, Path(in_path).open(encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                r = json.loads(line)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (r["key"], r.get("model", ""), r.get("temperature", 0), r.get("sample", 0),
+                     r["text"], r.get("input_tokens", 0), r.get("output_tokens", 0),
+                     len(r["text"].encode("utf-8")), now),
+                )
+                n += 1
+            self._conn.commit()
+        return n
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_cache_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--cache-db", type=Path, default=DEFAULT_CACHE_DB, help="LLM 응답 캐시 파일")
+    ap.add_argument("--no-cache", action="store_true", help="응답 캐시를 사용하지 않음")
+    ap.add_argument("--cache-max-mb", type=float, help="캐시 최대 크기(MB), 초과 시 LRU 삭제")
+    ap.add_argument("--cache-offline", action="store_true",
+                    help="API 호출 없이 캐시만으로 결과 재생 (없는 항목은 오류 처리)")
+
+
+def cache_from_args(args: argparse.Namespace) -> Optional[ResponseCache]:
+    if args.no_cache:
+        return None
+    max_bytes = int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None
+    return ResponseCache(args.cache_db, max_bytes=max_bytes, offline=args.cache_offline)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("LLM response cache")
+    ap.add_argument("command", choices=["stats", "export", "import", "evict"])
+    ap.add_argument("--db", type=Path, default=DEFAULT_CACHE_DB)
+    ap.add_argument("--file", type=Path, help="export/import 대상 JSONL")
+    ap.add_argument("--max-mb", type=float, help="evict 시 최대 크기(MB)")
+    ap.add_argument("--max-entries", type=int, help="evict 시 최대 항목 수")
+    args = ap.parse_args()
+
+    cache = ResponseCache(args.db, max_entries=args.max_entries,
+                          max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb else None)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == "evict":
+        print(f"[✓] Evicted {cache.evict()} entries")
+    elif args.file is None:
+        raise ValueError("--file 이 필요합니다.")
+    elif args.command == "export":
+        print(f"[✓] Exported {cache.export_jsonl(args.file)} entries → {args.file}")
+    else:
+        print(f"[✓] Imported {cache.import_jsonl(args.file)} entries ← {args.file}")
+
+
+if __name__ == "__main__":
+    main()
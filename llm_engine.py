@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+비동기 실험 실행 엔진
+------------------------------------------------
+모든 페르소나 × 시나리오 × 반복 셀을 하나의 이벤트 루프에서 실행한다.
+동시 요청 수는 전역 세마포어 하나(max_concurrency)로 제한되고,
+limiter 가 있으면 모든 호출이 같은 RPM/TPM 버킷을 거친다 (429/503 은 재시도).
+cache 가 있으면 API 호출 전에 (모델, temperature, 프롬프트, 샘플 번호, 생성 방식 지문) 으로 먼저 조회한다.
+payload 의 "_sample" 키는 프롬프트에 쓰이지 않고 캐시 키의 샘플/반복 번호로만 쓰인다.
+payload 에 미리 렌더링한 "_prompt" / "_choice_prompt"(experiment_plan)가 있으면 템플릿 대신 그 텍스트를 보낸다.
+페르소나 단위 그룹은 자신의 셀이 모두 끝나는 즉시 on_done 으로 넘겨진다.
+실패한 셀은 오류 분류(RETRY_POLICY)에 따라 지수 백오프 + 지터로 셀 단위 재시도되고,
+재시도가 끝나도 실패하면 예외가 그 셀의 결과로 남는다 (배치는 중단되지 않음).
+packer(packed_mode.ScenarioPacker)가 있으면 그룹마다 묶음 요청 하나를 먼저 보내고,
+검증에 실패한 셀만 단일 셀 호출로 다시 묻는다.
+samples 를 주고 실행하면 프롬프트마다 후보 여러 개(candidate_count)를 한 번에 받아
+각 후보를 별도 샘플(반복)로 돌려준다. 백엔드 상한을 넘는 몫이나 실패한 후보는 병렬 단일 호출로 채운다.
+logprobs > 0 이면 선택만 받는 짧은 응답의 토큰 logprob 에서 P(Left)/P(Right) 를 계산해
+{"choice", "p_left", "p_right"} 로 돌려준다 (캐시에도 이 결과가 저장된다).
+payload 에 "_choice_only" 가 참이고 choice_prompt 가 있으면 선택만 묻는 프롬프트를
+choice_max_tokens 출력 상한으로 보내고, 결과에 "choice_only": True 를 붙인다.
+stream 이면 단일 응답을 스트림으로 받아 ChoiceStreamParser 로 choice 를 조각마다 확인하고,
+선택 전용 셀은 choice 가 확정되는 즉시 스트림을 끊는다.
+JSON 파서가 실패하면 재호출하기 전에 salvage_choice 로 잘린/깨진 응답에서 choice 를 건져 본다.
+schemas(structured_output.schemas_for)가 있으면 단일 셀 / 선택 전용 / 묶음 호출마다 해당 응답 스키마를
+백엔드에 넘겨 모델의 JSON 모드로 출력을 제한한다.
+metrics(run_metrics.RunMetrics)가 있으면 API 호출마다 지연/토큰/오류 분류를, 재시도와 셀 최종 결과를
+(difficulty, metric) 별로 기록하고 그룹이 끝날 때마다 스냅샷을 갱신한다.
+hedger(hedging.LatencyTracker)가 있으면 호출 종류별 지연 분위를 넘긴 요청에 복제 요청을 하나 더 보내
+먼저 끝난 쪽을 쓰고, hard_timeout 을 넘긴 호출은 TimeoutError(→ timeout 재시도 / 오류 셀)로 끝낸다.
+budget(run_budget.RunBudget)이 있으면 API 호출마다(헤지 복제 요청 포함) 추정 비용을 예약하고, 응답을 받으면 실제 토큰으로 정산한다.
+예산이 바닥나면 BudgetExhausted 가 셀 오류로 바뀌지 않고 run_groups 밖으로 나가 실행을 멈춘다.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from llm_backend import Completion, choice_probabilities, classify_error, estimate_tokens
+from llm_cache import CacheMiss
+from rate_limiter import is_throttle_error
+from run_budget import BudgetExhausted
+from stream_parser import ChoiceStreamParser, salvage_choice
+
+Group = Tuple[Any, List[Dict[str, Any]]]
+
+# 현재 태스크가 처리 중인 셀의 (difficulty, metric) — 계측 라벨
+_cell_labels: ContextVar[Tuple[str, str]] = ContextVar("cell_labels", default=("", ""))
+
+
+def _labels_of(payload: Dict[str, Any], metric: Optional[str] = None) -> Tuple[str, str]:
+    return str(payload.get("difficulty", "")), metric or str(payload.get("metric", ""))
+
+# 오류 분류 → (최대 재시도 횟수, 백오프 기본 대기 초)
+#   quota/unavailable/timeout : 서버 쪽 문제 → 길게 기다렸다 재시도
+#   parse/empty               : 같은 프롬프트를 다시 샘플링하면 대개 해결 → 바로 재시도
+#   safety                    : 같은 프롬프트는 다시 막히므로 재시도하지 않음
+RETRY_POLICY: Dict[str, Tuple[int, float]] = {
+    "quota": (6, 2.0),
+    "unavailable": (5, 1.0),
+    "timeout": (3, 1.0),
+    "parse": (2, 0.0),
+    "empty": (2, 0.0),
+    "safety": (0, 0.0),
+    "other": (1, 1.0),
+}
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 60.0) -> float:
+    """full jitter: [0, min(cap, base * 2^attempt)] 에서 균등 추출"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ExperimentEngine:
+    def __init__(self, backend: Any, prompt_template: Any, max_concurrency: int = 50,
+                 parser: Optional[Any] = None, limiter: Optional[Any] = None,
+                 max_throttle_retries: int = 8, cache: Optional[Any] = None,
+                 is_valid: Optional[Callable[[Any], bool]] = None,
+                 retry_policy: Optional[Dict[str, Tuple[int, float]]] = None,
+                 max_backoff: float = 60.0, packer: Optional[Any] = None,
+                 candidates: int = 1, logprobs: int = 0,
+                 choice_prompt: Optional[Any] = None, choice_max_tokens: Optional[int] = None,
+                 stream: bool = False, schemas: Optional[Dict[str, Any]] = None,
+                 metrics: Optional[Any] = None, hedger: Optional[Any] = None,
+                 hard_timeout: float = 0.0, budget: Optional[Any] = None):
+        if parser is None:
+            from langchain_core.output_parsers import JsonOutputParser
+            parser = JsonOutputParser()
+        self.backend = backend
+        self.prompt = prompt_template
+        self.parser = parser
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter
+        self.max_throttle_retries = max_throttle_retries
+        self.cache = cache
+        # 캐시에 저장해도 되는 (재실행 대상이 아닌) 응답인지 판별
+        self.is_valid = is_valid or (lambda r: True)
+        self.retry_policy = {**RETRY_POLICY, **(retry_policy or {})}
+        self.max_backoff = max_backoff
+        self.retries: Counter = Counter()  # 오류 분류별 재시도 횟수
+        self.packer = packer
+        self.pack_stats: Counter = Counter()  # calls / cells / fallback
+        self.candidates = candidates  # 요청 하나당 후보 수 (백엔드 max_candidates 로 다시 제한)
+        self.sample_stats: Counter = Counter()  # calls / samples / fallback
+        self.logprobs = logprobs  # 0 이 아니면 위치별 상위 logprob 후보 수
+        self.choice_prompt = choice_prompt
+        self.choice_max_tokens = choice_max_tokens
+        self.stream = stream
+        self.stream_stats: Counter = Counter()  # calls / early_stop / salvaged
+        self.schemas = schemas or {}  # cell / choice / packed → 응답 스키마
+        self.metrics = metrics
+        self.hedger = hedger
+        self.hard_timeout = hard_timeout
+        self.budget = budget
+        self.hedge_stats: Counter = Counter()  # hedged / won / timeouts / wasted_input_tokens / wasted_output_tokens
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._avg_output_tokens = 64.0  # 관측값으로 갱신되는 출력 토큰 이동평균
+
+    # ---------- 단일 셀 ---------- #
+    async def _generate(self, prompt: str, n: int = 1, max_tokens: Optional[int] = None,
+                        stop_on_choice: bool = False, schema: Optional[Dict[str, Any]] = None) -> Any:
+        """n == 1 이면 Completion 하나, n > 1 이면 후보 Completion 리스트"""
+        kw = {"schema": schema} if schema is not None else {}
+
+        def call():
+            if self.logprobs:
+                return self.backend.agenerate_logprobs(prompt, self.logprobs, **kw)
+            if n > 1:
+                return self.backend.agenerate_n(prompt, n, **kw)
+            if self.stream:
+                return self._astream(prompt, max_tokens, stop_on_choice, kw)
+            if max_tokens:
+                return self.backend.agenerate(prompt, max_output_tokens=max_tokens, **kw)
+            return self.backend.agenerate(prompt, **kw)
+
+        out_est = min(self._avg_output_tokens, max_tokens) if max_tokens else self._avg_output_tokens
+        est = estimate_tokens(prompt) + n * out_est
+        kind = "packed" if _cell_labels.get()[1] == "packed" else (
+            f"n{n}" if n > 1 else "choice" if max_tokens else "cell")
+        if self.limiter is None:
+            return await self._call(call, n, prompt, est, kind)
+        for attempt in range(self.max_throttle_retries + 1):
+            t0 = asyncio.get_running_loop().time()
+            await self.limiter.acquire(est)
+            if self.metrics is not None:
+                self.metrics.observe_wait("limiter", asyncio.get_running_loop().time() - t0)
+            try:
+                res = await self._call(call, n, prompt, est, kind)
+            except Exception as e:
+                if is_throttle_error(e):
+                    self.limiter.on_throttle()
+                    if attempt < self.max_throttle_retries:
+                        continue
+                raise
+            self.limiter.on_success()
+            comps = [res] if n == 1 else res
+            for comp in comps:
+                if comp.output_tokens and not max_tokens:  # 상한을 둔 짧은 응답은 평균에서 제외
+                    self._avg_output_tokens += 0.05 * (comp.output_tokens - self._avg_output_tokens)
+            self.limiter.settle(est, sum(c.input_tokens + c.output_tokens for c in comps))
+            return res
+
+    async def _call(self, call: Callable[[], Any], n: int, prompt: str, est: float, kind: str) -> Any:
+        """API 호출 하나 (헤지 / hard_timeout 적용). 복제 요청은 리미터를 거치지만 동시성 슬롯은 원래 셀의 것을 쓴다."""
+        if self.hedger is None and not self.hard_timeout:
+            return await self._timed(call, n, prompt, est)
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        deadline = t0 + self.hard_timeout if self.hard_timeout else None
+        delay = self.hedger.threshold(kind) if self.hedger is not None else None
+        first = asyncio.ensure_future(self._timed(call, n, prompt, est))
+        starts = {first: t0}
+        pending = {first}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                hedge_at = t0 + delay if delay is not None and len(starts) == 1 else None
+                wake = min((x for x in (hedge_at, deadline) if x is not None), default=None)
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if wake is None else max(0.0, wake - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if self.hedger is not None:  # 빨리 끝난 실패(429 등)는 지연 분포에 넣지 않는다
+                            self.hedger.observe(kind, loop.time() - starts[t])
+                        res = t.result()
+                        if t is not first:
+                            self.hedge_stats["won"] += 1
+                        self._cancel_losers(pending, starts, prompt, res, n, kind)
+                        pending = set()
+                        return res
+                    error = error or t.exception()
+                if done and len(starts) == 1:
+                    break  # 원 요청이 실패하면 헤지하지 않고 셀 재시도에 맡긴다
+                if not done and deadline is not None and loop.time() >= deadline:
+                    self.hedge_stats["timeouts"] += 1
+                    raise TimeoutError(f"hard timeout after {self.hard_timeout:g}s")
+                if not done and hedge_at is not None and loop.time() >= hedge_at:
+                    if self.limiter is not None:
+                        await self.limiter.acquire(est)
+                    hedge = asyncio.ensure_future(self._timed(call, n, prompt, est))
+                    starts[hedge] = loop.time()
+                    pending.add(hedge)
+                    self.hedge_stats["hedged"] += 1
+            raise error
+        finally:
+            self._cancel_losers(pending, starts, prompt, None, n, kind)
+
+    def _cancel_losers(self, pending: set, starts: Dict[Any, float], prompt: str, winner: Any, n: int,
+                       kind: str) -> None:
+        """남은 요청을 취소하고 그 토큰(입력 + 승자와 같은 출력 추정)을 낭비분으로 센다"""
+        if not pending:
+            return
+        loop = asyncio.get_running_loop()
+        comps = [] if winner is None else [winner] if n == 1 else winner
+        tokens_in = estimate_tokens(prompt)
+        tokens_out = sum(c.output_tokens for c in comps)
+        for t in pending:
+            t.cancel()
+            if self.hedger is not None:  # 취소 시점까지의 시간 = 실제 지연의 하한 (분위가 낮게 끌려가지 않도록)
+                self.hedger.observe(kind, loop.time() - starts[t])
+            self.hedge_stats.update(wasted_input_tokens=tokens_in, wasted_output_tokens=tokens_out)
+            if self.budget is not None:
+                self.budget.charge(tokens_in, tokens_out)
+            if self.metrics is not None:
+                self.metrics.observe_call(_cell_labels.get(), loop.time() - starts[t], tokens_in, tokens_out,
+                                          error="hedge_cancelled")
+
+    async def _timed(self, call: Callable[[], Any], n: int, prompt: str, est: float) -> Any:
+        """API 호출 하나의 지연 / 토큰 / 오류 분류를 metrics 에 기록하고,
+        budget 에는 보내기 전에 추정 토큰을 예약했다가 응답의 실제 토큰으로 정산한다 (실패 / 취소면 예약만 되돌림)"""
+        if self.metrics is None and self.budget is None:
+            return await call()
+        reservation = None
+        if self.budget is not None:
+            est_in = estimate_tokens(prompt)
+            reservation = await self.budget.acquire(est_in, max(est - est_in, 0.0))
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        try:
+            res = await call()
+        except BaseException as e:
+            if reservation is not None:
+                self.budget.release(reservation)
+            if self.metrics is not None and isinstance(e, Exception):
+                self.metrics.observe_call(_cell_labels.get(), loop.time() - t0, error=classify_error(e))
+            raise
+        comps = [res] if n == 1 else res
+        tokens_in, tokens_out = sum(c.input_tokens for c in comps), sum(c.output_tokens for c in comps)
+        if self.metrics is not None:
+            self.metrics.observe_call(_cell_labels.get(), loop.time() - t0, tokens_in, tokens_out)
+        if self.budget is not None:
+            self.budget.charge(tokens_in, tokens_out, reservation)
+        return res
+
+    async def _astream(self, prompt: str, max_tokens: Optional[int], stop_on_choice: bool,
+                       kw: Dict[str, Any]) -> Completion:
+        """스트림 조각을 이어 붙여 Completion 하나로 만든다. stop_on_choice 면 choice 확정 즉시 끊는다."""
+        parser = ChoiceStreamParser()
+        tokens_in = tokens_out = 0
+        stream = self.backend.astream(prompt, max_output_tokens=max_tokens, **kw)
+        try:
+            async for delta in stream:
+                tokens_in += delta.input_tokens
+                tokens_out += delta.output_tokens
+                if parser.feed(delta.text) and stop_on_choice:
+                    break
+        finally:
+            await stream.aclose()  # 중간에 멈추면 스트림 요청도 끊긴다
+        self.stream_stats.update(calls=1)
+        text = parser.buffer
+        if stop_on_choice and parser.choice is not None:
+            self.stream_stats.update(early_stop=1)
+            text = json.dumps({"choice": parser.choice})  # 끊긴 뒷부분(닫는 괄호)은 선택 하나뿐이라 다시 쓴다
+        # 끊긴 스트림은 사용량이 마지막 조각에 오지 않으므로 받은 텍스트로 추정
+        return Completion(text, tokens_in or estimate_tokens(prompt), tokens_out or estimate_tokens(parser.buffer))
+
+    def _cache_key(self, prompt: str, sample: int, choice_only: bool = False,
+                   schema: Optional[Dict[str, Any]] = None) -> str:
+        return self.cache.key(self.backend.model, self.backend.temperature, prompt, sample,
+                              self._fingerprint(choice_only, schema))
+
+    def _fingerprint(self, choice_only: bool, schema: Optional[Dict[str, Any]]) -> str:
+        """같은 프롬프트라도 응답이 달라지는 생성 방식 (선택 전용 / logprob / 출력 상한 / 응답 스키마)"""
+        parts = []
+        if self.logprobs:
+            parts.append(f"logprobs={self.logprobs}")
+        if choice_only:
+            parts.append(f"choice_only;max_tokens={self.choice_max_tokens or 0}")
+        if schema is not None:
+            digest = hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()
+            parts.append(f"schema={digest[:16]}")
+        return ";".join(parts)
+
+    def _render(self, payload: Dict[str, Any]) -> Tuple[str, bool]:
+        """payload → (프롬프트, 선택 전용 여부)"""
+        choice_only = bool(payload.get("_choice_only")) and self.choice_prompt is not None
+        # logprob 모드의 기본 템플릿은 선택만 묻는 프롬프트다
+        rendered = payload.get("_choice_prompt" if choice_only or self.logprobs else "_prompt")
+        if rendered is not None:
+            return rendered, choice_only
+        template = self.choice_prompt if choice_only else self.prompt
+        return template.format(**{k: v for k, v in payload.items() if not k.startswith("_")}), choice_only
+
+    def render_calls(self, payloads: List[Dict[str, Any]]) -> List[Tuple[str, Optional[int], int]]:
+        """그룹 하나를 보낼 때의 (프롬프트, 출력 상한, 묶은 셀 수) 목록 (--dry-run 추정용, 재시도 / 폴백 제외)"""
+        if self.packer is not None and len(payloads) > 1:
+            return [(self.packer.render(payloads)[0], None, len(payloads))]
+        calls = []
+        for p in payloads:
+            prompt, choice_only = self._render(p)
+            calls.append((prompt, self.choice_max_tokens if choice_only else None, 1))
+        return calls
+
+    async def ainvoke(self, payload: Dict[str, Any]) -> Any:
+        prompt, choice_only = self._render(payload)
+        return await self._aprompt(prompt, payload.get("_sample", 0), self.is_valid, choice_only,
+                                   schema=self.schemas.get("choice" if choice_only else "cell"))
+
+    def _parse(self, text: str, choice_only: bool = False, salvage: bool = True) -> Any:
+        try:
+            result = self.parser.parse(text)
+        except Exception:
+            result = salvage_choice(text) if salvage else None
+            if result is None:
+                raise
+            self.stream_stats.update(salvaged=1)  # 재호출 대신 정규식으로 건진 응답
+        if choice_only and isinstance(result, dict):
+            result["choice_only"] = True
+        return result
+
+    async def _cached(self, key: str, is_valid: Callable[[Any], bool], choice_only: bool = False,
+                      salvage: bool = True) -> Any:
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            try:
+                result = self._parse(cached.text, choice_only, salvage)
+                if is_valid(result):
+                    return result
+            except Exception:
+                pass  # 캐시된 응답이 더 이상 유효하지 않으면 새로 호출
+        return None
+
+    async def _aprompt(self, prompt: str, sample: int, is_valid: Callable[[Any], bool],
+                       choice_only: bool = False, salvage: bool = True,
+                       schema: Optional[Dict[str, Any]] = None) -> Any:
+        """렌더링된 프롬프트 하나: 캐시 조회 → 호출 → 파싱 → (유효하면) 캐시 저장"""
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(prompt, sample, choice_only, schema)
+            result = await self._cached(key, is_valid, choice_only, salvage)
+            if result is not None:
+                return result
+            if self.cache.offline:
+                raise CacheMiss(key)
+
+        comp = await self._generate(prompt, max_tokens=self.choice_max_tokens if choice_only else None,
+                                    stop_on_choice=choice_only, schema=schema)
+        if self.logprobs:
+            probs = choice_probabilities(comp.logprobs or [])
+            if probs is not None:  # 선택 토큰을 못 찾으면 텍스트의 choice 만 쓴다 (샘플 row)
+                comp = comp._replace(text=json.dumps(probs))
+        result = self._parse(comp.text, choice_only, salvage)
+        if key is not None and is_valid(result):
+            await self.cache.aput(key, comp, self.backend.model, self.backend.temperature, sample)
+        return result
+
+    async def _run_cell(self, payload: Dict[str, Any]) -> Any:
+        _cell_labels.set(_labels_of(payload))
+        return await self._with_retry(lambda: self.ainvoke(payload), self.is_valid, self.retry_policy)
+
+    async def _with_retry(self, call: Callable[[], Any], is_valid: Callable[[Any], bool],
+                          policy: Dict[str, Tuple[int, float]]) -> Any:
+        attempt = 0
+        while True:
+            async with self._sem:
+                try:
+                    result = await call()
+                    err = None if is_valid(result) else "empty"
+                except CacheMiss as e:  # 오프라인 재생: 재시도해도 결과가 같다
+                    return e
+                except BudgetExhausted:  # 셀 오류가 아니라 실행 전체를 멈춘다
+                    raise
+                except Exception as e:  # 셀 단위 예외는 결과로 돌려준다 (배치 중단 X)
+                    result, err = e, classify_error(e)
+            max_retries, base = policy.get(err, policy["other"]) if err else (0, 0.0)
+            if err is None or attempt >= max_retries:
+                if self.metrics is not None:
+                    self.metrics.observe_cell(_cell_labels.get(), err or "ok")
+                return result
+            self.retries[err] += 1
+            delay = backoff_delay(attempt, base, self.max_backoff)
+            if self.metrics is not None:
+                self.metrics.observe_retry(_cell_labels.get(), err, delay)
+            # 대기하는 동안에는 동시성 슬롯을 다른 셀에 양보한다
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # ---------- 다중 후보 샘플 ---------- #
+    async def _run_samples(self, payload: Dict[str, Any], samples: List[int]) -> List[Any]:
+        """samples 각각(반복 번호)에 대한 응답. 캐시에 없는 샘플만 candidate_count 요청으로 받는다."""
+        _cell_labels.set(_labels_of(payload))
+        prompt = self._render(payload)[0]
+        results: Dict[int, Any] = {}
+        if self.cache is not None:
+            for s in samples:
+                r = await self._cached(self._cache_key(prompt, s, schema=self.schemas.get("cell")), self.is_valid)
+                if r is not None:
+                    results[s] = r
+        todo = [s for s in samples if s not in results]
+        offline = self.cache is not None and self.cache.offline
+        k = min(self.candidates, getattr(self.backend, "max_candidates", 1))
+        chunks = [todo[i:i + k] for i in range(0, len(todo), k)] if k > 1 and not offline else []
+
+        async def fetch(chunk: List[int]) -> None:
+            async with self._sem:
+                try:
+                    comps = await self._generate(prompt, len(chunk), schema=self.schemas.get("cell"))
+                except Exception as e:
+                    if classify_error(e) == "other" and "candidate" in str(e).lower():
+                        self.backend.max_candidates = 1  # 이 모델은 다중 후보를 지원하지 않음
+                    return
+            self.sample_stats.update(calls=1)
+            for s, comp in zip(chunk, comps):
+                try:
+                    r = self._parse(comp.text)
+                except Exception:
+                    continue
+                if self.is_valid(r):
+                    results[s] = r
+                    if self.cache is not None:
+                        await self.cache.aput(self._cache_key(prompt, s, schema=self.schemas.get("cell")), comp,
+                                              self.backend.model, self.backend.temperature, s)
+
+        await asyncio.gather(*(fetch(c) for c in chunks if len(c) > 1))
+        # 상한으로 남은 1개짜리 몫, 후보가 덜 오거나 깨진 샘플은 병렬 단일 호출(셀 단위 재시도 포함)
+        rest = [s for s in samples if s not in results]
+        self.sample_stats.update(samples=len(samples), fallback=len(rest))
+        for s, r in zip(rest, await asyncio.gather(
+                *(self._run_cell({**payload, "_sample": s}) for s in rest))):
+            results[s] = r
+        return [results[s] for s in samples]
+
+    # ---------- 묶음 요청 ---------- #
+    async def _run_packed(self, payloads: List[Dict[str, Any]]) -> List[Any]:
+        prompt, order = self.packer.render(payloads)
+        _cell_labels.set(_labels_of(payloads[0], "packed"))  # 묶음 호출은 metric="packed" 로 기록
+        # 묶음 응답이 깨지면 다시 묶어 묻지 않고 바로 단일 셀 호출로 넘어간다
+        policy = {**self.retry_policy, "parse": (0, 0.0), "empty": (0, 0.0)}
+        parsed = await self._with_retry(
+            lambda: self._aprompt(prompt, payloads[0].get("_sample", 0),
+                                  lambda r: all(x is not None and self.is_valid(x)
+                                                for x in self.packer.unpack(r, order)),
+                                  salvage=False,  # 배열 응답은 셀 하나만 건지면 안 됨
+                                  schema=self.schemas.get("packed")),
+            lambda r: True, policy)
+        resps: List[Any] = self.packer.unpack(None if isinstance(parsed, Exception) else parsed, order)
+        missing = [i for i, r in enumerate(resps) if r is None or not self.is_valid(r)]
+        self.pack_stats.update(calls=1, cells=len(payloads), fallback=len(missing))
+        if missing:
+            for i, r in zip(missing, await self.abatch([payloads[i] for i in missing])):
+                resps[i] = r
+        return resps
+
+    # ---------- 배치 ---------- #
+    async def abatch(self, payloads: List[Dict[str, Any]]) -> List[Any]:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return list(await asyncio.gather(*(self._run_cell(p) for p in payloads)))
+
+    async def _run_group(self, key: Any, payloads: List[Dict[str, Any]],
+                         samples: Optional[List[int]] = None) -> List[Any]:
+        if samples:
+            per_cell = await asyncio.gather(*(self._run_samples(p, samples) for p in payloads))
+            return [[res[j] for res in per_cell] for j in range(len(samples))]
+        if self.packer is not None and len(payloads) > 1:
+            return await self._run_packed(payloads)
+        return await self.abatch(payloads)
+
+    async def _job(self, key: Any, payloads: List[Dict[str, Any]],
+                   on_done: Callable[[Any, List[Any]], None],
+                   samples: Optional[List[int]] = None) -> Tuple["ExperimentEngine", Callable[[], None]]:
+        """그룹 하나를 실행하고 (엔진, 결과를 on_done 으로 넘기는 함수) 를 돌려준다"""
+        resps = await self._run_group(key, payloads, samples)
+
+        def deliver() -> None:
+            if samples:
+                for s, sample_resps in zip(samples, resps):
+                    on_done((key, s), sample_resps)
+            else:
+                on_done(key, resps)
+        return self, deliver
+
+    async def arun_groups(self, groups: Iterable[Group],
+                          on_done: Callable[[Any, List[Any]], None],
+                          desc: str = "Running", samples: Optional[List[int]] = None) -> None:
+        """samples 가 주어지면 그룹마다 샘플 수만큼 on_done((key, sample), resps) 로 넘긴다."""
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        await _drain([self._job(k, p, on_done, samples) for k, p in groups], desc)
+
+    def run_groups(self, groups: Iterable[Group],
+                   on_done: Callable[[Any, List[Any]], None],
+                   desc: str = "Running", samples: Optional[List[int]] = None) -> None:
+        asyncio.run(self.arun_groups(groups, on_done, desc, samples))
+
+
+async def _drain(jobs: List[Any], desc: str) -> None:
+    """그룹 작업을 모두 띄우고 끝나는 순서대로 결과를 넘긴다"""
+    tasks = [asyncio.create_task(j) for j in jobs]
+    try:
+        for fut in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc=desc):
+            engine, deliver = await fut
+            if engine.metrics is not None:
+                engine.metrics.maybe_flush()
+            deliver()
+    except BaseException:
+        # 실행 중단(BudgetExhausted / Ctrl+C): 남은 그룹은 기록하지 않고 취소한다
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+# ---------- 여러 엔진 ---------- #
+def interleave(streams: List[List[Any]]) -> List[Any]:
+    """여러 목록을 길이에 비례해 섞는다 (짧은 목록이 먼저 끝나지 않고 모두 비슷한 시점에 끝나도록)"""
+    ranked = [((i + 0.5) / len(items), n, i) for n, items in enumerate(streams) for i in range(len(items))]
+    return [streams[n][i] for _, n, i in sorted(ranked)]
+
+
+async def arun_interleaved(runs: List[Tuple[ExperimentEngine, List[Group], Callable[[Any, List[Any]], None]]],
+                           desc: str = "Running", max_concurrency: Optional[int] = None) -> None:
+    """여러 엔진(언어별 템플릿 / 파서)의 그룹을 하나의 동시성 한도 안에서 섞어 실행한다.
+    엔진들이 같은 limiter 를 가지면 RPM/TPM 한도도 함께 나눈다."""
+    sem = asyncio.Semaphore(max_concurrency or runs[0][0].max_concurrency)
+    for engine, _, _ in runs:
+        engine._sem = sem
+    jobs = interleave([[(engine, key, payloads, on_done) for key, payloads in groups]
+                       for engine, groups, on_done in runs])
+    await _drain([engine._job(key, payloads, on_done) for engine, key, payloads, on_done in jobs], desc)
+
+
+def run_interleaved(runs: List[Tuple[ExperimentEngine, List[Group], Callable[[Any, List[Any]], None]]],
+                    desc: str = "Running", max_concurrency: Optional[int] = None) -> None:
+    asyncio.run(arun_interleaved(runs, desc, max_concurrency))
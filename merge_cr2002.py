@@ -18,7 +18,7 @@ OUTPUT_FILE = Path(r"C:\Users\dsng3\Documents\GitHub\DIGB-Homosilicus\Data\Resul
 SCENARIO_KEYS = [f"scenario_{i}" for i in range(1, 7)]
 
 # 2) 시나리오별 누적 카운터
-scenario_totals: dict[str, dict[str, int]] = defaultdict(lambda: {"Left": 0, "Right": 0})
+scenario_totals: dict[str, dict[str, float]] = defaultdict(lambda: {"Left": 0, "Right": 0})
 
 # 3) 모든 JSON 순회
 def iter_scenarios(obj):
@@ -49,7 +49,11 @@ for file in INPUT_DIR.glob("*.json"):
         for skey in SCENARIO_KEYS:
             if skey in scenarios:
                 ans = scenarios[skey].get("answer")
-                if ans in ("Left", "Right"):
+                p_left = scenarios[skey].get("p_left")
+                if p_left is not None:  # logprob 모드 결과: 확률을 기대 빈도로 합산
+                    scenario_totals[skey]["Left"] += p_left
+                    scenario_totals[skey]["Right"] += 1 - p_left
+                elif ans in ("Left", "Right"):
                     scenario_totals[skey][ans] += 1
 
 print(f"✅ 읽은 파일 수: {num_files}")
@@ -59,8 +63,8 @@ lines: list[str] = ["[ALL PERSONAS]"]
 grand_left = grand_right = 0
 
 for skey in SCENARIO_KEYS:
-    left  = scenario_totals[skey]["Left"]
-    right = scenario_totals[skey]["Right"]
+    left  = round(scenario_totals[skey]["Left"], 2)
+    right = round(scenario_totals[skey]["Right"], 2)
     total = left + right
     grand_left  += left
     grand_right += right
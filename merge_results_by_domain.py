@@ -16,6 +16,8 @@ from pathlib import Path
 from collections import defaultdict
 from tqdm import tqdm
 
+from persona_store import PersonaStore
+
 # ---------------------------------------------------------------------
 # 0. CLI 파싱
 # ---------------------------------------------------------------------
@@ -106,22 +108,15 @@ def normalize_domain(s: str) -> str:
     return s.strip()
 
 # ---------------------------------------------------------------------
-# 4. JSONL 로부터 도메인 → 인덱스 리스트 구축
+# 4. 페르소나 색인(persona_store)으로 도메인 → 인덱스 리스트 구축
+#    (원본 JSONL 이 바뀌지 않았으면 줄을 파싱하지 않고 색인만 읽음)
 # ---------------------------------------------------------------------
 print("[1/4] 도메인별 idx 분류 중...")
 raw_domain_to_indices = defaultdict(list)
 
-with INPUT_JSONL.open("r", encoding="utf-8") as f:
-    for line in f:
-        try:
-            entry = json.loads(line)
-            domain_raw = entry.get("general domain (top 1 percent)", "")
-            idx = entry.get("idx")
-            if domain_raw and idx is not None:
-                domain_norm = normalize_domain(domain_raw)
-                raw_domain_to_indices[domain_norm].append(idx)
-        except json.JSONDecodeError as e:
-            print(f"[!] JSON 디코딩 오류: {e}")
+with PersonaStore(INPUT_JSONL) as store:
+    for domain_raw, indices in store.domains().items():
+        raw_domain_to_indices[normalize_domain(domain_raw)].extend(indices)
 
 # ---------------------------------------------------------------------
 # 5. 옵션: 도메인별 인원수만 출력
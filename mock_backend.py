@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+로컬 모의 Gemini 백엔드 (지연 / 429 / 깨진 JSON / 토큰 속도 재현)
+------------------------------------------------
+StubBackend 의 응답 내용(시나리오별 P(Left), 스키마 준수)에 실제 API 와 비슷한 서버 동작을 더한다.
+  - 첫 토큰까지의 지연: 로그정규 분포 (latency_median, latency_sigma)
+  - 출력 토큰 생성 속도: tokens_per_s (짧은 응답일수록 빨리 끝나고, 스트림은 조각마다 이만큼 걸린다)
+  - 429: 분당 요청 상한(rpm)을 넘거나 error_429_rate 확률로 RESOURCE_EXHAUSTED
+  - 깨진 JSON: 스키마 없이 호출하면 malformed_rate 확률로 잘리거나 JSON 이 아닌 응답
+모든 무작위 값은 seed 하나에서 나오고 시간은 이벤트 루프 시계(loop.time)로 재므로,
+benchmark.py 의 가상 시간 루프에서 실행하면 결과가 매번 같다.
+
+  python en_run.py --config pre --all --backend mock --mock-profile congested
+  python benchmark.py --personas 10000 --profile flash
+"""
+
+import asyncio
+import math
+import random
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+
+from llm_backend import CHOICES, Completion, LOGPROB_TOP_K, estimate_tokens
+from stub_backend import STREAM_CHUNK, StubBackend
+
+THROTTLE_LATENCY = 0.05  # 429 응답이 돌아오기까지의 시간 (초)
+
+
+class MockProfile(NamedTuple):
+    latency_median: float = 0.8   # 첫 토큰까지 지연 중앙값 (초)
+    latency_sigma: float = 0.5    # 로그정규 분포 폭
+    tokens_per_s: float = 150.0   # 출력 토큰 생성 속도
+    error_429_rate: float = 0.01  # 쿼터와 무관하게 429 를 돌려줄 확률
+    malformed_rate: float = 0.02  # 스키마 없는 호출이 깨진 JSON 을 돌려줄 확률
+    rpm: float = 2000.0           # 분당 요청 상한 (넘으면 429, 0 = 제한 없음)
+
+
+PROFILES: Dict[str, MockProfile] = {
+    "flash": MockProfile(),
+    "ideal": MockProfile(latency_median=0.3, latency_sigma=0.2, tokens_per_s=400.0,
+                         error_429_rate=0.0, malformed_rate=0.0, rpm=0.0),
+    "congested": MockProfile(latency_median=1.5, latency_sigma=0.8, tokens_per_s=80.0,
+                             error_429_rate=0.05, malformed_rate=0.05, rpm=1000.0),
+}
+
+
+class MockThrottle(Exception):
+    code = 429
+
+
+class MockBackend(StubBackend):
+    def __init__(self, profile: MockProfile = PROFILES["flash"], model: str = "mock",
+                 temperature: float = 1, seed: int = 0):
+        super().__init__(model=model, temperature=temperature, seed=seed)
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.stats: Counter = Counter()  # requests / throttled / malformed / input_tokens / output_tokens
+        self.latencies: List[float] = []  # 완료된 요청의 지연 (429 제외)
+        self._window: deque = deque()     # 최근 60 초 동안 받은 요청 시각
+
+    # ---------- 서버 동작 ---------- #
+    async def _admit(self) -> float:
+        """요청 하나를 받아 429 면 예외, 아니면 첫 토큰까지의 지연을 돌려준다."""
+        p = self.profile
+        now = asyncio.get_running_loop().time()
+        self.stats["requests"] += 1
+        while self._window and self._window[0] <= now - 60:
+            self._window.popleft()
+        if (p.rpm and len(self._window) >= p.rpm) or self.rng.random() < p.error_429_rate:
+            self.stats["throttled"] += 1
+            await asyncio.sleep(THROTTLE_LATENCY)
+            raise MockThrottle("429 RESOURCE_EXHAUSTED: mock quota exceeded")
+        self._window.append(now)
+        return self.rng.lognormvariate(math.log(p.latency_median), p.latency_sigma)
+
+    def _finish(self, text: str, max_output_tokens: Optional[int], schema: Optional[Dict[str, Any]]) -> str:
+        if schema is None and self.rng.random() < self.profile.malformed_rate:
+            self.stats["malformed"] += 1
+            if self.rng.random() < 0.5:  # 닫는 괄호가 빠지고 값의 따옴표가 없는 응답
+                text = text.rstrip("}").replace(f'"{CHOICES[0]}"', CHOICES[0]).replace(f'"{CHOICES[1]}"', CHOICES[1])
+            else:                        # JSON 이 아닌 설명문
+                text = "I think the better option here is the " + ("first." if CHOICES[0] in text else "second.")
+        if max_output_tokens and estimate_tokens(text) > max_output_tokens:
+            text = text[:max_output_tokens * 4]
+        return text
+
+    def _record(self, t0: float, prompt: str, output_tokens: int) -> None:
+        self.latencies.append(asyncio.get_running_loop().time() - t0)
+        self.stats["input_tokens"] += estimate_tokens(prompt)
+        self.stats["output_tokens"] += output_tokens
+
+    # ---------- 백엔드 인터페이스 ---------- #
+    async def agenerate(self, prompt: str, max_output_tokens: Optional[int] = None,
+                        schema: Optional[Dict[str, Any]] = None) -> Completion:
+        t0 = asyncio.get_running_loop().time()
+        ttft = await self._admit()
+        text = self._finish(self._text(prompt, schema), max_output_tokens, schema)
+        out = estimate_tokens(text)
+        await asyncio.sleep(ttft + out / self.profile.tokens_per_s)
+        self._record(t0, prompt, out)
+        return Completion(text, estimate_tokens(prompt), out)
+
+    async def astream(self, prompt: str, max_output_tokens: Optional[int] = None,
+                      schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[Completion]:
+        t0 = asyncio.get_running_loop().time()
+        ttft = await self._admit()
+        text = self._finish(self._text(prompt, schema), max_output_tokens, schema)
+        await asyncio.sleep(ttft)
+        sent = 0
+        try:
+            for i in range(0, len(text), STREAM_CHUNK):
+                piece = text[i:i + STREAM_CHUNK]
+                await asyncio.sleep(estimate_tokens(piece) / self.profile.tokens_per_s)
+                sent += estimate_tokens(piece)
+                yield Completion(piece, estimate_tokens(prompt) if i == 0 else 0, estimate_tokens(piece))
+        finally:
+            self._record(t0, prompt, sent)  # 소비자가 도중에 끊으면 그때까지 받은 토큰만
+
+    async def agenerate_n(self, prompt: str, n: int, schema: Optional[Dict[str, Any]] = None) -> List[Completion]:
+        t0 = asyncio.get_running_loop().time()
+        ttft = await self._admit()
+        texts = [self._finish(self._text(prompt, schema), None, schema) for _ in range(n)]
+        outs = [estimate_tokens(t) for t in texts]
+        await asyncio.sleep(ttft + max(outs) / self.profile.tokens_per_s)  # 후보는 병렬로 생성
+        self._record(t0, prompt, sum(outs))
+        return [Completion(t, estimate_tokens(prompt) if i == 0 else 0, o)
+                for i, (t, o) in enumerate(zip(texts, outs))]
+
+    async def agenerate_logprobs(self, prompt: str, top_k: int = LOGPROB_TOP_K,
+                                 schema: Optional[Dict[str, Any]] = None) -> Completion:
+        t0 = asyncio.get_running_loop().time()
+        ttft = await self._admit()
+        comp = await super().agenerate_logprobs(prompt, top_k, schema)
+        await asyncio.sleep(ttft + comp.output_tokens / self.profile.tokens_per_s)
+        self._record(t0, prompt, comp.output_tokens)
+        return comp
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+다언어 러너 (EN / KR / AR, 모델 / temperature 스윕을 하나의 동시성 한도로)
+------------------------------------------------
+실험 계획(experiment_plan)의 모든 (언어, 설정, arm) 조각을 한 프로세스, 한 이벤트 루프에서 실행한다.
+arm 은 명세의 models × temperatures 조합 (모델@temperature) 이다.
+  - 언어는 플랜의 차원일 뿐이다. 템플릿은 prompt_templates.TEMPLATES 의 데이터이고,
+    언어별 엔진은 템플릿 / 구조화 출력 스키마 / 계측 / 예산만 다르다.
+  - 프롬프트는 컴파일할 때 페르소나마다 한 번 렌더링되어 모든 arm 이 같은 텍스트를 쓰고, 페르소나도 색인으로 한 번씩만 읽는다.
+  - 모든 엔진이 전역 세마포어 하나(--max-concurrency)와 캐시 하나를 나눠 쓰고,
+    속도 한도는 arm 마다 따로다 (--rpm / --tpm 기본값, --arm-limit 로 arm / 모델별 쿼터).
+  - 그룹은 조각별 남은 양에 비례해 섞어서 보내므로(llm_engine.interleave) 모든 조각이 같은 벽시계 구간에 함께 끝난다.
+결과 / 매니페스트 / metrics.json 은 언어별 러너와 같은 자리(각 러너 CONFIGS[설정]["results_log"])에 쓰고,
+--log-root 를 주면 <log-root>/(언어)설정 에 쓴다. 기본 arm 이 아닌 arm 은 그 옆의 <폴더>_<모델>_Temp<t> 에 쓰며
+(experiment_plan.arm_dir), 모든 row 에 arm 이 남는다. 예산(--budget-*)은 (언어, arm) 마다 따로 센다.
+
+  python multi_run.py --plan campaign.json
+  python multi_run.py --plan campaign.json --langs EN KR --rpm 1500 --max-concurrency 100
+  python multi_run.py --plan sweep.json --arm-limit gemini-2.5-pro=150 --arms gemini-2.0-flash@0.7 gemini-2.5-pro@1
+  python multi_run.py --plan campaign.json --dry-run
+  python multi_run.py --plan campaign.json --batch-export batch/      # 배치 채널용 요청 파일 (batch_mode.py)
+"""
+
+import argparse
+from contextlib import ExitStack, closing
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from batch_mode import add_batch_args, export_batches, ingest_batches
+from choice_mode import CHOICE_MAX_TOKENS, add_choice_args, mark_choice_only
+from experiment_plan import Arm, ExperimentPlan, arm_dir, arm_id, open_plan, plan_jobs, runner
+from hedging import add_hedge_args, hedger_from_args
+from key_pool import print_key_usage
+from llm_backend import LOGPROB_TOP_K, MODEL_NAME, add_backend_args, backend_from_args
+from llm_cache import add_cache_args, cache_from_args
+from llm_engine import ExperimentEngine, run_interleaved
+from packed_mode import add_packed_args, packer_from_args
+from prompt_templates import TEMPLATES, choice_prompt
+from rate_limiter import add_arm_limit_args, add_limiter_args, arm_limiters_from_args
+from results_log import ResultsLog
+from run_budget import (BudgetExhausted, RunBudget, add_budget_args, budget_from_args, estimate_plan,
+                        format_plan, observed, price_from_args)
+from run_manifest import MANIFEST_FILE, RunManifest
+from run_metrics import RunMetrics, add_metrics_args
+from structured_output import SchemaParser, add_structured_args, schemas_for
+
+load_dotenv()
+
+VARIABLES = ["persona_desc", "difficulty", "A_left", "B_left", "A_right", "B_right", "metric"]
+
+
+def is_complete(r: Any) -> bool:
+    # 러너와 같은 기준: reasoning/choice 가 모두 있어야 정상 응답 (선택 전용 셀은 choice 만)
+    return isinstance(r, dict) and bool(r.get("choice")) and (bool(r.get("reasoning")) or bool(r.get("choice_only")))
+
+
+def has_choice(r: Any) -> bool:
+    # logprob 모드: reasoning 없이 Left/Right 선택만 있으면 정상 응답
+    return isinstance(r, dict) and r.get("choice") in ("Left", "Right")
+
+
+def log_dir(args: argparse.Namespace, lang: str, config: str, arm: Optional[Arm] = None) -> Path:
+    """(lang, config) 의 결과 로그 폴더, arm 을 주면 그 arm 의 폴더"""
+    if args.log_root:
+        root = args.log_root / f"({lang}){config}"
+    else:
+        configs = runner(lang).CONFIGS
+        if config not in configs:
+            raise ValueError(f"{lang} 러너 CONFIGS 에 {config} 가 없습니다 — --log-root 를 지정하세요.")
+        root = Path(configs[config]["results_log"])
+    return arm_dir(root, arm) if arm is not None else root
+
+
+def plan_slices(plan: ExperimentPlan, args: argparse.Namespace) -> List[Tuple[str, str, Arm]]:
+    """실행할 (언어, 설정, arm) — --langs / --arms 로 거른다"""
+    out = []
+    for lang, config in plan.slices():
+        if args.langs and lang not in args.langs:
+            continue
+        out += [(lang, config, arm) for arm in plan.arms(lang, config)
+                if not args.arms or arm_id(arm) in args.arms]
+    if not out:
+        raise ValueError(f"실행할 조각이 없습니다 (플랜의 조각: {list(plan.counts())})")
+    return out
+
+
+def build_engine(args: argparse.Namespace, lang: str, limiter: Any, cache: Any,
+                 metrics: Optional[RunMetrics] = None, budget: Optional[RunBudget] = None,
+                 model: str = MODEL_NAME, temperature: float = 1) -> ExperimentEngine:
+    """언어 하나의 엔진. 리미터 / 캐시는 모든 언어가 같은 객체를 쓴다."""
+    from langchain_core.prompts import PromptTemplate
+
+    t = TEMPLATES[lang]
+    choice_template = PromptTemplate(input_variables=VARIABLES, template=choice_prompt(lang))
+    return ExperimentEngine(backend_from_args(args, model, temperature=temperature),
+                            choice_template if args.logprobs
+                            else PromptTemplate(input_variables=VARIABLES, template=t["prompt"]),
+                            max_concurrency=args.max_concurrency, limiter=limiter,
+                            parser=SchemaParser() if args.structured else None, cache=cache,
+                            is_valid=has_choice if args.logprobs else is_complete,
+                            packer=packer_from_args(args, t["packed_header"], t["packed_item"]),
+                            logprobs=LOGPROB_TOP_K if args.logprobs else 0,
+                            choice_prompt=choice_template if args.choice_only else None,
+                            choice_max_tokens=CHOICE_MAX_TOKENS, stream=args.stream,
+                            schemas=schemas_for(t["reasoning_desc"], t["choice_desc"], args.logprobs)
+                            if args.structured else None,
+                            metrics=metrics, hedger=hedger_from_args(args),
+                            hard_timeout=args.hard_timeout, budget=budget)
+
+
+def reasoning_for(plan: ExperimentPlan, args: argparse.Namespace, lang: str, config: str
+                  ) -> Optional[Set[Tuple[int, int, str, int]]]:
+    """--choice-only: 플랜의 (lang, config) 모집단에서 도메인별 층화로 reasoning 을 물을 표본"""
+    if not args.choice_only:
+        return None
+    return plan.reasoning(lang, config, args.reasoning_per_stratum, args.reasoning_seed)
+
+
+def dry_run(plan: ExperimentPlan, args: argparse.Namespace, slices: List[Tuple[str, str, Arm]]) -> None:
+    """조각별 호출 수 / 토큰 / 비용 / 예상 시간과 합계 (API 호출 없음).
+    같은 리미터를 쓰는 조각의 시간은 더하고, 리미터끼리는 병렬이므로 가장 긴 쪽이 전체 시간이다."""
+    args.backend = "stub"
+    limiters = arm_limiters_from_args(args)
+    total: Dict[str, Any] = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                             "eta_s": 0.0, "observed": True}
+    eta: Dict[str, float] = {}
+    for lang, config, arm in slices:
+        engine = build_engine(args, lang, None, None, model=arm[0], temperature=arm[1])
+        root = log_dir(args, lang, config, arm)
+        manifest = RunManifest(root / MANIFEST_FILE)
+        reasoning = reasoning_for(plan, args, lang, config)
+        calls = []
+        for (repeat, idx, _), payloads, meta in plan.groups(lang, config, arm, skip=manifest.ok_cells(lang, config)):
+            mark_choice_only(payloads, meta, repeat, idx, reasoning)
+            calls += engine.render_calls(payloads)
+        rpm, tpm = limiters.quota(arm_id(arm), arm[0])
+        est = estimate_plan(calls, price_from_args(args, arm[0]), observed(root), rpm, tpm, args.max_concurrency)
+        print(f"{lang}/{config}/{arm_id(arm)} {format_plan(est)}")
+        for k in ("calls", "input_tokens", "output_tokens", "cost_usd"):
+            total[k] += est[k]
+        total["observed"] &= est["observed"]
+        key = limiters.key(arm_id(arm), arm[0])
+        eta[key] = eta.get(key, 0.0) + est["eta_s"]
+    total["cost_usd"] = round(total["cost_usd"], 4)
+    total["eta_s"] = round(max(eta.values(), default=0.0), 1)
+    print(f"all {format_plan(total)}")
+
+
+# ---------- CLI ---------- #
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser("Gemini Social-Preference Experiments (all languages)")
+    ap.add_argument("--plan", type=Path, required=True,
+                    help="실험 명세(.json, 필요하면 컴파일) 또는 컴파일된 플랜(.plan.db)")
+    ap.add_argument("--langs", nargs="+", choices=sorted(TEMPLATES), help="실행할 언어 (기본: 플랜의 모든 언어)")
+    ap.add_argument("--arms", nargs="+", metavar="MODEL@TEMP",
+                    help="실행할 arm (기본: 플랜의 모든 모델 / temperature 조합)")
+    ap.add_argument("--log-root", type=Path, help="결과 로그 루트 (기본: 언어별 러너 CONFIGS 의 results_log)")
+    ap.add_argument("--log-format", choices=["jsonl", "parquet"], default="jsonl", help="결과 로그 샤드 형식")
+    ap.add_argument("--max-concurrency", type=int, default=50,
+                    help="모든 언어·페르소나·시나리오·반복에 걸친 전역 동시 요청 수")
+    add_limiter_args(ap)
+    add_arm_limit_args(ap)
+    add_cache_args(ap)
+    add_packed_args(ap)
+    add_backend_args(ap)
+    add_choice_args(ap)
+    add_structured_args(ap)
+    add_metrics_args(ap)
+    add_hedge_args(ap)
+    add_budget_args(ap)
+    add_batch_args(ap)
+    ap.add_argument("--stream", action="store_true",
+                    help="응답을 스트림으로 받아 choice 확정 즉시 처리 (--choice-only 셀은 그 시점에 스트림을 끊음)")
+    ap.add_argument("--logprobs", action="store_true",
+                    help="선택만 묻고 토큰 logprob 으로 P(Left)/P(Right) 를 저장")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if (args.logprobs or args.choice_only) and (args.packed or args.pack_shuffle):
+        raise ValueError("--logprobs / --choice-only 는 --packed 와 함께 쓸 수 없습니다.")
+    if args.logprobs and args.choice_only:
+        raise ValueError("--logprobs 와 --choice-only 는 함께 쓸 수 없습니다.")
+    if args.batch_export and (args.logprobs or args.packed or args.pack_shuffle):
+        raise ValueError("--batch-export 는 --logprobs / --packed 와 함께 쓸 수 없습니다.")
+    plan = open_plan(args.plan)
+    if args.batch_ingest:  # 출력 파일에 든 셀을 모두 들여온다 (--langs / --arms 무시)
+        stats = ingest_batches(plan, args.batch_ingest, args.batch_dir or args.batch_ingest[0].parent,
+                               partial(log_dir, args), args.log_format)
+        print("Batch →", dict(stats))
+        return
+    slices = plan_slices(plan, args)
+    if args.batch_export:
+        choice = ({"per_stratum": args.reasoning_per_stratum, "seed": args.reasoning_seed}
+                  if args.choice_only else None)
+        export_batches(plan, slices, args.batch_export, partial(log_dir, args), args.structured, choice)
+        return
+    if args.dry_run:
+        dry_run(plan, args, slices)
+        return
+
+    # 캐시는 모두가, 리미터는 arm (또는 --arm-limit 의 모델) 마다 하나를 나눠 쓴다
+    limiters, cache = arm_limiters_from_args(args), cache_from_args(args)
+    runs, budgets = [], []
+    logs: Dict[Path, ResultsLog] = {}
+    manifests: Dict[Path, RunManifest] = {}
+    with ExitStack() as stack:
+        for lang, config, arm in slices:
+            root = log_dir(args, lang, config, arm)
+            if root not in logs:  # 같은 폴더를 쓰는 조각은 로그 / 매니페스트를 하나로 (샤드 이름 충돌 방지)
+                logs[root] = stack.enter_context(ResultsLog(root, fmt=args.log_format))
+                manifests[root] = RunManifest(root / MANIFEST_FILE)
+            metrics = stack.enter_context(closing(RunMetrics(lang, config, root, args.metrics_interval, arm_id(arm))))
+            # 장부는 (언어, 설정) 폴더에 두어 --lang-budget-usd 가 모든 arm 의 지출을 함께 센다
+            budget = budget_from_args(args, lang, arm[0], log_dir(args, lang, config))
+            if budget is not None:
+                budgets.append(budget)
+            engine = build_engine(args, lang, limiters.get(arm_id(arm), arm[0]), cache, metrics, budget, *arm)
+            groups, on_done = plan_jobs(plan, logs[root], manifests[root], lang, config, arm,
+                                        reasoning_for(plan, args, lang, config))
+            runs.append((engine, groups, on_done))
+        try:
+            run_interleaved(runs, desc="Campaign", max_concurrency=args.max_concurrency)
+        except BudgetExhausted as e:
+            # 끝난 페르소나는 기록됐고 나머지 셀은 pending 으로 남으므로 같은 명령으로 이어서 실행한다
+            print(f"[Budget] {e} → 멈춤. 같은 --plan 으로 다시 실행하면 이어집니다.")
+        finally:
+            for budget in budgets:
+                budget.close()
+            print_key_usage()
+    for (lang, config, arm), (engine, _, _) in zip(slices, runs):
+        stats = {k: dict(v) for k, v in (("retries", engine.retries), ("hedge", engine.hedge_stats),
+                                         ("packed", engine.pack_stats), ("stream", engine.stream_stats)) if v}
+        if stats:
+            print(f"{lang}/{config}/{arm_id(arm)} →", stats)
+
+
+if __name__ == "__main__":
+    main()
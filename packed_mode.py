@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+다중 시나리오 묶음(packed) 요청
+------------------------------------------------
+페르소나 하나의 시나리오 셀(CR2002 6개, DIGB_Custom 난이도 × 시나리오)을
+프롬프트 하나에 나열하고 JSON 배열 [{scenario, reasoning, choice}, ...] 로 받는다.
+페르소나 설명과 지시문을 한 번만 보내므로 요청 수와 입력 토큰이 셀 수만큼 줄어든다.
+
+- 배열의 원소마다 따로 검증하고, 빠지거나 잘못된 셀만 단일 시나리오 호출로 다시 묻는다.
+- shuffle=True 이면 시나리오 나열 순서를 페르소나마다 (재현 가능하게) 섞는다.
+  각 셀이 몇 번째로 제시됐는지는 결과 row 의 pack_pos 에 남으므로 순서 효과를 측정할 수 있다.
+"""
+
+import argparse
+import json
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 원소가 어느 시나리오의 응답인지 가리키는 키 (프롬프트에 나열된 1부터의 번호)
+SCENARIO_KEY = "scenario"
+
+
+class ScenarioPacker:
+    """header 는 {persona_desc}, {scenarios} 를, item 은 {n} 과 단일 프롬프트 변수를 받는다."""
+
+    def __init__(self, header: str, item: str, shuffle: bool = False, seed: int = 0):
+        self.header = header
+        self.item = item
+        self.shuffle = shuffle
+        self.seed = seed
+
+    def order(self, payloads: Sequence[Dict[str, Any]]) -> List[int]:
+        """프롬프트에 나열할 payload 인덱스 순서"""
+        order = list(range(len(payloads)))
+        if self.shuffle:
+            # 같은 페르소나·셀 구성이면 재실행해도 같은 순서 (캐시 키도 유지된다)
+            fields = [{k: v for k, v in p.items() if not k.startswith("_")} for p in payloads]
+            random.Random(json.dumps([self.seed, fields], ensure_ascii=False, sort_keys=True)).shuffle(order)
+        return order
+
+    def render(self, payloads: Sequence[Dict[str, Any]]) -> Tuple[str, List[int]]:
+        order = self.order(payloads)
+        items = []
+        for n, i in enumerate(order, start=1):
+            fields = {k: v for k, v in payloads[i].items() if not k.startswith("_")}
+            items.append(self.item.format(n=n, **fields).strip("\n"))
+        return self.header.format(persona_desc=payloads[0]["persona_desc"],
+                                  scenarios="\n\n".join(items)), order
+
+    def unpack(self, parsed: Any, order: List[int]) -> List[Optional[Dict[str, Any]]]:
+        """배열 원소를 원래 payload 순서로 되돌린다. 없거나 형식이 틀린 셀은 None."""
+        out: List[Optional[Dict[str, Any]]] = [None] * len(order)
+        if isinstance(parsed, dict):
+            # {"answers": [...]} 처럼 한 겹 감싸서 돌려주는 경우
+            parsed = next((v for v in parsed.values() if isinstance(v, list)), None)
+        if not isinstance(parsed, list):
+            return out
+        for el in parsed:
+            if not isinstance(el, dict):
+                continue
+            try:
+                pos = int(str(el.get(SCENARIO_KEY)).strip().split()[-1])
+            except (TypeError, ValueError, IndexError):
+                continue
+            if not 1 <= pos <= len(order) or out[order[pos - 1]] is not None:
+                continue  # 범위 밖 번호 / 같은 번호 중복은 버리고 단일 호출로 다시 묻는다
+            out[order[pos - 1]] = {"reasoning": el.get("reasoning", ""), "choice": el.get("choice", ""),
+                                   "pack_pos": pos}
+        return out
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_packed_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--packed", action="store_true",
+                    help="페르소나당 한 번의 요청으로 모든 시나리오를 묻는 묶음 모드")
+    ap.add_argument("--pack-shuffle", action="store_true",
+                    help="묶음 모드에서 시나리오 나열 순서를 페르소나마다 섞음 (--packed 포함)")
+    ap.add_argument("--pack-seed", type=int, default=0, help="--pack-shuffle 순서 시드")
+
+
+def packer_from_args(args: argparse.Namespace, header: str, item: str) -> Optional[ScenarioPacker]:
+    if not (args.packed or args.pack_shuffle):
+        return None
+    return ScenarioPacker(header, item, shuffle=args.pack_shuffle, seed=args.pack_seed)
@@ -1,15 +1,18 @@
 import argparse
+import asyncio
 import json
 import os
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 
 from tqdm import tqdm
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from dotenv import load_dotenv
 
+from llm_backend import GeminiBackend
+from llm_cache import ResponseCache, add_cache_args, cache_from_args
+from llm_engine import ExperimentEngine
+
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  # NOTE: .env 파일 필요
 MODEL_NAME = "gemini-2.0-flash"
@@ -17,11 +20,6 @@ MODEL_NAME = "gemini-2.0-flash"
 INPUT_PATH = Path(r"C:\Users\dsng3\Documents\GitHub\DIGB-Homosilicus\Data\Common\(EN)PERSONA_DATA_10000.jsonl")
 OUTPUT_PATH = Path(r"C:\Users\dsng3\Documents\GitHub\DIGB-Homosilicus\Data\Common\(AR)PERSONA_DATA_10000.jsonl")
 
-llm = ChatGoogleGenerativeAI(
-    model=MODEL_NAME,
-    temperature=1,
-)
-
 prompt_template = PromptTemplate(
     input_variables=["persona", "domain"],
     template="""هنا شخصيات مكتوبة باللغة الإنجليزية وأوصاف مجال البحث.
@@ -55,8 +53,15 @@ Mathematics → الرياضيات
 """
 
 )
-parser = JsonOutputParser()
-chain = prompt_template | llm | parser
+
+def is_translated(r: Any) -> bool:
+    return isinstance(r, dict) and bool(r.get("persona")) and bool(r.get("general domain (top 1 percent)"))
+
+def build_engine(cache: Optional[ResponseCache]) -> ExperimentEngine:
+    # 리미터가 없으므로 SDK 기본 재시도(6회)를 유지
+    backend = GeminiBackend(MODEL_NAME, temperature=1, max_retries=6)
+    return ExperimentEngine(backend, prompt_template, max_concurrency=20,
+                            cache=cache, is_valid=is_translated)
 
 def load_jsonl(path: Path) -> List[Dict]:
     records = []
@@ -73,7 +78,8 @@ def save_jsonl(path: Path, data: List[Dict]) -> None:
         for item in data:
             f.write(json.dumps(item, ensure_ascii=False) + "\n")
 
-def translate_personas_batch(records: List[Dict], batch_size: int = 20, max_retry: int = 3) -> List[Dict]:
+async def translate_personas_batch(engine: ExperimentEngine, records: List[Dict],
+                                   batch_size: int = 20, max_retry: int = 3) -> List[Dict]:
     translated = []
     for i in tqdm(range(0, len(records), batch_size), desc="Translating Personas (Batch)"):
         batch_records = records[i:i + batch_size]
@@ -90,10 +96,11 @@ def translate_personas_batch(records: List[Dict], batch_size: int = 20, max_retr
 
         for attempt in range(1, max_retry + 1):
             try:
-                batch_outputs = chain.batch(
-                    batch_inputs,
-                    config={"max_concurrency": 20}
-                )
+                # 재시도 시 이미 성공한 항목은 캐시에서 바로 돌려받는다
+                batch_outputs = await engine.abatch(batch_inputs)
+                for output in batch_outputs:
+                    if isinstance(output, Exception):
+                        raise output
                 for output, idx in zip(batch_outputs, idx_list):
                     translated.append({
                         "persona": output["persona"],
@@ -110,7 +117,8 @@ def translate_personas_batch(records: List[Dict], batch_size: int = 20, max_retr
     return translated
 
 
-def translate_personas_invoke(records: List[Dict], max_retry: int = 3) -> List[Dict]:
+async def translate_personas_invoke(engine: ExperimentEngine, records: List[Dict],
+                                    max_retry: int = 3) -> List[Dict]:
     translated = []
     for record in tqdm(records, desc="Translating Personas (Single Invoke)"):
         input_data = {
@@ -121,7 +129,7 @@ def translate_personas_invoke(records: List[Dict], max_retry: int = 3) -> List[D
 
         for attempt in range(1, max_retry + 1):
             try:
-                output = chain.invoke(input_data)
+                output = await engine.ainvoke(input_data)
                 translated.append({
                     "persona": output["persona"],
                     "general domain (top 1 percent)": output["general domain (top 1 percent)"],
@@ -142,14 +150,15 @@ def find_missing_idx(all_records: List[Dict], translated_records: List[Dict]) ->
     missing_idx = sorted(list(original_idx_set - translated_idx_set))
     return missing_idx
 
-def main(mode: str):
+def main(mode: str, cache: Optional[ResponseCache] = None):
+    engine = build_engine(cache)
     print("데이터 로딩 중...")
     all_records = load_jsonl(INPUT_PATH)
     print(f"총 {len(all_records)}개 페르소나 로드 완료.")
 
     if mode == "full":
         print("전체 번역 모드 실행 중...")
-        translated_records = translate_personas_batch(all_records)
+        translated_records = asyncio.run(translate_personas_batch(engine, all_records))
 
     elif mode == "retry_missing":
         print("누락된 idx만 재번역 모드 실행 중...")
@@ -164,7 +173,7 @@ def main(mode: str):
         print(missing_idx)
 
         missing_records = [record for record in all_records if record.get("idx") in missing_idx]
-        new_translated = translate_personas_invoke(missing_records)
+        new_translated = asyncio.run(translate_personas_invoke(engine, missing_records))
 
         merged_records = existing_translated + new_translated
         merged_records.sort(key=lambda x: x.get("idx"))  
@@ -186,5 +195,6 @@ if __name__ == "__main__":
         default="full",
         help="full: 전체 번역 / retry_missing: 누락된 idx만 재번역"
     )
+    add_cache_args(parser)
     args = parser.parse_args()
-    main(args.mode)
+    main(args.mode, cache_from_args(args))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+페르소나 저장소 (JSONL + idx 바이트 오프셋 색인)
+------------------------------------------------
+(EN|KR|AR)PERSONA_DATA_*.jsonl 을 매번 전부 파싱하지 않고, 원본 옆의 <원본>.idx.json 색인
+(idx → 바이트 오프셋 / 길이, 도메인)으로 필요한 줄만 읽는다.
+  - get(idx) / idx in store : O(1)
+  - range(lo, hi)           : idx 구간 (정렬된 idx 에서 이분 탐색)
+  - by_domain(name)         : 도메인별 페르소나 (색인에 도메인이 있으므로 다른 줄은 읽지 않음)
+  - iter(store)             : 파일 순서대로 한 줄씩 (지연 파싱)
+  - domain_of / domains     : 줄을 읽지 않고 색인만으로 idx → 도메인 / 도메인 → idx 목록
+색인에는 원본의 크기 / 수정 시각 / sha256 이 들어 있다. 크기나 시각이 바뀌면 해시를 다시 계산하고,
+해시가 다르면 색인을 다시 만든다. mmap=True 면 원본을 메모리 매핑해서 읽는다.
+
+  python persona_store.py info  --data "Data/Common/(AR)PERSONA_DATA_10000.jsonl"
+  python persona_store.py show  --data "Data/Common/(AR)PERSONA_DATA_10000.jsonl" --idx 42
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import mmap as mmap_
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+DOMAIN_FIELD = "general domain (top 1 percent)"
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def to_record(j: Dict[str, Any]) -> Dict[str, Any]:
+    """원본 줄 → 러너가 쓰는 페르소나 레코드"""
+    return {"persona": j["persona"], "idx": int(j["idx"]), "domain": (j.get(DOMAIN_FIELD) or "").strip()}
+
+
+class PersonaStore:
+    def __init__(self, path: Path, mmap: bool = False):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        self.rebuilt = False
+        index = self._load_index()
+        self.sha256: str = index["sha256"]
+        self._order: List[int] = index["idx"]                     # 파일 순서
+        self._offset = dict(zip(index["idx"], index["offset"]))
+        self._length = dict(zip(index["idx"], index["length"]))
+        self._domain = dict(zip(index["idx"], index["domain"]))
+        self._sorted = sorted(self._order)
+        self._fh = self.path.open("rb")
+        self._mm = mmap_.mmap(self._fh.fileno(), 0, access=mmap_.ACCESS_READ) if mmap and self._order else None
+
+    # ---------- 색인 ---------- #
+    def _load_index(self) -> Dict[str, Any]:
+        st = os.stat(self.path)
+        if self.index_path.exists():
+            try:
+                index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                index = None
+            if index and index.get("version") == INDEX_VERSION:
+                if index["size"] == st.st_size and index["mtime_ns"] == st.st_mtime_ns:
+                    return index
+                if index["sha256"] == file_sha256(self.path):  # 시각만 바뀜 (복사 등)
+                    index.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                    self._save_index(index)
+                    return index
+        index = self._build_index(st)
+        self._save_index(index)
+        self.rebuilt = True
+        return index
+
+    def _build_index(self, st: os.stat_result) -> Dict[str, Any]:
+        cols: Dict[str, List[Any]] = {"idx": [], "offset": [], "length": [], "domain": []}
+        h = hashlib.sha256()
+        seen = set()
+        pos = 0
+        with self.path.open("rb") as f:
+            for line in f:
+                h.update(line)
+                start, pos = pos, pos + len(line)
+                if not line.strip():
+                    continue
+                try:
+                    rec = to_record(json.loads(line))
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    continue  # 깨진 줄은 load_personas 처럼 건너뛴다
+                if rec["idx"] in seen:
+                    continue  # 같은 idx 가 다시 나오면 첫 줄을 쓴다
+                seen.add(rec["idx"])
+                cols["idx"].append(rec["idx"])
+                cols["offset"].append(start)
+                cols["length"].append(len(line))
+                cols["domain"].append(rec["domain"])
+        return {"version": INDEX_VERSION, "source": self.path.name, "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest(), **cols}
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        tmp = self.index_path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass  # 원본 폴더에 쓸 수 없으면 메모리 색인만 쓴다
+
+    # ---------- 조회 ---------- #
+    def _read(self, idx: int) -> Dict[str, Any]:
+        off, n = self._offset[idx], self._length[idx]
+        if self._mm is not None:
+            raw = self._mm[off:off + n]
+        else:
+            self._fh.seek(off)
+            raw = self._fh.read(n)
+        return to_record(json.loads(raw))
+
+    def get(self, idx: int) -> Optional[Dict[str, Any]]:
+        return self._read(idx) if idx in self._offset else None
+
+    def __contains__(self, idx: object) -> bool:
+        return idx in self._offset
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._read(i) for i in self._order)
+
+    def idxs(self) -> List[int]:
+        """idx 목록 (파일 순서)"""
+        return list(self._order)
+
+    def select(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """ids 중 저장소에 있는 페르소나 (파일 순서, 중복 제거)"""
+        wanted = set(ids)
+        return [self._read(i) for i in self._order if i in wanted]
+
+    def range(self, lo: int, hi: int) -> Iterator[Dict[str, Any]]:
+        """lo <= idx <= hi 인 페르소나 (idx 순)"""
+        a, b = bisect.bisect_left(self._sorted, lo), bisect.bisect_right(self._sorted, hi)
+        return (self._read(i) for i in self._sorted[a:b])
+
+    def domain_of(self, idx: int) -> Optional[str]:
+        return self._domain.get(idx)
+
+    def domains(self) -> Dict[str, List[int]]:
+        """도메인 → idx 목록 (파일 순서, 빈 도메인 제외)"""
+        out: Dict[str, List[int]] = defaultdict(list)
+        for i in self._order:
+            if self._domain[i]:
+                out[self._domain[i]].append(i)
+        return dict(out)
+
+    def by_domain(self, domain: str) -> Iterator[Dict[str, Any]]:
+        return (self._read(i) for i in self._order if self._domain[i] == domain)
+
+    def stubs(self) -> List[Dict[str, Any]]:
+        """줄을 읽지 않은 {"idx", "domain"} 레코드 (층화 표본 등 설명이 필요 없는 곳용)"""
+        return [{"idx": i, "domain": self._domain[i]} for i in self._order]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._fh.close()
+
+    def __enter__(self) -> "PersonaStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_OPEN: Dict[Path, PersonaStore] = {}
+
+
+def open_store(path: Path, mmap: bool = False) -> PersonaStore:
+    """같은 실행 안에서는 원본 하나당 저장소 하나를 재사용한다"""
+    key = Path(path).resolve()
+    if key not in _OPEN:
+        _OPEN[key] = PersonaStore(key, mmap=mmap)
+    return _OPEN[key]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Persona store utilities")
+    ap.add_argument("command", choices=["info", "show"])
+    ap.add_argument("--data", type=Path, required=True, help="페르소나 JSONL")
+    ap.add_argument("--idx", type=int, nargs="+", help="show: 출력할 idx")
+    args = ap.parse_args()
+
+    with PersonaStore(args.data) as store:
+        if args.command == "info":
+            doms = store.domains()
+            print(f"{store.path.name}: {len(store)} personas, {len(doms)} domains"
+                  f"{' (index rebuilt)' if store.rebuilt else ''}")
+            for d, ids in sorted(doms.items(), key=lambda kv: -len(kv[1])):
+                print(f"- {d:30}: {len(ids)}")
+        else:
+            for r in store.select(args.idx or []):
+                print(json.dumps(r, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+언어별 프롬프트 템플릿 (데이터)
+------------------------------------------------
+EN / KR / AR 러너와 다언어 러너(multi_run.py), 실험 계획 컴파일(experiment_plan.py)이 모두 이 표를 쓴다.
+  prompt         : 셀 하나 (reasoning + choice)
+  packed_header  : 묶음 모드(--packed) 요청 머리말, {scenarios} 자리에 packed_item 들이 들어간다
+  packed_item    : 묶음 모드의 시나리오 하나
+  reasoning_desc : 구조화 출력(--structured) 스키마의 reasoning 설명 (prompt 의 reasoning 줄과 같은 문구)
+  choice_desc    : 구조화 출력 스키마의 선택지 설명 (None 이면 Left | Right 그대로)
+선택만 묻는 프롬프트(--logprobs / --choice-only)는 prompt 에서 reasoning 줄을 뺀 것이다 (choice_prompt).
+새 언어는 같은 키로 항목을 하나 더하면 된다.
+"""
+
+from typing import Dict, Optional
+
+TEMPLATES: Dict[str, Dict[str, Optional[str]]] = {
+    "EN": {
+        "prompt": """You are **Person B** in a **{difficulty}-level** Social Preferences Experiment.
+
+**Persona**
+{persona_desc}
+
+**Choices**
+- **Left** : Person B {B_left}, Person A {A_left}
+- **Right**: Person B {B_right}, Person A {A_right}
+
+Focus on **{metric}**.
+
+Return **JSON only**:
+{{
+  "reasoning": "<concise reason>",
+  "choice": "Left" | "Right"
+}}""",
+        "packed_header": """You are **Person B** in a Social Preferences Experiment.
+
+**Persona**
+{persona_desc}
+
+Answer each scenario below independently.
+
+{scenarios}
+
+Return **JSON only**: an array with one object per scenario:
+[
+  {{"scenario": <scenario number>, "reasoning": "<concise reason>", "choice": "Left" | "Right"}},
+  ...
+]""",
+        "packed_item": """### Scenario {n} ({difficulty}-level, focus on **{metric}**)
+- **Left** : Person B {B_left}, Person A {A_left}
+- **Right**: Person B {B_right}, Person A {A_right}
+""",
+        "reasoning_desc": 'concise reason',
+        "choice_desc": None,
+    },
+    "KR": {
+        "prompt": """
+당신은 **{difficulty} 난이도** 사회적 선호 실험에서 **B 참가자**입니다.
+
+**페르소나**
+{persona_desc}
+
+**선택지**
+- **왼쪽** : B 참가자 {B_left}, A 참가자 {A_left}
+- **오른쪽**: B 참가자 {B_right}, A 참가자 {A_right}
+
+이 질문은 **{metric}**에 관한 것입니다.
+
+아래 JSON 형식만 반환하세요:
+{{
+  "reasoning": "<한두 문장으로 선택 이유>",
+  "choice": "Left" | "Right"
+}}
+""",
+        "packed_header": """
+당신은 사회적 선호 실험에서 **B 참가자**입니다.
+
+**페르소나**
+{persona_desc}
+
+아래 각 시나리오에 대해 서로 독립적으로 답하세요.
+
+{scenarios}
+
+아래 JSON 배열 형식만 반환하세요 (시나리오마다 객체 하나):
+[
+  {{"scenario": <시나리오 번호>, "reasoning": "<한두 문장으로 선택 이유>", "choice": "Left" | "Right"}},
+  ...
+]
+""",
+        "packed_item": """### 시나리오 {n} ({difficulty} 난이도, **{metric}**에 관한 질문)
+- **왼쪽** : B 참가자 {B_left}, A 참가자 {A_left}
+- **오른쪽**: B 참가자 {B_right}, A 참가자 {A_right}
+""",
+        "reasoning_desc": '한두 문장으로 선택 이유',
+        "choice_desc": '왼쪽 = Left, 오른쪽 = Right',
+    },
+    "AR": {
+        "prompt": """
+أنت **المشارك B** في تجربة تفضيلات اجتماعية بمستوى صعوبة **{difficulty}**.
+
+**الوصف الشخصي (بيرسونا)**
+{persona_desc}
+
+**الخيارات**
+- **اليسار**: B {B_left}, A {A_left}
+- **اليمين**: B {B_right}, A {A_right}
+
+هذا السؤال يتعلق بـ **{metric}**.
+
+يرجى إرجاع التنسيق التالي فقط بصيغة JSON:
+{{
+  "reasoning": "<سبب الاختيار في جملة أو جملتين>",
+  "choice": "Left" | "Right"
+}}
+""",
+        "packed_header": """
+أنت **المشارك B** في تجربة تفضيلات اجتماعية.
+
+**الوصف الشخصي (بيرسونا)**
+{persona_desc}
+
+أجب عن كل سيناريو أدناه بشكل مستقل.
+
+{scenarios}
+
+يرجى إرجاع مصفوفة JSON فقط، بعنصر واحد لكل سيناريو:
+[
+  {{"scenario": <رقم السيناريو>, "reasoning": "<سبب الاختيار في جملة أو جملتين>", "choice": "Left" | "Right"}},
+  ...
+]
+""",
+        "packed_item": """### السيناريو {n} (مستوى الصعوبة **{difficulty}**، يتعلق بـ **{metric}**)
+- **اليسار**: B {B_left}, A {A_left}
+- **اليمين**: B {B_right}, A {A_right}
+""",
+        "reasoning_desc": 'سبب الاختيار في جملة أو جملتين',
+        "choice_desc": 'اليسار = Left, اليمين = Right',
+    },
+}
+
+
+def choice_prompt(lang: str) -> str:
+    """reasoning 줄을 뺀 선택 전용 프롬프트"""
+    t = TEMPLATES[lang]
+    return t["prompt"].replace(f'''  "reasoning": "<{t["reasoning_desc"]}>",\n''', "")
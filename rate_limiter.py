@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Gemini 호출용 적응형 레이트 리미터 (AIMD)
+------------------------------------------------
+요청/분(RPM)·토큰/분(TPM) 두 개의 토큰 버킷을 함께 관리한다.
+- 성공할 때마다 허용 속도를 현재 속도의 increase 비율 + additive_step(RPM)만큼 올리고 (상한: 설정 쿼터)
+- 429 / 503 이 이어질 때만 backoff 배율로 곱해서 줄인다 (하한: min_rpm).
+  최근 throttle_window 초의 응답 중 429 비율이 throttle_ratio 이상(429 가 min_throttles 개 이상)이거나
+  성공 없이 429 가 min_throttles 번 연달아 오면 "이어지는" 것으로 본다.
+  가끔 섞이는 429 는 속도를 줄이지 않고 엔진의 재시도에 맡긴다.
+state_path 를 지정하면 버킷 상태를 SQLite 파일에 두어,
+같은 파일을 가리키는 모든 프로세스(EN/KR/AR 러너 동시 실행 등)가 하나의 쿼터를 나눠 쓴다.
+clock 은 기본이 벽시계(time.time)이며, 벤치마크의 가상 시간 루프에서는 loop.time 을 넘긴다.
+성공 / 429 / 토큰 정산은 바로 쓰지 않고 모았다가 다음 acquire 의 트랜잭션에서 함께 반영하므로 요청당 트랜잭션은 하나이고,
+SQLite 트랜잭션(다른 프로세스가 잠금을 쥐고 있으면 최대 30 초 대기)은 이벤트 루프가 아닌 작업 스레드에서 돈다.
+"""
+
+import argparse
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_RPM = 2000
+DEFAULT_TPM = 4_000_000
+
+_FIELDS = ("rate", "req_level", "tok_level", "last", "cooldown_until", "throttles")
+
+
+def is_throttle_error(e: BaseException) -> bool:
+    """429(RESOURCE_EXHAUSTED) / 503(UNAVAILABLE) 계열인지 판별"""
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if code in (429, 503):
+        return True
+    msg = str(e)
+    return any(k in msg for k in ("429", "RESOURCE_EXHAUSTED", "503", "UNAVAILABLE",
+                                  "Resource has been exhausted", "rate limit"))
+
+
+# ---------- 상태 저장소 ---------- #
+class _MemoryState:
+    def __init__(self, init: Dict[str, float]):
+        self._st = dict(init)
+        self._lock = threading.Lock()
+
+    def transact(self, fn: Callable[[Dict[str, float]], Any]) -> Any:
+        with self._lock:
+            return fn(self._st)
+
+    async def atransact(self, fn: Callable[[Dict[str, float]], Any]) -> Any:
+        return self.transact(fn)
+
+
+class _SqliteState:
+    """여러 프로세스가 공유하는 버킷 상태 (BEGIN IMMEDIATE 로 원자적 갱신)"""
+
+    def __init__(self, path: Path, init: Dict[str, float]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._lock = threading.Lock()
+        # 공유 작업 큐처럼 여러 호스트가 네트워크 경로로 함께 쓸 수 있도록 WAL 대신 롤백 저널
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY CHECK (id = 0), "
+            + ", ".join(f"{f} REAL" for f in _FIELDS) + ")"
+        )
+        self._conn.execute(
+            f"INSERT OR IGNORE INTO bucket (id, {', '.join(_FIELDS)}) "
+            f"VALUES (0, {', '.join('?' for _ in _FIELDS)})",
+            [init[f] for f in _FIELDS],
+        )
+
+    def transact(self, fn: Callable[[Dict[str, float]], Any]) -> Any:
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                row = cur.execute(f"SELECT {', '.join(_FIELDS)} FROM bucket WHERE id = 0").fetchone()
+                st = dict(zip(_FIELDS, row))
+                out = fn(st)
+                cur.execute(f"UPDATE bucket SET {', '.join(f'{f} = ?' for f in _FIELDS)} WHERE id = 0",
+                            [st[f] for f in _FIELDS])
+                cur.execute("COMMIT")
+                return out
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+    async def atransact(self, fn: Callable[[Dict[str, float]], Any]) -> Any:
+        # 잠금 대기가 이벤트 루프(진행 중인 모든 요청)를 막지 않도록 작업 스레드에서
+        return await asyncio.to_thread(self.transact, fn)
+
+
+# ---------- 리미터 ---------- #
+class AdaptiveRateLimiter:
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: Optional[float] = DEFAULT_TPM,
+                 min_rpm: float = 1.0, additive_step: float = 1.0, increase: float = 0.02,
+                 backoff: float = 0.5, burst_seconds: float = 1.0, cooldown_seconds: float = 1.0,
+                 throttle_window: float = 10.0, throttle_ratio: float = 0.1, min_throttles: int = 3,
+                 state_path: Optional[Path] = None, clock: Callable[[], float] = time.time):
+        if rpm <= 0:
+            raise ValueError("rpm 은 0 보다 커야 합니다 (리미터를 끄려면 리미터를 만들지 않는다).")
+        self.max_rpm = float(rpm)
+        self.tpm = float(tpm) if tpm else None
+        self.min_rpm = float(min_rpm)
+        self.additive_step = additive_step
+        self.increase = increase
+        self.backoff = backoff
+        self.throttle_window = throttle_window
+        self.throttle_ratio = throttle_ratio
+        self.min_throttles = min_throttles
+        self.burst_seconds = burst_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        init = dict(rate=self.max_rpm, req_level=self._req_cap(self.max_rpm),
+                    tok_level=self._tok_cap(self.max_rpm), last=clock(),
+                    cooldown_until=0.0, throttles=0.0)
+        self._state = _SqliteState(Path(state_path), init) if state_path else _MemoryState(init)
+        # 다음 트랜잭션에서 반영할 성공 횟수 / 토큰 정산 / 429 수 / 속도를 줄일 429 시각
+        self._pending_lock = threading.Lock()
+        self._successes = 0
+        self._tok_debt = 0.0
+        self._throttles = 0
+        self._cuts: List[float] = []
+        # 이 프로세스가 본 최근 응답 (시각, 429 여부) 와 성공 없이 이어진 429 수
+        self._recent: "deque[Tuple[float, bool]]" = deque()
+        self._recent_throttles = 0
+        self._streak = 0
+
+    # 버킷 용량: burst_seconds 동안의 허용량 (최소 1 요청)
+    def _req_cap(self, rate: float) -> float:
+        return max(1.0, rate / 60 * self.burst_seconds)
+
+    def _tok_rate(self, rate: float) -> float:
+        # TPM 도 RPM 과 같은 비율로 줄였다 늘린다
+        return self.tpm * rate / self.max_rpm / 60
+
+    def _tok_cap(self, rate: float) -> float:
+        return self._tok_rate(rate) * self.burst_seconds if self.tpm else 0.0
+
+    def _refill(self, st: Dict[str, float]) -> None:
+        now = self.clock()
+        elapsed = max(0.0, now - st["last"])
+        st["last"] = now
+        st["req_level"] = min(self._req_cap(st["rate"]), st["req_level"] + elapsed * st["rate"] / 60)
+        if self.tpm:
+            st["tok_level"] = min(self._tok_cap(st["rate"]),
+                                  st["tok_level"] + elapsed * self._tok_rate(st["rate"]))
+
+    def _apply_pending(self, st: Dict[str, float]) -> None:
+        """모아 둔 성공 / 정산 / 429 를 상태에 반영 (성공으로 올린 뒤 429 로 줄인다)"""
+        with self._pending_lock:
+            successes, debt, throttles, cuts = self._successes, self._tok_debt, self._throttles, self._cuts
+            self._successes, self._tok_debt, self._throttles, self._cuts = 0, 0.0, 0, []
+        for _ in range(successes):
+            if st["rate"] >= self.max_rpm:
+                break
+            st["rate"] = min(self.max_rpm, st["rate"] * (1 + self.increase) + self.additive_step)
+        st["tok_level"] -= debt
+        st["throttles"] += throttles
+        for t in cuts:
+            # 동시에 나가 있던 요청들이 한꺼번에 429 를 받아도 한 번만 줄인다
+            if t < st["cooldown_until"]:
+                continue
+            st["rate"] = max(self.min_rpm, st["rate"] * self.backoff)
+            st["req_level"] = min(st["req_level"], 0.0)
+            st["cooldown_until"] = t + self.cooldown_seconds
+
+    def _try_take(self, st: Dict[str, float], tokens: float) -> float:
+        """가져가면 0, 아니면 기다려야 할 초를 돌려준다"""
+        self._apply_pending(st)
+        self._refill(st)
+        waits = []
+        if st["req_level"] < 1:
+            waits.append((1 - st["req_level"]) / (st["rate"] / 60))
+        if self.tpm:
+            # 한 요청이 버킷 용량보다 크면 가득 찼을 때 빚(음수)을 지고 통과시킨다
+            need = min(tokens, self._tok_cap(st["rate"]))
+            if st["tok_level"] < need:
+                waits.append((need - st["tok_level"]) / self._tok_rate(st["rate"]))
+        if waits:
+            return max(waits)
+        st["req_level"] -= 1
+        st["tok_level"] -= tokens
+        return 0.0
+
+    async def acquire(self, tokens: float = 0) -> None:
+        while True:
+            wait = await self._state.atransact(lambda st: self._try_take(st, tokens))
+            if wait <= 0:
+                return
+            # 부동소수 오차로 아주 작은 대기만 반복되지 않도록 최소 1ms 는 기다린다
+            await asyncio.sleep(min(max(wait, 0.001), 1.0))
+
+    def settle(self, estimated: float, actual: float) -> None:
+        """추정 토큰과 실제 사용 토큰의 차이를 버킷에 반영"""
+        if not self.tpm or not actual:
+            return
+        with self._pending_lock:
+            self._tok_debt += actual - estimated
+
+    def _observe(self, now: float, throttled: bool) -> None:
+        self._recent.append((now, throttled))
+        self._recent_throttles += throttled
+        while self._recent and self._recent[0][0] <= now - self.throttle_window:
+            self._recent_throttles -= self._recent.popleft()[1]
+
+    def on_success(self) -> None:
+        with self._pending_lock:
+            self._successes += 1
+            self._streak = 0
+            self._observe(self.clock(), False)
+
+    def on_throttle(self) -> None:
+        with self._pending_lock:
+            now = self.clock()
+            self._throttles += 1
+            self._streak += 1
+            self._observe(now, True)
+            sustained = (self._recent_throttles >= self.min_throttles
+                         and self._recent_throttles >= self.throttle_ratio * len(self._recent))
+            if sustained or self._streak >= self.min_throttles:
+                self._cuts.append(now)
+
+    def snapshot(self) -> Dict[str, float]:
+        def fn(st):
+            self._apply_pending(st)
+            self._refill(st)
+            return {"rpm": st["rate"], "throttles": int(st["throttles"])}
+        return self._state.transact(fn)
+
+
+class ArmLimiters:
+    """arm(모델@temperature)마다 리미터 하나 (multi_run 의 모델 / temperature 스윕).
+    limits 의 키가 arm 이름이면 그 arm 만, 모델 이름이면 그 모델의 모든 arm 이 리미터 하나(= 모델 쿼터)를 나눠 쓴다.
+    limits 에 없는 arm 은 기본 rpm / tpm 으로 자기 리미터를 갖는다.
+    state_path 를 주면 리미터마다 <state_path 이름>-<키>.db 에 상태를 둔다."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: Optional[float] = DEFAULT_TPM,
+                 limits: Optional[Dict[str, Tuple[float, Optional[float]]]] = None,
+                 state_path: Optional[Path] = None):
+        self.rpm, self.tpm = rpm, tpm
+        self.limits = limits or {}
+        self.state_path = Path(state_path) if state_path else None
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+    def key(self, arm: str, model: str) -> str:
+        return arm if arm in self.limits or model not in self.limits else model
+
+    def quota(self, arm: str, model: str) -> Tuple[float, Optional[float]]:
+        """arm 에 적용되는 (rpm, tpm). TPM 을 적지 않은 한도는 기본 tpm 을, 0 이면 제한 없음을 쓴다."""
+        rpm, tpm = self.limits.get(self.key(arm, model), (self.rpm, None))
+        return rpm, self.tpm if tpm is None else (tpm or None)
+
+    def get(self, arm: str, model: str) -> Optional[AdaptiveRateLimiter]:
+        key = self.key(arm, model)
+        if key not in self._limiters:
+            rpm, tpm = self.quota(arm, model)
+            if not rpm:  # rpm 0 = 이 arm 은 리미터 없이
+                return None
+            path = None
+            if self.state_path is not None:
+                safe = re.sub(r"[^\w.@-]", "_", key)
+                path = self.state_path.with_name(f"{self.state_path.stem}-{safe}{self.state_path.suffix}")
+            self._limiters[key] = AdaptiveRateLimiter(rpm=rpm, tpm=tpm, state_path=path)
+        return self._limiters[key]
+
+
+def parse_arm_limit(text: str) -> Tuple[str, Tuple[float, Optional[float]]]:
+    """"gemini-2.0-flash@0.7=1000:2000000" / "gemini-2.5-pro=150" → (키, (rpm, tpm 또는 None))"""
+    key, sep, quota = text.rpartition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"--arm-limit 형식은 ARM=RPM[:TPM] 입니다: {text}")
+    rpm, _, tpm = quota.partition(":")
+    try:
+        return key, (float(rpm), float(tpm) if tpm else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"--arm-limit 의 RPM / TPM 은 숫자여야 합니다: {text}")
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_limiter_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="요청/분 쿼터 상한 (0 = 리미터 없음)")
+    ap.add_argument("--tpm", type=float, default=DEFAULT_TPM, help="토큰/분 쿼터 상한 (0 = 제한 없음)")
+    ap.add_argument("--limiter-db", type=Path,
+                    help="여러 프로세스가 공유할 리미터 상태 파일 (SQLite)")
+
+
+def limiter_from_args(args: argparse.Namespace) -> Optional[AdaptiveRateLimiter]:
+    """--rpm 0 이면 리미터 없이 (--tpm 0 과 같이 "제한 없음")"""
+    if not args.rpm:
+        return None
+    return AdaptiveRateLimiter(rpm=args.rpm, tpm=args.tpm or None, state_path=args.limiter_db)
+
+
+def add_arm_limit_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--arm-limit", type=parse_arm_limit, action="append", default=[], metavar="ARM=RPM[:TPM]",
+                    help="arm(모델@temperature) 또는 모델별 쿼터 (여러 번 지정 가능, 없으면 --rpm / --tpm). "
+                         "모델 이름으로 주면 그 모델의 arm 들이 쿼터 하나를 나눠 쓴다")
+
+
+def arm_limiters_from_args(args: argparse.Namespace) -> ArmLimiters:
+    return ArmLimiters(args.rpm, args.tpm or None, dict(args.arm_limit), args.limiter_db)
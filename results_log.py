@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+추가 전용(append-only) 샤드 결과 로그
+------------------------------------------------
+페르소나마다 indent=4 JSON 파일을 쓰는 대신,
+(언어, 설정, 반복, 페르소나 idx, 난이도, 시나리오) 당 한 줄짜리 compact row 를
+회전(rotating) JSONL / Parquet 샤드에 덧붙인다.
+페르소나 설명은 personas.jsonl 에 (언어, idx) 당 한 번만 저장되고 row 는 idx 로만 참조한다.
+같은 셀이 여러 번 기록되면(재실행) 가장 나중 row 가 유효하다.
+
+<로그 디렉터리 구조>
+  personas.jsonl
+  rows-<시각>-<호스트>-<pid>-<순번>.jsonl | .parquet   (호스트가 여럿이어도 샤드 이름이 겹치지 않음)
+parquet 형식도 row 는 먼저 같은 이름의 .jsonl 샤드에 바로 쓰고, 샤드가 차거나 로그를 닫을 때 .parquet 으로 바꾼다.
+그래서 중단되어도 매니페스트가 ok 로 기록한 셀의 row 는 (.jsonl 로 남아) 읽힌다.
+
+레거시 Person_*.json 파일 내보내기
+  python results_log.py export --log <로그 디렉터리> --out <출력 폴더> --lang EN --config pre
+(난이도, 시나리오)별 Left 비율 집계 (샘플 row 와 logprob 확률 row 모두)
+  python results_log.py aggregate --log <로그 디렉터리> --out stats.csv --lang EN --config pre
+"""
+
+import argparse
+import csv
+import json
+import os
+import socket
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+ROW_KEY = ("lang", "config", "repeat", "idx", "difficulty", "scenario")
+PERSONAS_FILE = "personas.jsonl"
+# parquet 는 첫 row 로 스키마를 정하므로, 선택 필드를 모두 채워서 쓴다
+ROW_DEFAULTS: Dict[str, Any] = {"thought": None, "answer": None, "error": None, "pack_pos": None,
+                                "p_left": None, "p_right": None, "has_reasoning": None,
+                                "task_id": None, "arm": None}
+
+
+def row_key(row: Dict[str, Any]) -> Tuple:
+    return tuple(row[k] for k in ROW_KEY)
+
+
+def build_rows(lang: str, config: str, repeat: int, idx: int,
+               resps: List[Any], meta: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """save_results 와 같은 (meta, 응답) 쌍을 셀 단위 row 로 변환"""
+    rows = []
+    for m, r in zip(meta, resps):
+        row = {"lang": lang, "config": config, "repeat": repeat, "idx": int(idx),
+               "difficulty": m["difficulty"], "scenario": m["scenario_idx"] + 1,
+               "metric": m["metric"],
+               "options": [m["A_left"], m["B_left"], m["A_right"], m["B_right"]]}
+        if m.get("task_id"):  # 플랜(experiment_plan)으로 실행한 셀
+            row["task_id"] = m["task_id"]
+            row["arm"] = m["arm"]
+        if isinstance(r, Exception):
+            row["error"] = str(r)
+        else:
+            row["thought"] = r.get("reasoning", "")
+            row["answer"] = r.get("choice", "")
+            # reasoning 을 요청한 row 인지 (선택 전용 / logprob row 는 False)
+            row["has_reasoning"] = not (r.get("choice_only") or r.get("p_left") is not None)
+            if r.get("pack_pos") is not None:  # 묶음 요청에서 몇 번째로 제시된 셀인지
+                row["pack_pos"] = r["pack_pos"]
+            if r.get("p_left") is not None:  # logprob 모드: 샘플 대신 선택 확률
+                row["p_left"], row["p_right"] = r["p_left"], r["p_right"]
+        rows.append(row)
+    return rows
+
+
+class ResultsLog:
+    def __init__(self, root: Path, shard_rows: int = 200_000, fmt: str = "jsonl"):
+        if fmt not in ("jsonl", "parquet"):
+            raise ValueError(f"지원하지 않는 형식: {fmt}")
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401  (parquet 샤드는 pyarrow 필요)
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shard_rows = shard_rows
+        self.fmt = fmt
+        self._prefix = f"rows-{time.strftime('%Y%m%d%H%M%S')}-{socket.gethostname()}-{os.getpid()}"
+        # 같은 초에 같은 pid 로 다시 열어도 이전 샤드 뒤 번호부터 쓴다 (파일명 순서 = 기록 순서)
+        self._seq = len(list(self.root.glob(f"{self._prefix}-*")))
+        self._rows_in_shard = 0
+        self._fh = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._personas_seen: Set[Tuple[str, int]] = {(p["lang"], p["idx"]) for p in iter_personas(self.root)}
+        self._personas_fh = (self.root / PERSONAS_FILE).open("a", encoding="utf-8")
+
+    # ---------- 기록 ---------- #
+    def add_persona(self, lang: str, idx: int, persona: str) -> None:
+        if (lang, int(idx)) in self._personas_seen:
+            return
+        self._personas_seen.add((lang, int(idx)))
+        self._personas_fh.write(json.dumps({"lang": lang, "idx": int(idx), "persona": persona},
+                                           ensure_ascii=False) + "\n")
+        self._personas_fh.flush()
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            if self._rows_in_shard >= self.shard_rows:
+                self._rotate()
+            if self._fh is None:  # parquet 도 바꾸기 전까지는 jsonl 샤드에 바로 쓴다
+                self._fh = self._shard_path("jsonl").open("a", encoding="utf-8")
+            self._fh.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+            if self.fmt == "parquet":
+                self._buffer.append({**ROW_DEFAULTS, **row})
+            self._rows_in_shard += 1
+        if self._fh is not None:
+            self._fh.flush()
+
+    def append_persona(self, lang: str, config: str, repeat: int, idx: int, persona: str,
+                       resps: List[Any], meta: List[Dict[str, Any]]) -> None:
+        self.add_persona(lang, idx, persona)
+        self.append(build_rows(lang, config, repeat, idx, resps, meta))
+
+    # ---------- 샤드 관리 ---------- #
+    def _shard_path(self, fmt: Optional[str] = None) -> Path:
+        return self.root / f"{self._prefix}-{self._seq:04d}.{fmt or self.fmt}"
+
+    def _rotate(self) -> None:
+        self._flush_shard()
+        self._seq += 1
+        self._rows_in_shard = 0
+
+    def _flush_shard(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self._buffer:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            path = self._shard_path()
+            tmp = path.with_name(f".{path.name}.tmp")  # rows-* 로 읽히지 않는 이름
+            pq.write_table(pa.Table.from_pylist(self._buffer), str(tmp))
+            os.replace(tmp, path)  # 다 쓴 뒤에 jsonl 샤드를 지운다 (그 사이에 끊기면 같은 row 가 두 번 읽힐 뿐)
+            self._shard_path("jsonl").unlink()
+            self._buffer = []
+
+    def close(self) -> None:
+        self._flush_shard()
+        self._personas_fh.close()
+
+    def __enter__(self) -> "ResultsLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---------- 읽기 ---------- #
+def iter_personas(root: Path) -> Iterator[Dict[str, Any]]:
+    path = Path(root) / PERSONAS_FILE
+    if not path.exists():
+        return
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 중단으로 잘린 마지막 줄
+
+
+def load_personas(root: Path, lang: str) -> Dict[int, str]:
+    return {p["idx"]: p["persona"] for p in iter_personas(root) if p["lang"] == lang}
+
+
+def iter_rows(root: Path, lang: Optional[str] = None,
+              config: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """모든 샤드를 기록 순서(파일명 = 시각 순)대로 읽는다"""
+    for shard in sorted(Path(root).glob("rows-*")):
+        if shard.suffix == ".parquet":
+            import pyarrow.parquet as pq
+            rows = pq.read_table(str(shard)).to_pylist()
+        else:
+            rows = []
+            with shard.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        try:
+                            rows.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
+        for row in rows:
+            if (lang is None or row["lang"] == lang) and (config is None or row["config"] == config):
+                yield row
+
+
+def load_cells(root: Path, lang: Optional[str] = None,
+               config: Optional[str] = None) -> Dict[Tuple, Dict[str, Any]]:
+    """셀 키 → 가장 최근 row"""
+    cells: Dict[Tuple, Dict[str, Any]] = {}
+    for row in iter_rows(root, lang, config):
+        cells[row_key(row)] = row
+    return cells
+
+
+# ---------- 집계 ---------- #
+AGG_FIELDS = ["lang", "config", "group", "difficulty", "scenario", "left", "right", "total",
+              "p_left", "prob_rows", "sampled_rows"]
+
+
+def aggregate_choices(root: Path, lang: str, config: str,
+                      group_of: Optional[Callable[[int], Any]] = None) -> List[Dict[str, Any]]:
+    """(그룹, 난이도, 시나리오)별 Left/Right 합계.
+    샘플 row 는 answer 를 1회로, logprob row 는 p_left / p_right 를 기대 빈도로 더한다.
+    group_of(idx) 로 도메인 등 페르소나 그룹을 나눌 수 있다 (없으면 전체)."""
+    acc: Dict[Tuple, Dict[str, float]] = defaultdict(
+        lambda: {"left": 0.0, "right": 0.0, "prob_rows": 0, "sampled_rows": 0})
+    for row in load_cells(root, lang, config).values():
+        if row.get("error") is not None:
+            continue
+        group = group_of(row["idx"]) if group_of else ""
+        if group is None:
+            continue
+        a = acc[(group, row["difficulty"], row["scenario"])]
+        if row.get("p_left") is not None:
+            a["left"] += row["p_left"]
+            a["right"] += row["p_right"]
+            a["prob_rows"] += 1
+        elif row.get("answer") in ("Left", "Right"):
+            a["left" if row["answer"] == "Left" else "right"] += 1
+            a["sampled_rows"] += 1
+    out = []
+    for (group, diff, sc), a in sorted(acc.items(), key=lambda kv: tuple(map(str, kv[0]))):
+        total = a["left"] + a["right"]
+        out.append({"lang": lang, "config": config, "group": group, "difficulty": diff, "scenario": sc,
+                    "left": round(a["left"], 4), "right": round(a["right"], 4),
+                    "total": a["prob_rows"] + a["sampled_rows"],
+                    "p_left": round(a["left"] / total, 4) if total else None,
+                    "prob_rows": a["prob_rows"], "sampled_rows": a["sampled_rows"]})
+    return out
+
+
+def write_aggregate(rows: List[Dict[str, Any]], out_path: Path) -> None:
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=AGG_FIELDS)
+        w.writeheader()
+        w.writerows(rows)
+
+
+# ---------- 레거시 내보내기 ---------- #
+def export_legacy(root: Path, out_dir: Path, lang: str, config: str,
+                  file_fmt: str = "Person_{idx}.json", id_fmt: str = "{idx}") -> int:
+    """로그를 예전 페르소나별 JSON 파일로 내보낸다.
+    반복이 여러 개면 out_dir/Temp{r}/ 아래에, 하나면 out_dir 에 바로 쓴다."""
+    personas = load_personas(root, lang)
+    by_file: Dict[Tuple[int, int], Dict[str, Dict[str, Any]]] = defaultdict(dict)
+    for row in load_cells(root, lang, config).values():
+        data = by_file[(row["repeat"], row["idx"])]
+        d = row["difficulty"]
+        data.setdefault(d, {})
+        if row.get("error") is not None:
+            data[d][f"scenario_{row['scenario']}"] = {"error": row["error"]}
+            continue
+        a_l, b_l, a_r, b_r = row["options"]
+        pid = id_fmt.format(idx=row["idx"])
+        data[d][f"scenario_{row['scenario']}"] = {
+            "persona_id": int(pid) if pid.isdigit() else pid,
+            "persona_desc": personas.get(row["idx"], ""),
+            "difficulty": d,
+            "metric": row["metric"],
+            "options": {"left": {"A": a_l, "B": b_l}, "right": {"A": a_r, "B": b_r}},
+            "thought": row.get("thought", ""),
+            "answer": row.get("answer", ""),
+        }
+        if row.get("p_left") is not None:
+            data[d][f"scenario_{row['scenario']}"].update(p_left=row["p_left"], p_right=row["p_right"])
+
+    repeats = {r for r, _ in by_file}
+    for (r, idx), data in by_file.items():
+        target = Path(out_dir) / f"Temp{r}" if len(repeats) > 1 else Path(out_dir)
+        target.mkdir(parents=True, exist_ok=True)
+        (target / file_fmt.format(idx=idx)).write_text(
+            json.dumps(data, ensure_ascii=False, indent=4), encoding="utf-8")
+    return len(by_file)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Results log utilities")
+    ap.add_argument("command", choices=["export", "count", "aggregate"])
+    ap.add_argument("--log", type=Path, required=True, help="결과 로그 디렉터리")
+    ap.add_argument("--lang", required=True, help="EN | KR | AR")
+    ap.add_argument("--config", required=True, help="pre | main")
+    ap.add_argument("--out", type=Path, help="레거시 파일 출력 폴더 (export) / CSV 파일 (aggregate)")
+    ap.add_argument("--file-fmt", default="Person_{idx}.json")
+    ap.add_argument("--id-fmt", default="{idx}")
+    args = ap.parse_args()
+
+    if args.command == "count":
+        cells = load_cells(args.log, args.lang, args.config)
+        print(f"cells={len(cells)} personas={len({(k[2], k[3]) for k in cells})}")
+        return
+    if args.out is None:
+        raise ValueError("--out 이 필요합니다.")
+    if args.command == "aggregate":
+        rows = aggregate_choices(args.log, args.lang, args.config)
+        write_aggregate(rows, args.out)
+        print(f"[✓] Aggregated {len(rows)} cells → {args.out}")
+        return
+    n = export_legacy(args.log, args.out, args.lang, args.config, args.file_fmt, args.id_fmt)
+    print(f"[✓] Exported {n} persona files → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
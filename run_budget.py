@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+토큰 / 비용 예산 (실행별 / 언어별) + --dry-run 추정
+------------------------------------------------
+엔진은 API 호출마다(헤지 복제 요청 포함) 보내기 직전에 acquire(입력 추정, 출력 추정)으로 추정 비용을 예약하고,
+응답을 받으면 charge 로 예약을 실제 토큰으로 바꾼다 (실패 / 취소된 호출은 release 로 예약만 되돌림).
+상한은 정산된 지출 + 진행 중인 호출의 예약분으로 확인하므로, 동시에 나가 있는 호출이 많아도 상한을 넘겨 보내지 않는다.
+  --budget-usd / --budget-tokens : 이번 실행의 상한
+  --lang-budget-usd              : 같은 언어의 모든 실행 합계 상한 (budget.db 장부, 여러 러너가 공유 가능)
+상한에 닿으면
+  - stop     : BudgetExhausted 로 실행을 멈춘다. 끝난 페르소나는 기록되어 있고 나머지 셀은 매니페스트에 pending 으로
+               남으므로 --rerun-missing (AR 은 --all) 으로 이어서 실행한다.
+  - throttle : --budget-window 초 동안의 지출이 상한 아래로 내려갈 때까지 새 호출을 기다리게 한다 (지출 속도 제한).
+--dry-run 은 아무것도 보내지 않고 렌더링한 프롬프트와 관측된 출력 길이(metrics.json)로 호출 수 / 토큰 / 비용 / 예상 시간을 출력한다.
+
+  python en_run.py --config pre --repeat 5 --dry-run --persona-range 1-2000
+  python ar_run.py --config pre --all --budget-usd 20 --lang-budget-usd 100
+"""
+
+import argparse
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from llm_backend import estimate_tokens
+
+BUDGET_FILE = "budget.db"
+DEFAULT_OUTPUT_TOKENS = 64   # 관측값이 없을 때 호출당 출력 토큰
+DEFAULT_LATENCY = 1.0        # 관측값이 없을 때 호출당 지연 (초)
+_FLUSH_EVERY = 5.0           # 장부에 이번 실행의 누계를 쓰는 간격 (초)
+
+# USD / 1M 토큰 (입력, 출력) — 텍스트 유료 등급 기준, 바뀌면 --price-in / --price-out 으로 덮어쓴다
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+class BudgetExhausted(Exception):
+    """예산 상한에 닿아 실행을 멈춤 (셀 오류가 아니라 실행 전체 중단)"""
+
+
+def cost_of(price: Tuple[float, float], input_tokens: float, output_tokens: float) -> float:
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+
+class RunBudget:
+    def __init__(self, lang: str, price: Tuple[float, float], run_usd: float = 0.0, run_tokens: int = 0,
+                 lang_usd: float = 0.0, mode: str = "stop", window: float = 0.0,
+                 path: Optional[Path] = None, clock: Callable[[], float] = time.time):
+        if mode == "throttle" and not window:
+            raise ValueError("throttle 모드에는 --budget-window 가 필요합니다.")
+        self.lang = lang
+        self.price = price
+        self.run_usd = run_usd
+        self.run_tokens = run_tokens
+        self.lang_usd = lang_usd
+        self.mode = mode
+        self.window = window
+        self.clock = clock
+        self.run_id = uuid.uuid4().hex[:12]
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.waited = 0.0
+        # 진행 중인 호출의 예약분 (비용, 토큰, 호출 수)
+        self._reserved_cost = 0.0
+        self._reserved_tokens = 0
+        self._inflight = 0
+        self._changed: Optional[asyncio.Event] = None  # 예약이 정산 / 반환되면 깨울 대기자
+        self._recent: Deque[Tuple[float, float, int]] = deque()  # (시각, 비용, 토큰) — throttle 창
+        self._others = 0.0  # 같은 언어의 다른 실행 지출 (장부에서 읽음)
+        self._conn = None
+        self._last_flush = clock()
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spend (lang TEXT, run TEXT, input_tokens INTEGER,"
+                " output_tokens INTEGER, cost REAL, updated REAL, PRIMARY KEY (lang, run))")
+            self._conn.commit()
+            self._others = self._read_others()
+
+    # ---------- 장부 ---------- #
+    def _read_others(self) -> float:
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(cost), 0) FROM spend WHERE lang = ? AND run != ?",
+                                      (self.lang, self.run_id)).fetchone()
+        return total
+
+    def flush(self) -> None:
+        self._last_flush = self.clock()
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "INSERT INTO spend VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (lang, run) DO UPDATE SET"
+            " input_tokens = excluded.input_tokens, output_tokens = excluded.output_tokens,"
+            " cost = excluded.cost, updated = excluded.updated",
+            (self.lang, self.run_id, self.input_tokens, self.output_tokens, self.cost, time.time()))
+        self._conn.commit()
+        self._others = self._read_others()
+
+    # ---------- 확인 / 기록 ---------- #
+    def _over(self, cost: float, tokens: int) -> Optional[str]:
+        """이번 호출(추정)을 진행 중인 예약분과 함께 더했을 때 넘는 상한 이름"""
+        cost += self._reserved_cost
+        tokens += self._reserved_tokens
+        if self.lang_usd and self._others + self.cost + cost > self.lang_usd:
+            return f"language budget ${self.lang_usd:g} ({self.lang})"
+        if self.mode == "throttle":
+            now = self.clock()
+            while self._recent and self._recent[0][0] <= now - self.window:
+                self._recent.popleft()
+            spent = sum(c for _, c, _ in self._recent)
+            used = sum(t for _, _, t in self._recent)
+        else:
+            spent, used = self.cost, self.input_tokens + self.output_tokens
+        if self.run_usd and spent + cost > self.run_usd:
+            return f"run budget ${self.run_usd:g}"
+        if self.run_tokens and used + tokens > self.run_tokens:
+            return f"run budget {self.run_tokens} tokens"
+        return None
+
+    async def acquire(self, input_tokens: float, output_tokens: float) -> Tuple[float, int]:
+        """추정 비용을 예약하고 예약분을 돌려준다 (charge / release 에 그대로 넘긴다)"""
+        cost = cost_of(self.price, input_tokens, output_tokens)
+        tokens = int(input_tokens + output_tokens)
+        while True:
+            over = self._over(cost, tokens)
+            if over is None:
+                self._reserved_cost += cost
+                self._reserved_tokens += tokens
+                self._inflight += 1
+                return cost, tokens
+            if self._inflight:  # 진행 중인 호출이 정산되면 (대개 추정보다 적게) 다시 확인
+                if self._changed is None:
+                    self._changed = asyncio.Event()
+                await self._changed.wait()
+                continue
+            if self.mode != "throttle" or over.startswith("language") or not self._recent:
+                raise BudgetExhausted(f"{over} reached: spent ${self.cost:.4f}, "
+                                      f"{self.input_tokens + self.output_tokens} tokens")
+            # 창에서 가장 오래된 지출이 빠질 때까지 대기
+            wait = max(self._recent[0][0] + self.window - self.clock(), 0.001)
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def release(self, reservation: Tuple[float, int]) -> None:
+        """보내지 못했거나 실패 / 취소된 호출의 예약을 되돌린다"""
+        self._reserved_cost -= reservation[0]
+        self._reserved_tokens -= reservation[1]
+        self._inflight -= 1
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def charge(self, input_tokens: int, output_tokens: int,
+               reservation: Optional[Tuple[float, int]] = None) -> None:
+        """실제 토큰을 더한다. reservation 이 있으면 그 예약을 정산한다."""
+        if reservation is not None:
+            self.release(reservation)
+        cost = cost_of(self.price, input_tokens, output_tokens)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cost += cost
+        if self.mode == "throttle":
+            self._recent.append((self.clock(), cost, input_tokens + output_tokens))
+        if self.clock() - self._last_flush >= _FLUSH_EVERY:
+            self.flush()
+
+    def summary(self) -> Dict[str, Any]:
+        out = {"run": self.run_id, "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+               "cost_usd": round(self.cost, 4)}
+        if self.lang_usd:
+            out["lang_cost_usd"] = round(self._others + self.cost, 4)
+        if self.waited:
+            out["throttled_s"] = round(self.waited, 1)
+        return out
+
+    def close(self) -> None:
+        self.flush()
+        print("Budget →", self.summary())
+        if self._conn is not None:
+            self._conn.close()
+
+
+# ---------- --dry-run 추정 ---------- #
+def observed(out_dir: Path) -> Dict[str, float]:
+    """이전 실행의 metrics.json 에서 호출당 출력 토큰 / 지연 (묶음 호출은 따로)"""
+    path = Path(out_dir) / "metrics.json"
+    if not path.exists():
+        return {}
+    snap = json.loads(path.read_text(encoding="utf-8"))
+    acc: Dict[str, List[float]] = {"cell": [0, 0, 0.0], "packed": [0, 0, 0.0]}
+    for s in snap.get("series", []):
+        a = acc["packed" if s["metric"] == "packed" else "cell"]
+        a[0] += s["calls"]
+        a[1] += s["output_tokens"]
+        a[2] += s["latency_mean"] * s["calls"]
+    out: Dict[str, float] = {}
+    for kind, (calls, tokens, latency) in acc.items():
+        if calls:
+            out[f"{kind}_output_tokens"] = tokens / calls
+            out[f"{kind}_latency"] = latency / calls
+    return out
+
+
+def estimate_plan(calls: Iterable[Tuple[str, Optional[int], int]], price: Tuple[float, float],
+                  seen: Dict[str, float], rpm: float, tpm: float, concurrency: int) -> Dict[str, Any]:
+    """calls = [(프롬프트, 출력 상한, 묶은 셀 수), ...] → 호출 수 / 토큰 / 비용 / 예상 시간"""
+    n = tokens_in = 0
+    tokens_out = latency = 0.0
+    for prompt, cap, cells in calls:
+        kind = "packed" if cells > 1 else "cell"
+        out = seen.get(f"{kind}_output_tokens", DEFAULT_OUTPUT_TOKENS * cells)
+        n += 1
+        tokens_in += estimate_tokens(prompt)
+        tokens_out += min(out, cap) if cap else out
+        latency += seen.get(f"{kind}_latency", DEFAULT_LATENCY)
+    rate = concurrency / (latency / n) if n else 0.0   # 호출/초 (동시성 한도)
+    if rpm:
+        rate = min(rate, rpm / 60)
+    if tpm and n:
+        rate = min(rate, tpm / 60 / ((tokens_in + tokens_out) / n))
+    return {"calls": n, "input_tokens": tokens_in, "output_tokens": round(tokens_out),
+            "cost_usd": round(cost_of(price, tokens_in, tokens_out), 4),
+            "eta_s": round(n / rate, 1) if rate else 0.0,
+            "observed": bool(seen)}
+
+
+def format_plan(plan: Dict[str, Any]) -> str:
+    eta = plan["eta_s"]
+    return (f"[Dry run] calls {plan['calls']}, tokens in {plan['input_tokens']} / out {plan['output_tokens']}"
+            f" ({'observed' if plan['observed'] else 'default'} output length), cost ${plan['cost_usd']:.4f},"
+            f" ETA {int(eta // 3600)}h {int(eta % 3600 // 60)}m {int(eta % 60)}s")
+
+
+def persona_range(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    """'1-2000' → (1, 2000)"""
+    if not spec:
+        return None
+    lo, _, hi = spec.partition("-")
+    return int(lo), int(hi or lo)
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_budget_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--budget-usd", type=float, default=0.0, help="이번 실행의 비용 상한 (USD, 0 = 없음)")
+    ap.add_argument("--budget-tokens", type=int, default=0, help="이번 실행의 토큰 상한 (입력 + 출력, 0 = 없음)")
+    ap.add_argument("--lang-budget-usd", type=float, default=0.0,
+                    help="같은 언어의 모든 실행 합계 비용 상한 (budget.db 장부 기준, 0 = 없음)")
+    ap.add_argument("--budget-mode", choices=["stop", "throttle"], default="stop",
+                    help="상한에 닿으면 멈춤(stop) 또는 --budget-window 창의 지출이 줄 때까지 대기(throttle)")
+    ap.add_argument("--budget-window", type=float, default=0.0, help="throttle 모드의 지출 창 (초)")
+    ap.add_argument("--budget-db", type=Path, help="지출 장부 파일 (기본: 결과 로그 폴더의 budget.db)")
+    ap.add_argument("--price-in", type=float, help="입력 USD / 1M 토큰 (기본: 모델 가격표)")
+    ap.add_argument("--price-out", type=float, help="출력 USD / 1M 토큰 (기본: 모델 가격표)")
+    ap.add_argument("--dry-run", action="store_true",
+                    help="아무것도 보내지 않고 호출 수 / 토큰 / 비용 / 예상 시간만 출력")
+    ap.add_argument("--persona-range", help="대상 페르소나 idx 범위 (예: 1-2000)")
+
+
+def price_from_args(args: argparse.Namespace, model: str) -> Tuple[float, float]:
+    base = PRICES.get(model, (0.0, 0.0))
+    return (args.price_in if args.price_in is not None else base[0],
+            args.price_out if args.price_out is not None else base[1])
+
+
+def budget_from_args(args: argparse.Namespace, lang: str, model: str, out_dir: Path) -> Optional[RunBudget]:
+    if not (args.budget_usd or args.budget_tokens or args.lang_budget_usd):
+        return None
+    return RunBudget(lang, price_from_args(args, model), args.budget_usd, args.budget_tokens,
+                     args.lang_budget_usd, args.budget_mode, args.budget_window,
+                     args.budget_db or Path(out_dir) / BUDGET_FILE)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+실행 매니페스트 (SQLite)
+------------------------------------------------
+(언어, 설정, 반복, idx, 난이도, 시나리오) 셀마다 상태를 기록한다.
+  state       : pending / ok / error / skipped (적응 표본 추출이 셀을 닫아 보내지 않은 페르소나)
+  error_class : quota / unavailable / safety / parse / timeout / empty / other
+  attempts    : 응답(성공/실패)을 받은 횟수
+--rerun-missing / --rerun-problems 는 결과 디렉터리를 훑는 대신 이 DB 를 인덱스로 조회한다.
+
+이미 존재하는 결과로부터 매니페스트 재구축
+  python run_manifest.py rebuild --db <manifest.db> --log <결과 로그 디렉터리>
+  python run_manifest.py rebuild --db <manifest.db> --files <Person_*.json 폴더> --lang EN --config pre
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from llm_backend import classify_error
+
+MANIFEST_FILE = "manifest.db"
+CellKey = Tuple[int, int, str, int]  # (repeat, idx, difficulty, scenario)
+CellSet = Dict[Tuple[int, int], Set[Tuple[str, int]]]  # (repeat, idx) → {(difficulty, scenario)}
+_UPSERT = " ON CONFLICT (lang, config, repeat, idx, difficulty, scenario) DO UPDATE SET "
+# 다시 실행할 셀: error 이거나, 같은 (repeat, idx) 의 다른 셀은 기록됐는데 pending 으로 남은 셀
+# (셀 단위 재실행 / 배치 내보내기가 중간에 끊기면 missing() 에도 잡히지 않으므로 여기서 잡는다)
+_PROBLEM = (" AND (state = 'error' OR (state = 'pending' AND EXISTS (SELECT 1 FROM cells o"
+            " WHERE o.lang = cells.lang AND o.config = cells.config AND o.repeat = cells.repeat"
+            " AND o.idx = cells.idx AND o.state != 'pending')))")
+
+
+def cell_state(r: Any) -> Tuple[str, Optional[str], Optional[str]]:
+    """응답 하나를 (state, error_class, error 메시지) 로 변환"""
+    if isinstance(r, Exception):
+        return "error", classify_error(r), str(r)
+    # logprob / 선택 전용 응답은 reasoning 없이 선택(확률)만 가진다
+    if not isinstance(r, dict) or not r.get("choice") or not (
+            r.get("reasoning") or r.get("p_left") is not None or r.get("choice_only")):
+        return "error", "empty", None
+    return "ok", None, None
+
+
+def select_cells(payloads: List[Dict[str, Any]], meta: List[Dict[str, Any]],
+                 wanted: Optional[Set[Tuple[str, int]]]
+                 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """build_payloads 결과 중 wanted 셀 (difficulty, scenario) 만 남긴다 (None 이면 전부)"""
+    if wanted is None:
+        return payloads, meta
+    keep = [i for i, m in enumerate(meta) if (m["difficulty"], m["scenario_idx"] + 1) in wanted]
+    return [payloads[i] for i in keep], [meta[i] for i in keep]
+
+
+def row_state(row: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str]]:
+    """결과 로그 row / 레거시 파일 셀을 (state, error_class, error) 로 변환"""
+    if row.get("error") is not None:
+        return "error", classify_error(row["error"]), row["error"]
+    if not row.get("answer") or not (row.get("thought") or row.get("p_left") is not None
+                                     or row.get("has_reasoning") is False):
+        return "error", "empty", None
+    return "ok", None, None
+
+
+class RunManifest:
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(str(path), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cells ("
+            " lang TEXT, config TEXT, repeat INTEGER, idx INTEGER,"
+            " difficulty TEXT, scenario INTEGER,"
+            " state TEXT NOT NULL, error_class TEXT, error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0, updated REAL,"
+            " PRIMARY KEY (lang, config, repeat, idx, difficulty, scenario))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cells_state ON cells(lang, config, state)")
+        self._conn.commit()
+
+    # ---------- 기록 ---------- #
+    def mark_pending(self, lang: str, config: str, cells: Iterable[CellKey]) -> None:
+        """실행 직전 셀을 pending 으로 등록 (이미 있는 셀은 state 를 pending 으로, 이전 오류는 지운다)"""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO cells (lang, config, repeat, idx, difficulty, scenario, state, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)"
+            + _UPSERT + "state = 'pending', error_class = NULL, error = NULL, updated = excluded.updated",
+            [(lang, config, r, i, d, s, now) for r, i, d, s in cells],
+        )
+        self._conn.commit()
+
+    def mark_skipped(self, lang: str, config: str, cells: Iterable[CellKey]) -> None:
+        """적응 표본 추출이 보내지 않은 셀 (이미 기록이 있는 셀은 그대로 둔다)"""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO cells (lang, config, repeat, idx, difficulty, scenario, state, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, 'skipped', ?)"
+            " ON CONFLICT (lang, config, repeat, idx, difficulty, scenario) DO NOTHING",
+            [(lang, config, r, i, d, s, now) for r, i, d, s in cells],
+        )
+        self._conn.commit()
+
+    def _upsert(self, lang: str, config: str, items: List[Tuple[CellKey, Tuple]], attempts: int = 1) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO cells (lang, config, repeat, idx, difficulty, scenario,"
+            " state, error_class, error, attempts, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            + _UPSERT + "state = excluded.state, error_class = excluded.error_class,"
+            " error = excluded.error, attempts = attempts + excluded.attempts, updated = excluded.updated",
+            [(lang, config, r, i, d, s, st, ec, err, attempts, now)
+             for (r, i, d, s), (st, ec, err) in items],
+        )
+        self._conn.commit()
+
+    def record_persona(self, lang: str, config: str, repeat: int, idx: int,
+                       resps: List[Any], meta: List[Dict[str, Any]]) -> None:
+        self._upsert(lang, config, [
+            ((repeat, int(idx), m["difficulty"], m["scenario_idx"] + 1), cell_state(r))
+            for m, r in zip(meta, resps)
+        ])
+
+    # ---------- 조회 ---------- #
+    def repeats(self, lang: str, config: str) -> List[int]:
+        return [r for (r,) in self._conn.execute(
+            "SELECT DISTINCT repeat FROM cells WHERE lang = ? AND config = ? ORDER BY repeat",
+            (lang, config))]
+
+    def done_idx(self, lang: str, config: str, repeat: Optional[int] = None,
+                 skipped: bool = True) -> Set[int]:
+        """응답(ok/error)이 기록된 idx (skipped=True 면 적응 표본 추출이 건너뛴 idx 도)"""
+        q = "SELECT DISTINCT idx FROM cells WHERE lang = ? AND config = ? AND state != 'pending'"
+        if not skipped:
+            q += " AND state != 'skipped'"
+        args: List[Any] = [lang, config]
+        if repeat is not None:
+            q += " AND repeat = ?"
+            args.append(repeat)
+        return {i for (i,) in self._conn.execute(q, args)}
+
+    def done_units(self, lang: str, config: str) -> Set[Tuple[int, int]]:
+        """응답(ok/error)이 기록된 (repeat, idx) — 적응 표본 추출을 이어서 할 때 다시 보내지 않을 단위"""
+        return {(r, i) for r, i in self._conn.execute(
+            "SELECT DISTINCT repeat, idx FROM cells WHERE lang = ? AND config = ?"
+            " AND state NOT IN ('pending', 'skipped')", (lang, config))}
+
+    def ok_cells(self, lang: str, config: str) -> Set[CellKey]:
+        """ok 로 기록된 셀 (플랜 실행을 이어서 할 때 건너뛸 셀)"""
+        return {(r, i, d, sc) for r, i, d, sc in self._conn.execute(
+            "SELECT repeat, idx, difficulty, scenario FROM cells WHERE lang = ? AND config = ? AND state = 'ok'",
+            (lang, config))}
+
+    def missing(self, lang: str, config: str, all_idx: Iterable[int],
+                repeat: Optional[int] = None) -> List[int]:
+        return sorted(set(all_idx) - self.done_idx(lang, config, repeat))
+
+    def problems(self, lang: str, config: str, repeat: Optional[int] = None) -> List[int]:
+        q = "SELECT DISTINCT idx FROM cells WHERE lang = ? AND config = ?" + _PROBLEM
+        args: List[Any] = [lang, config]
+        if repeat is not None:
+            q += " AND repeat = ?"
+            args.append(repeat)
+        return sorted(i for (i,) in self._conn.execute(q, args))
+
+    def problem_cells(self, lang: str, config: str, repeat: Optional[int] = None) -> CellSet:
+        """실패한 셀(과 재실행이 끊겨 pending 으로 남은 셀)만 (repeat, idx) 별로 묶어서 돌려준다 (셀 단위 재실행용)"""
+        q = "SELECT repeat, idx, difficulty, scenario FROM cells WHERE lang = ? AND config = ?" + _PROBLEM
+        args: List[Any] = [lang, config]
+        if repeat is not None:
+            q += " AND repeat = ?"
+            args.append(repeat)
+        out: CellSet = {}
+        for r, i, d, sc in self._conn.execute(q, args):
+            out.setdefault((r, i), set()).add((d, sc))
+        return out
+
+    def summary(self, lang: Optional[str] = None, config: Optional[str] = None) -> Dict[str, int]:
+        q = "SELECT state, COALESCE(error_class, ''), COUNT(*) FROM cells WHERE 1 = 1"
+        args: List[Any] = []
+        if lang:
+            q += " AND lang = ?"
+            args.append(lang)
+        if config:
+            q += " AND config = ?"
+            args.append(config)
+        out: Dict[str, int] = {}
+        for st, ec, n in self._conn.execute(q + " GROUP BY state, error_class", args):
+            out[f"{st}:{ec}" if ec else st] = n
+        return out
+
+    # ---------- 재구축 ---------- #
+    def clear(self, lang: str, config: str) -> None:
+        self._conn.execute("DELETE FROM cells WHERE lang = ? AND config = ?", (lang, config))
+        self._conn.commit()
+
+    def rebuild_from_log(self, log_root: Path) -> int:
+        from results_log import load_cells
+
+        by_run: Dict[Tuple[str, str], List[Tuple[CellKey, Tuple]]] = {}
+        for key, row in load_cells(log_root).items():
+            lang, config, r, i, d, s = key
+            by_run.setdefault((lang, config), []).append(((r, i, d, s), row_state(row)))
+        for (lang, config), items in by_run.items():
+            self.clear(lang, config)
+            self._upsert(lang, config, items)
+        return sum(len(v) for v in by_run.values())
+
+    def rebuild_from_files(self, out_dir: Path, lang: str, config: str) -> int:
+        """레거시 Person_*.json 폴더 (Temp{r}/ 하위 폴더 포함) 로부터 재구축"""
+        items: List[Tuple[CellKey, Tuple]] = []
+        dirs = sorted(p for p in Path(out_dir).glob("Temp*") if p.is_dir()) or [Path(out_dir)]
+        for d in dirs:
+            m = re.fullmatch(r"Temp(\d+)", d.name)
+            repeat = int(m.group(1)) if m else 1
+            for f in d.glob("Person_*.json"):
+                digits = re.findall(r"\d+", f.stem)
+                if not digits:
+                    continue
+                idx = int(digits[-1])
+                try:
+                    data = json.loads(f.read_text(encoding="utf-8"))
+                except Exception:
+                    continue  # 깨진 파일은 missing 으로 남겨 재실행 대상이 되게 한다
+                for diff, scs in data.items():
+                    for name, sc in scs.items():
+                        s = int(name.rsplit("_", 1)[-1])
+                        items.append(((repeat, idx, diff, s), row_state(sc)))
+        self.clear(lang, config)
+        self._upsert(lang, config, items)
+        return len(items)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Run manifest utilities")
+    ap.add_argument("command", choices=["rebuild", "summary"])
+    ap.add_argument("--db", type=Path, required=True, help="매니페스트 파일")
+    ap.add_argument("--log", type=Path, help="결과 로그 디렉터리로부터 재구축")
+    ap.add_argument("--files", type=Path, help="레거시 Person_*.json 폴더로부터 재구축")
+    ap.add_argument("--lang", help="EN | KR | AR (--files 사용 시 필수)")
+    ap.add_argument("--config", help="pre | main (--files 사용 시 필수)")
+    args = ap.parse_args()
+
+    manifest = RunManifest(args.db)
+    if args.command == "summary":
+        print(json.dumps(manifest.summary(args.lang, args.config), indent=2))
+    elif args.log:
+        print(f"[✓] Rebuilt {manifest.rebuild_from_log(args.log)} cells ← {args.log}")
+    elif args.files and args.lang and args.config:
+        print(f"[✓] Rebuilt {manifest.rebuild_from_files(args.files, args.lang, args.config)} cells ← {args.files}")
+    else:
+        raise ValueError("--log 또는 --files/--lang/--config 를 지정하세요.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+실행 계측 (호출 단위 지연 / 토큰 / 재시도 / 오류 분류)
+------------------------------------------------
+엔진이 API 호출마다 observe_call, 재시도마다 observe_retry, 셀이 끝날 때 observe_cell 을 부른다.
+모든 값은 (lang, config) 아래 (difficulty, metric) 별로 나뉘어 쌓이고,
+  - metrics.json / metrics.prom : interval 초마다 덮어쓰는 스냅샷 (JSON / Prometheus textfile)
+  - run_report-<시각>.txt        : 실행이 끝날 때(중단 포함) 남기는 요약 보고서
+를 결과 로그 폴더에 쓴다. 대기 시간(리미터 / 백오프)도 합산해 긴 실행이 시간과 쿼터를 어디에 썼는지 보여 준다.
+
+  python run_metrics.py show --dir <결과 로그 폴더>
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)  # 초, 마지막 칸 = +Inf
+METRICS_JSON = "metrics.json"
+METRICS_PROM = "metrics.prom"
+PROM_PREFIX = "digb_llm"
+
+Key = Tuple[str, str]  # (difficulty, metric)
+
+
+def _quantile(hist: List[int], q: float) -> float:
+    """히스토그램에서 q 분위가 들어 있는 칸의 상한 (+Inf 칸이면 마지막 유한 상한)"""
+    total = sum(hist)
+    if not total:
+        return 0.0
+    seen = 0
+    for bound, n in zip(LATENCY_BUCKETS + (LATENCY_BUCKETS[-1],), hist):
+        seen += n
+        if seen >= q * total:
+            return bound
+    return LATENCY_BUCKETS[-1]
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class RunMetrics:
+    def __init__(self, lang: str, config: str, out_dir: Optional[Path] = None, interval: float = 30.0,
+                 arm: str = ""):
+        self.lang = lang
+        self.config = config
+        self.arm = arm  # multi_run 의 (모델@temperature) — 없으면 빈 문자열
+        self.out_dir = Path(out_dir) if out_dir else None
+        self.interval = interval
+        self.started = time.time()
+        self._last_flush = self.started
+        self.calls: Dict[Key, Counter] = defaultdict(Counter)      # calls / input_tokens / output_tokens / latency_sum
+        self.hist: Dict[Key, List[int]] = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.errors: Dict[Key, Counter] = defaultdict(Counter)     # 실패한 호출의 오류 분류
+        self.retries: Dict[Key, Counter] = defaultdict(Counter)    # 오류 분류별 재시도 횟수
+        self.cells: Dict[Key, Counter] = defaultdict(Counter)      # 셀 최종 결과 (ok / 오류 분류)
+        self.waits: Counter = Counter()                            # limiter / backoff 대기 초 합계
+
+    # ---------- 기록 ---------- #
+    def observe_call(self, key: Key, latency: float, input_tokens: int = 0, output_tokens: int = 0,
+                     error: Optional[str] = None) -> None:
+        c = self.calls[key]
+        c.update(calls=1, input_tokens=input_tokens, output_tokens=output_tokens)
+        c["latency_sum"] += latency
+        h = self.hist[key]
+        h[next((i for i, b in enumerate(LATENCY_BUCKETS) if latency <= b), len(LATENCY_BUCKETS))] += 1
+        if error is not None:
+            self.errors[key][error] += 1
+
+    def observe_wait(self, kind: str, seconds: float) -> None:
+        self.waits[kind] += seconds
+
+    def observe_retry(self, key: Key, error: str, delay: float) -> None:
+        self.retries[key][error] += 1
+        self.waits["backoff"] += delay
+
+    def observe_cell(self, key: Key, outcome: str) -> None:
+        self.cells[key][outcome] += 1
+
+    # ---------- 스냅샷 ---------- #
+    def snapshot(self) -> Dict[str, Any]:
+        keys = sorted(set(self.calls) | set(self.cells))
+        series = []
+        for k in keys:
+            c, h = self.calls.get(k, Counter()), self.hist.get(k, [0] * (len(LATENCY_BUCKETS) + 1))
+            series.append({
+                "difficulty": k[0], "metric": k[1],
+                "calls": c["calls"], "input_tokens": c["input_tokens"], "output_tokens": c["output_tokens"],
+                "latency_mean": round(c["latency_sum"] / c["calls"], 4) if c["calls"] else 0.0,
+                "latency_p50": _quantile(h, 0.5), "latency_p95": _quantile(h, 0.95),
+                "latency_buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], h)),
+                "errors": dict(self.errors.get(k, {})), "retries": dict(self.retries.get(k, {})),
+                "cells": dict(self.cells.get(k, {})),
+            })
+        total = Counter()
+        for c in self.calls.values():
+            total.update(c)
+        cells = Counter()
+        for c in self.cells.values():
+            cells.update(c)
+        return {
+            "lang": self.lang, "config": self.config, "arm": self.arm, "started": self.started,
+            "elapsed_s": round(time.time() - self.started, 1),
+            "calls": total["calls"], "input_tokens": total["input_tokens"], "output_tokens": total["output_tokens"],
+            "api_seconds": round(total["latency_sum"], 1),
+            "wait_seconds": {k: round(v, 1) for k, v in self.waits.items()},
+            "cells": dict(cells), "series": series,
+        }
+
+    def prometheus(self) -> str:
+        base = f'lang="{self.lang}",config="{self.config}"' + (f',arm="{self.arm}"' if self.arm else "")
+        lines = [f"# HELP {PROM_PREFIX}_request_seconds API call latency",
+                 f"# TYPE {PROM_PREFIX}_request_seconds histogram"]
+        for (d, m), h in sorted(self.hist.items()):
+            lab = f'{base},difficulty="{d}",metric="{m}"'
+            acc = 0
+            for b, n in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], h):
+                acc += n
+                lines.append(f'{PROM_PREFIX}_request_seconds_bucket{{{lab},le="{b}"}} {acc}')
+            lines.append(f"{PROM_PREFIX}_request_seconds_sum{{{lab}}} {self.calls[(d, m)]['latency_sum']:.3f}")
+            lines.append(f"{PROM_PREFIX}_request_seconds_count{{{lab}}} {self.calls[(d, m)]['calls']}")
+
+        def counter(name: str, help_: str, rows: Dict[Key, Counter], label: str) -> None:
+            lines.extend([f"# HELP {PROM_PREFIX}_{name} {help_}", f"# TYPE {PROM_PREFIX}_{name} counter"])
+            for (d, m), c in sorted(rows.items()):
+                for v, n in sorted(c.items()):
+                    lines.append(f'{PROM_PREFIX}_{name}{{{base},difficulty="{d}",metric="{m}",{label}="{v}"}} {n}')
+
+        counter("tokens_total", "Tokens sent/received",
+                {k: Counter(input=c["input_tokens"], output=c["output_tokens"]) for k, c in self.calls.items()},
+                "direction")
+        counter("errors_total", "Failed API calls by error class", self.errors, "class")
+        counter("retries_total", "Cell retries by error class", self.retries, "class")
+        counter("cells_total", "Finished cells by outcome", self.cells, "outcome")
+        lines.extend([f"# HELP {PROM_PREFIX}_wait_seconds_total Time spent waiting (task-seconds)",
+                      f"# TYPE {PROM_PREFIX}_wait_seconds_total counter"])
+        for kind, v in sorted(self.waits.items()):
+            lines.append(f'{PROM_PREFIX}_wait_seconds_total{{{base},kind="{kind}"}} {v:.3f}')
+        return "\n".join(lines) + "\n"
+
+    # ---------- 내보내기 ---------- #
+    def flush(self) -> None:
+        self._last_flush = time.time()
+        if self.out_dir is None:
+            return
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        _atomic_write(self.out_dir / METRICS_JSON, json.dumps(self.snapshot(), ensure_ascii=False, indent=2))
+        _atomic_write(self.out_dir / METRICS_PROM, self.prometheus())
+
+    def maybe_flush(self) -> None:
+        if self.interval and time.time() - self._last_flush >= self.interval:
+            self.flush()
+
+    def report(self) -> str:
+        return format_report(self.snapshot())
+
+    def close(self) -> Optional[Path]:
+        """마지막 스냅샷과 보고서를 쓰고 보고서를 출력한다."""
+        self.flush()
+        text = self.report()
+        print(text)
+        if self.out_dir is None:
+            return None
+        path = self.out_dir / f"run_report-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}.txt"
+        path.write_text(text, encoding="utf-8")
+        return path
+
+
+def format_report(snap: Dict[str, Any]) -> str:
+    arm = f" / {snap['arm']}" if snap.get("arm") else ""
+    lines = [f"[Run report] {snap['lang']} / {snap['config']}{arm}  elapsed {snap['elapsed_s']}s",
+             f"  calls {snap['calls']}, tokens in {snap['input_tokens']} / out {snap['output_tokens']}, "
+             f"API {snap['api_seconds']} task-s, waits {snap['wait_seconds']}",
+             f"  cells {snap['cells']}",
+             f"  {'difficulty':<12}{'metric':<12}{'calls':>8}{'p50':>7}{'p95':>7}{'mean':>8}"
+             f"{'in_tok':>10}{'out_tok':>9}  retries / errors"]
+    for s in snap["series"]:
+        lines.append(f"  {s['difficulty']:<12}{s['metric']:<12}{s['calls']:>8}{s['latency_p50']:>7}"
+                     f"{s['latency_p95']:>7}{s['latency_mean']:>8}{s['input_tokens']:>10}{s['output_tokens']:>9}"
+                     f"  {s['retries'] or '-'} / {s['errors'] or '-'}")
+    return "\n".join(lines)
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_metrics_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--metrics-interval", type=float, default=30.0,
+                    help="metrics.json / metrics.prom 스냅샷을 덮어쓰는 주기 (초, 0 = 끝날 때만)")
+
+
+def metrics_from_args(args: argparse.Namespace, lang: str, out_dir: Path) -> RunMetrics:
+    return RunMetrics(lang, args.config, out_dir, args.metrics_interval)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser("Run metrics")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show", help="마지막 스냅샷(metrics.json)을 보고서 형식으로 출력")
+    p.add_argument("--dir", type=Path, required=True)
+    a = ap.parse_args()
+    print(format_report(json.loads((a.dir / METRICS_JSON).read_text(encoding="utf-8"))))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+스트리밍 응답 파서 ({"reasoning": ..., "choice": ...} 스키마)
+------------------------------------------------
+ChoiceStreamParser 는 스트림 조각을 받을 때마다 버퍼를 이어 붙이고,
+"choice": "Left" | "Right" 가 완성되는 즉시 choice 를 확정한다.
+선택 전용 셀은 이 시점에 스트림을 끊어 남은 출력 토큰을 아낀다 (엔진의 stream 모드).
+
+salvage_choice 는 잘리거나 살짝 깨진 응답(닫는 괄호 누락, 코드 블록, 따옴표 없는 값 등)에서
+정규식으로 choice / reasoning 을 건져 낸다. 엔진은 JSON 파서가 실패했을 때 API 를 다시 부르기 전에 이것을 쓴다.
+"""
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+from llm_backend import CHOICES
+
+_CHOICE_DONE = re.compile(r'"choice"\s*:\s*"(Left|Right)"')
+_CHOICE_LOOSE = re.compile(r'["\']?choice["\']?\s*[:=]\s*["\']?\s*(left|right)\b', re.I)
+_REASONING = re.compile(r'"reasoning"\s*:\s*"((?:[^"\\]|\\.)*)', re.S)
+_BARE = re.compile(r'^\W*(left|right)\W*$', re.I)
+
+
+def _unescape(s: str) -> str:
+    s = s.rstrip("\\")  # 이스케이프 중간에서 잘린 경우
+    try:
+        return json.loads(f'"{s}"')
+    except ValueError:
+        return s
+
+
+def salvage_choice(text: str) -> Optional[Dict[str, Any]]:
+    """choice 를 찾을 수 있으면 {"reasoning", "choice"} (reasoning 은 찾은 만큼, 없으면 ""), 못 찾으면 None"""
+    # 정확한 "choice": "Left" 형태를 먼저 찾아 reasoning 본문 속 표현에 속지 않도록 한다
+    m = _CHOICE_DONE.search(text) or _CHOICE_LOOSE.search(text) or _BARE.match(text)
+    if m is None:
+        return None
+    choice = CHOICES[0] if m.group(1).lower() == "left" else CHOICES[1]
+    r = _REASONING.search(text)
+    return {"reasoning": _unescape(r.group(1)).strip() if r else "", "choice": choice}
+
+
+class ChoiceStreamParser:
+    """스트림 조각을 feed 하면서 choice 가 확정되는 시점을 알려 준다."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.choice: Optional[str] = None
+        self._scanned = 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """조각을 추가하고, 이번 조각으로 choice 가 확정되면 그 값을 돌려준다."""
+        self.buffer += chunk
+        if self.choice is None:
+            # 조각 경계에 걸친 키를 놓치지 않도록 이전 검사 위치보다 조금 앞에서 다시 찾는다
+            m = _CHOICE_DONE.search(self.buffer, max(0, self._scanned - 32))
+            self._scanned = len(self.buffer)
+            if m is not None:
+                self.choice = m.group(1)
+                return self.choice
+        return None
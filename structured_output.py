@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+네이티브 구조화 출력(response schema) 모드
+------------------------------------------------
+자유 형식 JSON 을 JsonOutputParser 로 파싱하는 대신, 모델의 JSON 모드에 응답 스키마를 넘겨
+choice 를 "Left" | "Right" enum 으로 제한한다 (파싱 실패 → 재시도가 사라짐).
+언어별 템플릿은 reasoning 설명과 선택지 이름(왼쪽/오른쪽, اليسار/اليمين)만 다르고 같은 enum 으로 매핑된다.
+
+스키마 종류 (엔진의 schemas 키)
+  - cell   : {"reasoning", "choice"}         (단일 셀)
+  - choice : {"choice"}                      (--choice-only 의 선택 전용 셀, --logprobs)
+  - packed : [{"scenario", "reasoning", "choice"}, ...]  (--packed)
+
+  python (en|kr|ar)_run.py --config pre --all --structured
+"""
+
+import argparse
+import json
+from typing import Any, Dict, Optional
+
+from llm_backend import CHOICES
+
+Schema = Dict[str, Any]
+
+
+def cell_schema(reasoning_desc: Optional[str] = None, choice_desc: Optional[str] = None) -> Schema:
+    """reasoning_desc 가 None 이면 choice 만 있는 스키마"""
+    props: Schema = {}
+    if reasoning_desc is not None:
+        props["reasoning"] = {"type": "string", "description": reasoning_desc}
+    props["choice"] = {"type": "string", "enum": list(CHOICES)}
+    if choice_desc:
+        props["choice"]["description"] = choice_desc
+    # 속성 선언 순서대로 생성되므로 reasoning 을 먼저 쓰고 choice 를 고르게 된다
+    return {"type": "object", "properties": props, "required": list(props)}
+
+
+def packed_schema(reasoning_desc: str, choice_desc: Optional[str] = None) -> Schema:
+    item = cell_schema(reasoning_desc, choice_desc)
+    item["properties"] = {"scenario": {"type": "integer"}, **item["properties"]}
+    item["required"] = list(item["properties"])
+    return {"type": "array", "items": item}
+
+
+def schemas_for(reasoning_desc: str, choice_desc: Optional[str] = None,
+                logprobs: bool = False) -> Dict[str, Schema]:
+    """러너의 템플릿 설명으로 엔진에 넘길 스키마 묶음을 만든다 (logprob 모드는 단일 셀도 choice 만)"""
+    choice = cell_schema(None, choice_desc)
+    return {"cell": choice if logprobs else cell_schema(reasoning_desc, choice_desc),
+            "choice": choice,
+            "packed": packed_schema(reasoning_desc, choice_desc)}
+
+
+def conforms(obj: Any, schema: Schema) -> bool:
+    """스텁/검증용 최소 스키마 검사 (type / enum / required / items 만)"""
+    t = schema.get("type")
+    if t == "object":
+        if not isinstance(obj, dict) or any(k not in obj for k in schema.get("required", [])):
+            return False
+        return all(conforms(obj[k], s) for k, s in schema.get("properties", {}).items() if k in obj)
+    if t == "array":
+        return isinstance(obj, list) and all(conforms(x, schema.get("items", {})) for x in obj)
+    if t == "string":
+        return isinstance(obj, str) and ("enum" not in schema or obj in schema["enum"])
+    if t == "integer":
+        return isinstance(obj, int) and not isinstance(obj, bool)
+    return True
+
+
+class SchemaParser:
+    """스키마로 제한된 응답은 이미 올바른 JSON 이므로 json.loads 만 한다 (JsonOutputParser 생략)"""
+
+    def parse(self, text: str) -> Any:
+        return json.loads(text)
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_structured_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--structured", action="store_true",
+                    help="모델의 JSON 모드 + 응답 스키마(choice = Left|Right enum)로 출력을 제한")
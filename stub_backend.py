@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+로컬 스텁 백엔드 (API 호출 없음)
+------------------------------------------------
+GeminiBackend 와 같은 인터페이스(agenerate / astream / agenerate_n / agenerate_logprobs)를 제공한다.
+시나리오마다 sha256 으로 정해지는 P(Left) 를 가지며 (출력 형식 지시문은 제외하고 계산하므로
+reasoning 을 묻는 프롬프트와 선택만 묻는 프롬프트가 같은 확률을 공유한다),
+  - agenerate       : 그 확률로 Left/Right 를 샘플링한 {"reasoning", "choice"} JSON
+                      (프롬프트가 reasoning 을 묻지 않으면 {"choice"} 만,
+                       "### " 로 시작하는 시나리오 항목이 나열된 묶음 프롬프트면 항목마다 원소 하나인 배열)
+  - astream         : agenerate 와 같은 텍스트를 STREAM_CHUNK 글자씩 나눠 흘려보냄
+  - agenerate_logprobs : {"choice": ...} 와 선택 토큰 위치의 Left/Right logprob
+를 돌려준다. 같은 프롬프트의 n 번째 호출은 항상 같은 결과라 실행이 재현 가능하다.
+schema(응답 스키마)를 넘기면 스키마의 속성만으로 응답을 만든다 (choice 는 enum 안에서 샘플링,
+배열 스키마는 "### " 로 시작하는 시나리오 항목마다 원소 하나).
+
+  python en_run.py --config pre --all --backend stub
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from llm_backend import CHOICES, Completion, LOGPROB_TOP_K, estimate_tokens
+from packed_mode import SCENARIO_KEY
+
+
+STREAM_CHUNK = 8  # 스트림 조각 하나의 글자 수
+
+
+class StubBackend:
+    max_candidates = 8
+
+    def __init__(self, model: str = "stub", temperature: float = 1, p_left: Optional[float] = None,
+                 seed: int = 0, latency: float = 0.0):
+        self.model = model
+        self.temperature = temperature
+        self.p_left_fixed = p_left
+        self.seed = seed
+        self.latency = latency
+        self._calls: Counter = Counter()  # 프롬프트별 호출 횟수 (샘플링 시드)
+
+    def p_left(self, prompt: str) -> float:
+        if self.p_left_fixed is not None:
+            return self.p_left_fixed
+        scenario = prompt.split("{", 1)[0]  # JSON 출력 형식 지시문 앞부분
+        h = hashlib.sha256(f"{self.seed}:{scenario}".encode("utf-8")).digest()
+        return 0.05 + 0.9 * int.from_bytes(h[:4], "big") / 2 ** 32
+
+    def _sample(self, prompt: str) -> str:
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        rng = random.Random(f"{self.seed}:{key}:{self._calls[key]}")
+        self._calls[key] += 1
+        return CHOICES[0] if rng.random() < self.p_left(prompt) else CHOICES[1]
+
+    @staticmethod
+    def _items(prompt: str) -> List[str]:
+        """묶음 프롬프트의 시나리오 항목들 ("### " 로 시작하는 줄마다 하나)"""
+        return re.split(r"^### ", prompt, flags=re.M)[1:]
+
+    def _fill(self, schema: Dict[str, Any], prompt: str, n: int = 1) -> Any:
+        """스키마를 따르는 값. 시나리오 n 번째 항목의 선택은 그 항목 텍스트로 샘플링한다."""
+        t = schema.get("type")
+        if t == "array":
+            items = self._items(prompt) or [prompt]
+            return [self._fill(schema.get("items", {}), item, i) for i, item in enumerate(items, 1)]
+        if t == "object":
+            return {k: self._fill(s, prompt, n) if k != "scenario" else n
+                    for k, s in schema.get("properties", {}).items()}
+        if "enum" in schema:
+            return self._sample(prompt) if set(schema["enum"]) == set(CHOICES) else schema["enum"][0]
+        return n if t == "integer" else "stub reasoning"
+
+    def _text(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        if schema is not None:
+            return json.dumps(self._fill(schema, prompt))
+        items = self._items(prompt)
+        if items:  # 묶음 프롬프트: 배열 스키마와 같이 항목마다 원소 하나
+            return json.dumps([{SCENARIO_KEY: n, "reasoning": "stub reasoning", "choice": self._sample(item)}
+                               for n, item in enumerate(items, 1)])
+        if '"reasoning"' in prompt:
+            return json.dumps({"reasoning": "stub reasoning", "choice": self._sample(prompt)})
+        return json.dumps({"choice": self._sample(prompt)})
+
+    async def agenerate(self, prompt: str, max_output_tokens: Optional[int] = None,
+                        schema: Optional[Dict[str, Any]] = None) -> Completion:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._text(prompt, schema)
+        return Completion(text, estimate_tokens(prompt), estimate_tokens(text))
+
+    async def astream(self, prompt: str, max_output_tokens: Optional[int] = None,
+                      schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[Completion]:
+        text = self._text(prompt, schema)
+        pieces = [text[i:i + STREAM_CHUNK] for i in range(0, len(text), STREAM_CHUNK)]
+        for i, piece in enumerate(pieces):
+            if self.latency:
+                await asyncio.sleep(self.latency / len(pieces))
+            yield Completion(piece, estimate_tokens(prompt) if i == 0 else 0, estimate_tokens(piece))
+
+    async def agenerate_n(self, prompt: str, n: int, schema: Optional[Dict[str, Any]] = None) -> List[Completion]:
+        comps = [await self.agenerate(prompt, schema=schema) for _ in range(n)]
+        return [c._replace(input_tokens=c.input_tokens if i == 0 else 0) for i, c in enumerate(comps)]
+
+    async def agenerate_logprobs(self, prompt: str, top_k: int = LOGPROB_TOP_K,
+                                 schema: Optional[Dict[str, Any]] = None) -> Completion:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        p = self.p_left(prompt)
+        choice = CHOICES[0] if p >= 0.5 else CHOICES[1]  # 탐욕적 디코딩 결과
+        lp = {CHOICES[0]: math.log(p), CHOICES[1]: math.log(1 - p)}
+        other = CHOICES[1] if choice == CHOICES[0] else CHOICES[0]
+        text = json.dumps({"choice": choice})
+        positions = [[('{"', 0.0)], [("choice", 0.0)], [('":', 0.0)], [(' "', 0.0)],
+                     [(choice, lp[choice]), (other, lp[other])][:top_k], [('"}', 0.0)]]
+        return Completion(text, estimate_tokens(prompt), len(positions), positions)
@@ -32,7 +32,7 @@ for fp in tqdm(json_files, desc="🔍 Parsing JSON"):
             if isinstance(node, dict):
                 if "metric" in node and "thought" in node:
                     metric = node["metric"]
-                    if metric in TARGET_METRICS:
+                    if metric in TARGET_METRICS and node["thought"]:  # 선택 전용 row 는 thought 가 비어 있음
                         thought_pool[metric].append(node["thought"])
                         metric_found_in_file[metric] = True
                         # 디버그 출력
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+공유 작업 큐 (여러 프로세스 / 호스트가 한 실행을 나눠 맡기)
+------------------------------------------------
+(언어, 설정, 반복, idx, 난이도, 시나리오) 셀 하나가 작업 하나다. 큐는 공유 경로의 SQLite 파일 하나이고,
+  queued → leased(worker, lease_id, lease_until) → done | failed
+로 움직인다. 워커는 셀 묶음을 임대(lease)하고, 실행하는 동안 백그라운드 스레드가 주기적으로 임대를 연장(heartbeat)한다.
+워커가 죽으면 heartbeat 가 멈추고 lease_until 이 지난 셀은 다른 워커가 다시 임대한다.
+결과는 임대를 아직 가진 워커만 커밋할 수 있다 (lease_id 가 맞는 leased 셀만 done/failed 로 바뀜).
+늦게 끝난 옛 워커의 결과는 거절되고 결과 로그에도 쓰이지 않으므로 셀마다 결과가 정확히 한 번 커밋된다.
+결과는 임대마다 COMMIT_EVERY 그룹 또는 COMMIT_SECONDS 초씩 모아 임대 전용 작업 스레드에서 한 트랜잭션으로 커밋하고,
+커밋된 셀만 다음 accept / flush 때 호출한 스레드에서 넘긴다 (잠금 대기 / fsync 가 이벤트 루프를 막지 않는다).
+커밋된 row 는 큐에도 남으므로 결과 로그를 잃어도 export 로 다시 만들 수 있다.
+큐 파일은 여러 호스트가 네트워크 파일 시스템으로 함께 열기 때문에, WAL(한 호스트의 공유 메모리 필요) 대신
+롤백 저널(journal_mode=DELETE)을 쓰고 모든 임대 / 커밋을 BEGIN IMMEDIATE 로 잠근다 (파일 잠금을 지원하는 공유 경로 필요).
+
+모든 호스트에서 같은 명령을 실행하면 된다 (셀 등록은 멱등, 큐가 비면 종료).
+  python en_run.py --config pre --repeat 5 --queue //shared/digb/queue.db
+  python ar_run.py --config pre --all --queue //shared/digb/queue.db --queue-batch 300
+  python work_queue.py status  --db queue.db
+  python work_queue.py requeue --db queue.db --lang AR --config pre      # failed 셀을 다시 queued 로
+  python work_queue.py export  --db queue.db --log <결과 로그 디렉터리>
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from results_log import ResultsLog, build_rows
+from run_manifest import CellKey, CellSet, cell_state
+
+LEASE_SECONDS = 300.0   # 임대 기간 (heartbeat 는 이 1/3 간격)
+QUEUE_BATCH = 500       # 한 번에 임대할 셀 수
+IDLE_POLL = 10.0        # 남은 셀이 모두 다른 워커에 임대돼 있을 때 다시 확인하는 간격 (초)
+COMMIT_EVERY = 20       # 결과를 이만큼의 그룹(페르소나)씩 모아 한 트랜잭션으로 커밋
+COMMIT_SECONDS = 5.0    # 가장 오래 기다린 결과가 이만큼 지나면 덜 모여도 커밋
+
+# (그룹의 row 들, 응답, meta, 커밋된 셀을 넘길 함수)
+Accepted = Tuple[List[Dict[str, Any]], List[Any], List[Dict[str, Any]],
+                 Callable[[List[Any], List[Dict[str, Any]]], None]]
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class QueueLease:
+    """임대한 셀 묶음. accept 로 받은 결과를 모아 작업 스레드에서 커밋하고, 커밋된 셀만 deliver 로 넘긴다."""
+
+    def __init__(self, queue: "WorkQueue", lease_id: str, lang: str, config: str, cells: List[CellKey]):
+        self.queue = queue
+        self.lease_id = lease_id
+        self.lang = lang
+        self.config = config
+        self.keys = cells
+        self.cells: CellSet = {}
+        for r, i, d, s in cells:
+            self.cells.setdefault((r, i), set()).add((d, s))
+        self._batch: List[Accepted] = []
+        self._batch_since = 0.0
+        self._commits: Deque[Tuple[Future, List[Accepted]]] = deque()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def accept(self, repeat: int, idx: int, resps: List[Any], meta: List[Dict[str, Any]],
+               deliver: Callable[[List[Any], List[Dict[str, Any]]], None]) -> None:
+        """그룹 하나의 결과를 모은다. 커밋이 끝난 묶음은 (받은 순서대로) 커밋된 셀만 deliver(resps, meta) 로 넘긴다."""
+        rows = build_rows(self.lang, self.config, repeat, idx, resps, meta)
+        self._batch.append((rows, resps, meta, deliver))
+        self._batch_since = self._batch_since or time.time()
+        if len(self._batch) >= COMMIT_EVERY or time.time() - self._batch_since >= COMMIT_SECONDS:
+            self._submit()
+        self._deliver(wait=False)
+
+    def flush(self) -> None:
+        """남은 결과를 커밋하고 모두 넘길 때까지 기다린다 (실행이 끝나거나 멈출 때)"""
+        self._submit()
+        self._deliver(wait=True)
+
+    def close(self) -> None:
+        """넘기지 않은 결과는 버린다 (그 셀은 임대를 되돌리면 다시 queued)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        if self._conn is not None:
+            self._conn.close()
+
+    def _submit(self) -> None:
+        if not self._batch:
+            return
+        batch, self._batch, self._batch_since = self._batch, [], 0.0
+        rows = [row for group_rows, *_ in batch for row in group_rows]
+        states = [cell_state(r)[0] for _, resps, _, _ in batch for r in resps]
+        if self._pool is None:  # 커밋은 순서대로, 임대 전용 연결 하나로
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"commit-{self.lease_id[:8]}")
+            self._conn = self.queue._connect()
+        fut = self._pool.submit(self.queue.commit, self.lease_id, self.lang, self.config, rows, states, self._conn)
+        self._commits.append((fut, batch))
+
+    def _deliver(self, wait: bool) -> None:
+        while self._commits and (wait or self._commits[0][0].done()):
+            fut, batch = self._commits.popleft()
+            ok = iter(fut.result())
+            for _, resps, meta, deliver in batch:
+                keep = [j for j in range(len(resps)) if next(ok)]
+                if keep:
+                    deliver([resps[j] for j in keep], [meta[j] for j in keep])
+
+
+class WorkQueue:
+    def __init__(self, path: Path, worker: Optional[str] = None, batch: int = QUEUE_BATCH,
+                 lease_seconds: float = LEASE_SECONDS):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.worker = worker or worker_id()
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        self.stats: Counter = Counter()  # leases / leased / committed / rejected / reclaimed
+        self._conn = self._connect()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " lang TEXT, config TEXT, repeat INTEGER, idx INTEGER,"
+            " difficulty TEXT, scenario INTEGER,"
+            " state TEXT NOT NULL DEFAULT 'queued', worker TEXT, lease_id TEXT, lease_until REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, row TEXT, updated REAL,"
+            " PRIMARY KEY (lang, config, repeat, idx, difficulty, scenario))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks(lang, config, state)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks(lease_id)")
+        self._conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: BEGIN IMMEDIATE 로 임대 / 커밋을 직접 트랜잭션으로 감싼다
+        conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        # 공유 경로(여러 호스트)에서도 동작하도록 롤백 저널. 커밋마다 디스크까지 써서 임대 / 커밋이 사라지지 않게 한다
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    @contextmanager
+    def _tx(self, conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+        conn = conn or self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ---------- 등록 ---------- #
+    def enqueue(self, lang: str, config: str, cells: Iterable[CellKey]) -> int:
+        """셀을 queued 로 등록 (이미 있는 셀은 그대로 두므로 모든 워커가 같은 목록을 넣어도 된다)"""
+        now = time.time()
+        with self._tx() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (lang, config, repeat, idx, difficulty, scenario, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(lang, config, r, int(i), d, s, now) for r, i, d, s in cells])
+            return conn.total_changes - before
+
+    def requeue(self, lang: str, config: str, states: Tuple[str, ...] = ("failed",)) -> int:
+        with self._tx() as conn:
+            return conn.execute(
+                f"UPDATE tasks SET state = 'queued', worker = NULL, lease_id = NULL, lease_until = NULL,"
+                f" updated = ? WHERE lang = ? AND config = ? AND state IN ({','.join('?' * len(states))})",
+                (time.time(), lang, config, *states)).rowcount
+
+    # ---------- 임대 ---------- #
+    def lease(self, lang: str, config: str, limit: Optional[int] = None) -> Optional[QueueLease]:
+        """queued 셀 또는 임대가 만료된 셀을 (repeat, idx) 순으로 limit 개 임대"""
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        with self._tx() as conn:
+            rows = conn.execute(
+                "SELECT repeat, idx, difficulty, scenario, state FROM tasks"
+                " WHERE lang = ? AND config = ? AND (state = 'queued' OR (state = 'leased' AND lease_until < ?))"
+                " ORDER BY repeat, idx, difficulty, scenario LIMIT ?",
+                (lang, config, now, limit or self.batch)).fetchall()
+            if not rows:
+                return None
+            conn.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_id = ?, lease_until = ?,"
+                " attempts = attempts + 1, updated = ?"
+                " WHERE lang = ? AND config = ? AND repeat = ? AND idx = ? AND difficulty = ? AND scenario = ?",
+                [(self.worker, lease_id, now + self.lease_seconds, now, lang, config, r, i, d, s)
+                 for r, i, d, s, _ in rows])
+        self.stats.update(leases=1, leased=len(rows), reclaimed=sum(st == "leased" for *_, st in rows))
+        return QueueLease(self, lease_id, lang, config, [(r, i, d, s) for r, i, d, s, _ in rows])
+
+    def heartbeat(self, lease_id: str, conn: Optional[sqlite3.Connection] = None) -> int:
+        """아직 커밋하지 않은 임대 셀의 만료 시각을 연장"""
+        with self._tx(conn) as c:
+            return c.execute("UPDATE tasks SET lease_until = ? WHERE lease_id = ? AND state = 'leased'",
+                             (time.time() + self.lease_seconds, lease_id)).rowcount
+
+    def release(self, lease_id: str) -> int:
+        """커밋하지 못한 임대 셀을 queued 로 되돌림 (정상 종료 / 중단 시)"""
+        with self._tx() as conn:
+            return conn.execute(
+                "UPDATE tasks SET state = 'queued', worker = NULL, lease_id = NULL, lease_until = NULL"
+                " WHERE lease_id = ? AND state = 'leased'", (lease_id,)).rowcount
+
+    def commit(self, lease_id: str, lang: str, config: str, rows: List[Dict[str, Any]],
+               states: List[str], conn: Optional[sqlite3.Connection] = None) -> List[bool]:
+        """임대를 가진 셀만 done(ok) / failed(오류) 로 커밋. 셀마다 커밋 여부를 돌려준다."""
+        now = time.time()
+        out = []
+        with self._tx(conn) as conn:
+            for row, st in zip(rows, states):
+                n = conn.execute(
+                    "UPDATE tasks SET state = ?, row = ?, lease_until = NULL, updated = ?"
+                    " WHERE lang = ? AND config = ? AND repeat = ? AND idx = ? AND difficulty = ? AND scenario = ?"
+                    " AND state = 'leased' AND lease_id = ?",
+                    ("done" if st == "ok" else "failed", json.dumps(row, ensure_ascii=False), now,
+                     lang, config, row["repeat"], row["idx"], row["difficulty"], row["scenario"], lease_id)
+                ).rowcount
+                out.append(n == 1)
+        self.stats.update(committed=sum(out), rejected=len(out) - sum(out))
+        return out
+
+    @contextmanager
+    def leased(self, lang: str, config: str) -> Iterator[Optional[QueueLease]]:
+        """임대 하나를 잡고 있는 동안 heartbeat 스레드를 돌리고, 끝나면 남은 셀을 되돌린다"""
+        lease = self.lease(lang, config)
+        if lease is None:
+            yield None
+            return
+        stop = threading.Event()
+
+        def beat() -> None:
+            conn = self._connect()
+            try:
+                while not stop.wait(self.lease_seconds / 3):
+                    self.heartbeat(lease.lease_id, conn)
+            finally:
+                conn.close()
+
+        t = threading.Thread(target=beat, name=f"heartbeat-{lease.lease_id[:8]}", daemon=True)
+        t.start()
+        try:
+            yield lease
+        finally:
+            stop.set()
+            t.join()
+            lease.close()
+            self.release(lease.lease_id)
+
+    def leases(self, lang: str, config: str) -> Iterator[QueueLease]:
+        """큐가 빌 때까지 임대를 하나씩 내준다. 남은 셀이 모두 다른 워커에 임대돼 있으면 만료 / 완료를 기다린다."""
+        while True:
+            with self.leased(lang, config) as lease:
+                if lease is not None:
+                    yield lease
+                    continue
+            counts = self.counts(lang, config)
+            if not counts.get("queued") and not counts.get("leased"):
+                return
+            time.sleep(min(IDLE_POLL, self.lease_seconds))
+
+    # ---------- 조회 ---------- #
+    def counts(self, lang: Optional[str] = None, config: Optional[str] = None) -> Dict[str, int]:
+        q = "SELECT state, COUNT(*) FROM tasks WHERE 1 = 1"
+        args: List[Any] = []
+        if lang:
+            q += " AND lang = ?"
+            args.append(lang)
+        if config:
+            q += " AND config = ?"
+            args.append(config)
+        return dict(self._conn.execute(q + " GROUP BY state", args).fetchall())
+
+    def workers(self) -> Dict[str, int]:
+        """현재 유효한 임대를 가진 워커별 셀 수"""
+        return dict(self._conn.execute(
+            "SELECT worker, COUNT(*) FROM tasks WHERE state = 'leased' AND lease_until >= ? GROUP BY worker",
+            (time.time(),)).fetchall())
+
+    def rows(self, lang: Optional[str] = None, config: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        q = "SELECT row FROM tasks WHERE state IN ('done', 'failed') AND row IS NOT NULL"
+        args: List[Any] = []
+        if lang:
+            q += " AND lang = ?"
+            args.append(lang)
+        if config:
+            q += " AND config = ?"
+            args.append(config)
+        for (row,) in self._conn.execute(q, args):
+            yield json.loads(row)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# ---------- CLI 헬퍼 ---------- #
+def add_queue_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--queue", type=Path,
+                    help="공유 작업 큐 파일 (여러 워커 / 호스트가 같은 실행을 나눠 맡음)")
+    ap.add_argument("--queue-batch", type=int, default=QUEUE_BATCH, help="한 번에 임대할 셀 수")
+    ap.add_argument("--queue-lease", type=float, default=LEASE_SECONDS,
+                    help="임대 기간 (초, heartbeat 가 없으면 이 시간 뒤 다른 워커가 회수)")
+
+
+def queue_from_args(args: argparse.Namespace) -> Optional[WorkQueue]:
+    if not args.queue:
+        return None
+    return WorkQueue(args.queue, batch=args.queue_batch, lease_seconds=args.queue_lease)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Shared work queue utilities")
+    ap.add_argument("command", choices=["status", "requeue", "export"])
+    ap.add_argument("--db", type=Path, required=True, help="큐 파일")
+    ap.add_argument("--lang", help="EN | KR | AR")
+    ap.add_argument("--config", help="pre | main")
+    ap.add_argument("--log", type=Path, help="export: 결과 로그 디렉터리")
+    args = ap.parse_args()
+
+    queue = WorkQueue(args.db)
+    if args.command == "status":
+        print(json.dumps({"cells": queue.counts(args.lang, args.config), "workers": queue.workers()}, indent=2))
+    elif args.command == "requeue":
+        if not (args.lang and args.config):
+            raise ValueError("--lang / --config 를 지정하세요.")
+        print(f"[✓] Requeued {queue.requeue(args.lang, args.config)} failed cells")
+    else:
+        if not args.log:
+            raise ValueError("--log 를 지정하세요.")
+        with ResultsLog(args.log) as log:
+            n = 0
+            for row in queue.rows(args.lang, args.config):
+                log.append([row])
+                n += 1
+        print(f"[✓] Exported {n} rows → {args.log}")
+
+
+if __name__ == "__main__":
+    main()